@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# The event loop is only worth having with the async read views
+os.environ.setdefault('ASYNC_CATALOG_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,74 @@
+"""
+The parts of DRF's request cycle the async read views need (JWT
+authentication, the default throttles, JSON rendering, error bodies), run on
+the event loop. Responses match what the equivalent DRF view returns.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import async_cache
+
+_jwt = JWTAuthentication()
+_renderer = JSONRenderer()
+
+
+def render(data, status=200, headers=None):
+    return HttpResponse(_renderer.render(data), status=status, content_type="application/json", headers=headers)
+
+
+def render_error(exc):
+    headers = {}
+    if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+        headers["Retry-After"] = str(int(exc.wait))
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers["WWW-Authenticate"] = _jwt.authenticate_header(None)
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return render(detail, status=exc.status_code, headers=headers)
+
+
+async def authenticate(request):
+    """Set request.user from the Bearer token (AnonymousUser without one), as JWTAuthentication does."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        request.user = AnonymousUser()
+        return
+    token = _jwt.get_validated_token(raw_token)
+    request.user = await sync_to_async(_jwt.get_user)(token)
+
+
+async def check_throttles(request):
+    """DEFAULT_THROTTLE_CLASSES over the shared cache entries; raises Throttled like the sync views."""
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        key = throttle.get_cache_key(request, None) if throttle.rate is not None else None
+        if key is None:
+            continue
+        now = throttle.timer()
+        history = [stamp for stamp in await async_cache.get(key, []) if stamp > now - throttle.duration]
+        if len(history) >= throttle.num_requests:
+            raise exceptions.Throttled(throttle.duration - (now - history[-1]))
+        history.insert(0, now)
+        await async_cache.set(key, history, throttle.duration)
+
+
+async def initial(request, authenticated=False):
+    """Authenticate, check permission and throttle; returns the error response, or None to go on."""
+    try:
+        await authenticate(request)
+        if authenticated and not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        await check_throttles(request)
+    except exceptions.APIException as exc:
+        return render_error(exc)
+    return None
+
+
+def delegate(view):
+    """Serve a request the async view does not handle with the sync DRF view, in a worker thread."""
+    return sync_to_async(view)
@@ -0,0 +1,71 @@
+"""
+Cache access for the async views without leaving the event loop.
+
+With django-redis as the default cache, entries are read and written through
+a redis.asyncio client in the same format (key prefix, version, pickling)
+django-redis uses, so sync and async code share them. Other backends go
+through Django's async cache API.
+"""
+import asyncio
+import weakref
+
+import redis.asyncio
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> redis.asyncio.Redis
+
+
+def get_async_redis():
+    """A redis.asyncio client for the default cache's server, one per event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # The server django-redis (and so get_redis_connection) talks to; the first one if several
+        location = caches["default"]._server
+        if isinstance(location, str):
+            location = location.split(",")
+        client = _clients[loop] = redis.asyncio.Redis.from_url(location[0])
+    return client
+
+
+def _expiry(cache, timeout):
+    """Seconds for redis' EX from a Django cache timeout (None: no expiry)."""
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    return None if timeout is None else max(1, int(timeout))
+
+
+async def get(key, default=None, version=None):
+    cache = caches["default"]
+    if not isinstance(cache, RedisCache):
+        return await cache.aget(key, default, version=version)
+    value = await get_async_redis().get(cache.client.make_key(key, version=version))
+    return default if value is None else cache.client.decode(value)
+
+
+async def set(key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    cache = caches["default"]
+    if not isinstance(cache, RedisCache):
+        return await cache.aset(key, value, timeout, version=version)
+    await get_async_redis().set(
+        cache.client.make_key(key, version=version), cache.client.encode(value), ex=_expiry(cache, timeout),
+    )
+
+
+async def add(key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    """Set `key` only if it is absent; True if it was set."""
+    cache = caches["default"]
+    if not isinstance(cache, RedisCache):
+        return await cache.aadd(key, value, timeout, version=version)
+    return bool(await get_async_redis().set(
+        cache.client.make_key(key, version=version), cache.client.encode(value), ex=_expiry(cache, timeout), nx=True,
+    ))
+
+
+async def delete(key, version=None):
+    cache = caches["default"]
+    if not isinstance(cache, RedisCache):
+        return await cache.adelete(key, version=version)
+    return bool(await get_async_redis().delete(cache.client.make_key(key, version=version)))
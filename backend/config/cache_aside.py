@@ -0,0 +1,112 @@
+"""
+Cache-aside for hot keys that must not stampede the database when they expire
+or are invalidated.
+
+An entry is stored as {"value", "fresh_until", "delta"} and is kept for
+`stale_ttl` seconds past `fresh_until`. A read
+
+- serves the value while it is fresh, except that each reader may treat it as
+  expired a little early, with a probability that rises towards the deadline
+  and with how long the value took to compute (`delta`); so one request
+  usually recomputes a hot key before it expires (probabilistic early
+  expiration, "XFetch");
+- lets a single caller recompute an expired or missing entry, the one that wins
+  a lock taken with cache.add (single flight, across processes with Redis);
+- meanwhile serves every other caller the stale value (stale-while-revalidate),
+  or, when there is none, makes them wait for the winner's result instead of
+  running the query themselves.
+
+fetch() is for sync code, afetch() for the async views; they share entries.
+"""
+import asyncio
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from . import async_cache
+from .metrics import record_cache
+
+STALE_TTL = 60  # seconds an expired value may still be served while it is recomputed
+LOCK_TIMEOUT = 10  # seconds before a crashed recompute releases the key
+WAIT_INTERVAL = 0.01  # seconds between polls while waiting for another caller's recompute
+BETA = 1.0  # > 1 recomputes earlier, < 1 later
+
+
+def lock_key(key):
+    return f"{key}:lock"
+
+
+def _is_fresh(entry, beta):
+    # XFetch: -log(u) is exponentially distributed, so early recomputes are rare until the deadline nears
+    return time.time() - entry["delta"] * beta * math.log(1.0 - random.random()) < entry["fresh_until"]
+
+
+def _entry(value, ttl, started):
+    finished = time.time()
+    return {"value": value, "fresh_until": finished + ttl, "delta": finished - started}
+
+
+def fetch(key, compute, ttl, stale_ttl=STALE_TTL, metric=None, beta=BETA):
+    """Return the cached value of `key`, calling compute() to (re)fill it as described above."""
+    entry = cache.get(key)
+    if metric:
+        record_cache(metric, entry is not None)
+    if entry is not None and _is_fresh(entry, beta):
+        return entry["value"]
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        if cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+            try:
+                # The previous holder may have refilled it since we looked
+                latest = cache.get(key)
+                if latest is not None and latest != entry and time.time() < latest["fresh_until"]:
+                    return latest["value"]
+                started = time.time()
+                value = compute()
+                cache.set(key, _entry(value, ttl, started), ttl + stale_ttl)
+                return value
+            finally:
+                cache.delete(lock_key(key))
+        if entry is not None:
+            return entry["value"]
+        if time.monotonic() >= deadline:
+            # The recompute is stuck; do not keep the request waiting on it
+            return compute()
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["value"]
+
+
+async def afetch(key, compute, ttl, stale_ttl=STALE_TTL, metric=None, beta=BETA):
+    """fetch() for async code: `compute` is a coroutine function."""
+    entry = await async_cache.get(key)
+    if metric:
+        record_cache(metric, entry is not None)
+    if entry is not None and _is_fresh(entry, beta):
+        return entry["value"]
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        if await async_cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+            try:
+                latest = await async_cache.get(key)
+                if latest is not None and latest != entry and time.time() < latest["fresh_until"]:
+                    return latest["value"]
+                started = time.time()
+                value = await compute()
+                await async_cache.set(key, _entry(value, ttl, started), ttl + stale_ttl)
+                return value
+            finally:
+                await async_cache.delete(lock_key(key))
+        if entry is not None:
+            return entry["value"]
+        if time.monotonic() >= deadline:
+            return await compute()
+        await asyncio.sleep(WAIT_INTERVAL)
+        entry = await async_cache.get(key)
+        if entry is not None:
+            return entry["value"]
@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 app = Celery("config")
@@ -8,9 +9,64 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+# Each queue is consumed by its own worker pool (see compose/docker-compose.yml),
+# so a burst of invoices or a long sweep never sits in front of payment work.
+#   critical: webhook processing and customer emails, latency sensitive
+#   io:       everything else that waits on the network (default)
+#   cpu:      PDF rendering
+#   periodic: beat-driven sweeps and maintenance
+app.conf.task_queues = (
+    Queue("critical"),
+    Queue("io"),
+    Queue("cpu"),
+    Queue("periodic"),
+)
+app.conf.task_default_queue = "io"
+app.conf.task_routes = {
+    "payments.tasks.process_webhook_event": {"queue": "critical"},
+    "orders.tasks.send_order_confirmation_email": {"queue": "critical"},
+    "orders.tasks.send_order_status_update_email": {"queue": "critical"},
+    "orders.tasks.batch_order_emails": {"queue": "critical"},
+    "orders.tasks.send_queued_order_emails": {"queue": "critical"},
+    "orders.tasks.relay_outbox": {"queue": "critical"},
+    "orders.tasks.generate_and_email_invoice": {"queue": "cpu"},
+    "orders.tasks.auto_cancel_unpaid_orders": {"queue": "periodic"},
+    "orders.tasks.fold_order_stats": {"queue": "periodic"},
+    "orders.tasks.reconcile_order_stats": {"queue": "periodic"},
+    "orders.tasks.flush_dirty_carts": {"queue": "periodic"},
+}
+
+# Reserve one message per process: a long task cannot hold a backlog hostage.
+# Tasks that are safe to run twice opt into acks_late themselves.
+app.conf.worker_prefetch_multiplier = 1
+app.conf.task_reject_on_worker_lost = True
+# Keep the queued JSON logging set up by Django (config/logging_config.py)
+app.conf.worker_hijack_root_logger = False
+
+
 app.conf.beat_schedule = {
     "auto-cancel-unpaid-orders-every-10-mins": {
         "task": "orders.tasks.auto_cancel_unpaid_orders",
         "schedule": crontab(minute="*/10"),
     },
+    "fold-order-stats-every-minute": {
+        "task": "orders.tasks.fold_order_stats",
+        "schedule": crontab(),
+    },
+    "reconcile-order-stats-hourly": {
+        "task": "orders.tasks.reconcile_order_stats",
+        "schedule": crontab(minute=5),
+    },
+    "send-queued-order-emails-every-minute": {
+        "task": "orders.tasks.send_queued_order_emails",
+        "schedule": crontab(),
+    },
+    "relay-outbox-every-minute": {
+        "task": "orders.tasks.relay_outbox",
+        "schedule": crontab(),
+    },
+    "flush-dirty-carts-every-minute": {
+        "task": "orders.tasks.flush_dirty_carts",
+        "schedule": crontab(),
+    },
 }
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Read replicas (settings.DATABASE_REPLICAS). Views opt in with
+ReplicaReadMixin: their safe requests read from a replica unless the user
+wrote something in the last REPLICA_STICKY_SECONDS, in which case they stay
+on the primary and see their own writes. Everything else (writes, reads
+inside a transaction, views that did not opt in, Celery tasks, the admin)
+uses "default".
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import async_cache
+
+_current_routing = ContextVar("db_routing", default=None)
+
+
+class RequestRouting:
+    """What ReplicaRoutingMiddleware tracks for one request: the replica it reads from, and whether it wrote."""
+
+    __slots__ = ("replica", "wrote")
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def sticky_key(user_id):
+    return f"db:primary:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Keep the user's reads on the primary until the replicas have caught up with their write."""
+    cache.set(sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is None or routing.replica is None:
+            return None
+        # A transaction may have written rows the replica has not seen
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects read from either may be related
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests to `replica_actions` (every safe request when None)
+    from a replica. Decided after authentication, so stickiness can be checked
+    for the requesting user.
+
+    Not for actions whose reads fill a shared cache: a fill from a lagging
+    replica right after a write's invalidation would cache the old row.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        routing = _current_routing.get()
+        if routing is None or request.method not in SAFE_METHODS:
+            return
+        if self.replica_actions is not None and getattr(self, "action", None) not in self.replica_actions:
+            return
+        if request.user.is_authenticated and cache.get(sticky_key(request.user.id)):
+            return
+        routing.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+async def aread_from_replica(request):
+    """ReplicaReadMixin for the async views; call it once request.user is set."""
+    routing = _current_routing.get()
+    if routing is None or request.method not in SAFE_METHODS:
+        return
+    if request.user.is_authenticated and await async_cache.get(sticky_key(request.user.id)):
+        return
+    routing.replica = random.choice(settings.DATABASE_REPLICAS)
@@ -0,0 +1,157 @@
+"""
+An in-process tier in front of the shared cache, for the few entries nearly
+every request reads (category representations, hot product details): a hit
+costs no round trip to Redis.
+
+Entries live at most LOCAL_CACHE_TTL seconds and the least recently used are
+dropped beyond LOCAL_CACHE_MAX_ENTRIES. invalidate() drops keys here and, with
+django-redis as the default cache, publishes them so every other process
+drops them too: each process runs a listener thread subscribed to the
+channel. A listener that loses its connection empties its process' tier when
+it resubscribes, since it may have missed messages; the TTL bounds staleness
+if it cannot.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, bounded mapping whose entries expire `ttl` seconds after they were set."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local = LRUCache(settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_TTL)
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _shared_redis():
+    """True when the default cache is django-redis, i.e. shared between processes."""
+    return isinstance(caches["default"], RedisCache)
+
+
+def invalidation_channel():
+    # Under the cache's key prefix, so deployments sharing a Redis do not evict each other's entries
+    return caches["default"].make_key("local_cache:invalidate")
+
+
+def get_or_set(key, compute, metric=None):
+    """The local value of `key`, or compute() (usually a read through the shared cache), kept locally."""
+    value = local.get(key, _MISSING)
+    if value is not _MISSING:
+        if metric:
+            record_cache(metric, True)
+        return value
+    _ensure_listener()
+    value = compute()
+    local.set(key, value)
+    return value
+
+
+async def aget_or_set(key, compute, metric=None):
+    """get_or_set() for async code: `compute` is a coroutine function."""
+    value = local.get(key, _MISSING)
+    if value is not _MISSING:
+        if metric:
+            record_cache(metric, True)
+        return value
+    _ensure_listener()
+    value = await compute()
+    local.set(key, value)
+    return value
+
+
+def invalidate(*keys):
+    """Drop `keys` from this process' tier and every other one's."""
+    for key in keys:
+        local.delete(key)
+    if keys and _shared_redis():
+        get_redis_connection("default").publish(invalidation_channel(), json.dumps(keys))
+
+
+def listen(client, channel, lru, stop):
+    """Drop the keys published on `channel` from `lru` until `stop` is set; reconnects on errors."""
+    while not stop.is_set():
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel)
+            # Anything published while we were not subscribed was missed
+            lru.clear()
+            while not stop.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    for key in json.loads(message["data"]):
+                        lru.delete(key)
+        except Exception:
+            logger.warning("[LocalCache] Invalidation listener lost its connection; retrying", exc_info=True)
+            stop.wait(1)
+
+
+def _ensure_listener():
+    """Start this process' listener once (again after a fork: threads do not survive it)."""
+    global _listener_pid
+    if _listener_pid == os.getpid() or not _shared_redis():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        thread = threading.Thread(
+            target=listen,
+            args=(get_redis_connection("default"), invalidation_channel(), local, threading.Event()),
+            name="local-cache-invalidation",
+            daemon=True,
+        )
+        thread.start()
+        _listener_pid = os.getpid()
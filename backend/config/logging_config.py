@@ -1,4 +1,13 @@
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.config
 import os
+import queue
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener
 
 LOG_DIR = os.getenv("LOG_DIR", None)
 if not LOG_DIR:
@@ -12,24 +21,133 @@ os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "ecommerce.log")
 LOG_ERROR_FILE = os.path.join(LOG_DIR, "ecommerce.error.log")
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "json" (one object per line) or "verbose" (plain text, handy locally)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Keep 1 in N INFO/DEBUG records of each request-path logger; warnings and errors are never sampled
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", 1))
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, any `extra=` fields and the traceback."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through 1 in `every` records at INFO or below, counted separately for
+    each logger name, and every record above INFO.
+    """
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = every
+        self.counters = defaultdict(itertools.count)
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno > logging.INFO:
+            return True
+        return next(self.counters[record.name]) % self.every == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. Only the message is interpolated
+    here (its arguments may change once the call returns); formatting and
+    I/O happen on the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+
+_listener = None
+
+
+def _restart_listener():
+    # Forked workers (gunicorn, celery prefork) inherit the queue but not the listener thread
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _stop_listener():
+    # Drains what is queued; a stopped listener has no thread
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging(config):
+    """
+    Apply `config` with dictConfig, then move the root handlers behind a queue
+    drained by one QueueListener thread, so a log call on the request path
+    costs a queue put instead of formatting and a file write.
+    """
+    global _listener
+    _stop_listener()
+
+    logging.config.dictConfig(config)
+
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(_stop_listener)
+
+
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
+        "json": {"()": "config.logging_config.JsonFormatter"},
         "verbose": {"format": "%(asctime)s %(levelname)s [%(name)s] %(message)s"},
         "simple": {"format": "%(levelname)s %(message)s"},
     },
+    "filters": {
+        "sample_info": {"()": "config.logging_config.SamplingFilter", "every": LOG_SAMPLE_EVERY},
+    },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
             "level": "DEBUG",
-            "formatter": "verbose",
+            "formatter": LOG_FORMAT,
             "stream": "ext://sys.stdout",
         },
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
             "level": "DEBUG",
-            "formatter": "verbose",
+            "formatter": LOG_FORMAT,
             "filename": LOG_FILE,
             "maxBytes": 5 * 1024 * 1024,
             "backupCount": 5,
@@ -38,24 +156,29 @@ LOGGING_CONFIG = {
         "error_file": {
             "class": "logging.handlers.RotatingFileHandler",
             "level": "ERROR",
-            "formatter": "verbose",
+            "formatter": LOG_FORMAT,
             "filename": LOG_ERROR_FILE,
             "maxBytes": 5 * 1024 * 1024,
             "backupCount": 5,
             "encoding": "utf8",
         },
     },
+    # Every logger propagates to root, whose handlers configure_logging() puts behind the queue
     "root": {
-        "level": "DEBUG",
+        "level": LOG_LEVEL,
         "handlers": ["console", "file", "error_file"],
     },
     "loggers": {
-        "django": {"level": "INFO", "handlers": ["console", "file"], "propagate": True},
-        "django.request": {"level": "ERROR", "handlers": ["console", "error_file"], "propagate": False},
-        "payments": {"level": "DEBUG", "handlers": ["console", "file"], "propagate": False},
-        "orders": {"level": "DEBUG", "handlers": ["console", "file"], "propagate": False},
-        "products": {"level": "DEBUG", "handlers": ["console", "file"], "propagate": False},
-        "users": {"level": "DEBUG", "handlers": ["console", "file"], "propagate": False},
-        "celery": {"level": "INFO", "handlers": ["console", "file"], "propagate": False},
+        "django": {"level": "INFO"},
+        "django.request": {"level": "ERROR"},
+        "payments": {"level": LOG_LEVEL},
+        "orders": {"level": LOG_LEVEL},
+        "products": {"level": LOG_LEVEL},
+        "users": {"level": LOG_LEVEL},
+        "celery": {"level": "INFO"},
+        # Logger filters only see records logged on that exact logger, so the
+        # high-volume request loggers are sampled by name
+        "orders.views": {"filters": ["sample_info"]},
+        "products.views": {"filters": ["sample_info"]},
     },
 }
@@ -0,0 +1,174 @@
+"""
+In-process request metrics, exposed in the Prometheus text format at /metrics.
+
+Counters live in the worker process that served the request: with several
+gunicorn workers each scrape sees one worker, so scrape web:8000 per worker
+(or sum by instance) rather than through a load balancer.
+
+Port 8000 and the ngrok tunnel reach the app without nginx, so the view
+checks a bearer token itself: scrapers send `Authorization: Bearer
+$METRICS_TOKEN`, and the endpoint answers 404 while no token is set.
+"""
+import bisect
+import hmac
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    """What one request spent on SQL and how its cache lookups went."""
+
+    __slots__ = ("queries", "db_time", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Called by count_query
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, duration):
+        parts = [
+            f"total;dur={duration * 1000:.1f}",
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.cache_hits or self.cache_misses:
+            parts.append(f'cache;desc="{self.cache_hits} hit {self.cache_misses} miss"')
+        return ", ".join(parts)
+
+
+_current_stats = ContextVar("request_stats", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    execute_wrapper on every connection: charges the query to the RequestStats
+    of the request being served, found through the context so it works for
+    queries the async ORM runs in a worker thread too.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def instrument(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(instrument)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)          # (view, method, status) -> count
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.duration_sum = defaultdict(float)    # view -> seconds
+        self.duration_count = defaultdict(int)    # view -> requests
+        self.db_queries = defaultdict(int)        # view -> queries
+        self.db_time = defaultdict(float)         # view -> seconds
+        self.cache = defaultdict(int)             # (cache, result) -> count
+
+    def observe_request(self, view, method, status, duration, stats):
+        index = bisect.bisect_left(DURATION_BUCKETS, duration)
+        with self.lock:
+            self.requests[(view, method, status)] += 1
+            if index < len(DURATION_BUCKETS):
+                self.duration_buckets[view][index] += 1
+            self.duration_sum[view] += duration
+            self.duration_count[view] += 1
+            self.db_queries[view] += stats.queries
+            self.db_time[view] += stats.db_time
+
+    def observe_cache(self, name, hit):
+        with self.lock:
+            self.cache[(name, "hit" if hit else "miss")] += 1
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4."""
+        lines = []
+        with self.lock:
+            lines += [
+                "# HELP http_requests_total Requests served, by view, method and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP http_request_duration_seconds Time spent serving requests, by view.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for view in sorted(self.duration_count):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, self.duration_buckets[view]):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {self.duration_count[view]}'
+                )
+                lines.append(f'http_request_duration_seconds_sum{{view="{view}"}} {self.duration_sum[view]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{view="{view}"}} {self.duration_count[view]}')
+
+            lines += [
+                "# HELP db_queries_total SQL queries run while serving requests, by view.",
+                "# TYPE db_queries_total counter",
+            ]
+            lines += [f'db_queries_total{{view="{view}"}} {count}' for view, count in sorted(self.db_queries.items())]
+            lines += [
+                "# HELP db_query_seconds_total Time spent in SQL while serving requests, by view.",
+                "# TYPE db_query_seconds_total counter",
+            ]
+            lines += [f'db_query_seconds_total{{view="{view}"}} {seconds:.6f}' for view, seconds in sorted(self.db_time.items())]
+
+            lines += [
+                "# HELP cache_requests_total Cache lookups, by cache and result.",
+                "# TYPE cache_requests_total counter",
+            ]
+            for (name, result), count in sorted(self.cache.items()):
+                lines.append(f'cache_requests_total{{cache="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def record_cache(name, hit):
+    """Count a cache lookup, globally and against the current request's Server-Timing."""
+    stats = _current_stats.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+    REGISTRY.observe_cache(name, hit)
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,118 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .db_router import RequestRouting, _current_routing, pin_to_primary
+from .metrics import REGISTRY, RequestStats, _current_stats, instrument
+
+
+class PerformanceMiddleware:
+    """
+    Time every request, count its SQL queries (config.metrics.count_query on
+    each database connection charges them to the request's RequestStats) and
+    cache lookups, record them in the metrics registry and report them to the
+    client in a Server-Timing header.
+
+    Sync and async capable, so async views keep the whole request on the
+    event loop; the stats follow the request's context into the threads the
+    async ORM runs queries in.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        # Connections opened before config.metrics was imported missed connection_created
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _finish(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REGISTRY.observe_request(view, request.method, response.status_code, duration, stats)
+        response["Server-Timing"] = stats.server_timing(duration)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Give each request the routing state config.db_router reads, and after a
+    request that wrote, pin its user to the primary for REPLICA_STICKY_SECONDS.
+    Does nothing while no replicas are configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if routing.wrote:
+            self._pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if routing.wrote:
+            # Reading request.user may load the session
+            await sync_to_async(self._pin_writer)(request)
+        return response
+
+    @staticmethod
+    def _pin_writer(request):
+        # DRF sets the authenticated user on the underlying request
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
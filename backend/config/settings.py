@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     # your apps
@@ -30,24 +31,35 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware (config/metrics.py)
+    "config.middleware.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "config.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True # for development only
 
+# Bearer token scrapers send to /metrics; unset, the endpoint is not served (config/metrics.py)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 ROOT_URLCONF = "config.urls"
 
+# Runs the suite against the local-memory cache (testing/runner.py)
+TEST_RUNNER = "testing.runner.TestRunner"
+
 TEMPLATES = [{ "BACKEND": "django.template.backends.django.DjangoTemplates", "DIRS": [], "APP_DIRS": True, "OPTIONS": {"context_processors": ["django.template.context_processors.debug","django.template.context_processors.request","django.contrib.auth.context_processors.auth","django.contrib.messages.context_processors.messages"],},}]
 
 WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
+# Serve product list/detail and the cart from async views (products/async_views.py); config/asgi.py turns it on
+ASYNC_CATALOG_VIEWS = os.getenv("ASYNC_CATALOG_VIEWS", "False") == "True"
 
 DATABASES = {
     "default": {
@@ -57,9 +69,36 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("POSTGRES_HOST"),
         "PORT": os.getenv("POSTGRES_PORT", 5432),
+        # Keep each worker thread's connection between requests (0 reconnects per request),
+        # and ping it before reuse so a server-side close costs a reconnect instead of a 500
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas (config/db_router.py): comma-separated hosts, reached with the primary's credentials
+DATABASE_REPLICAS = []
+for i, host in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")), start=1):
+    DATABASES[f"replica{i}"] = {**DATABASES["default"], "HOST": host.strip(), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{i}")
+
+# Seconds a user's reads stay on the primary after they wrote; cover the replicas' worst lag
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+DATABASE_ROUTERS = ["config.db_router.ReplicaRouter"]
+
+# Offline runs (e.g. the test suite without a PostgreSQL server); PostgreSQL-only tests skip themselves
+if os.getenv("USE_SQLITE", "False") == "True":
+    DATABASES = {
+        "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3")},
+        # Stand-in replica on the same file (a mirror of default in tests); used only when listed below
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "TEST": {"MIRROR": "default"},
+        },
+    }
+    DATABASE_REPLICAS = ["replica"] if os.getenv("SQLITE_REPLICA", "False") == "True" else []
+
 # Redis cache
 CACHES = {
     "default": {
@@ -70,9 +109,22 @@ CACHES = {
     }
 }
 
+# Offline runs without a Redis server keep the cache in process
+if os.getenv("USE_SQLITE", "False") == "True" and not os.getenv("REDIS_URL"):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# In-process tier in front of CACHES for categories and hot products (config/local_cache.py); 0 entries turns it off
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 1024))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", 30))
+
+# Cart storage: "db" (Cart/CartItem tables) or "redis" (hash per user, written behind to the tables)
+CART_STORE = os.getenv("CART_STORE", "db")
+
 # Celery (will be used by config/celery.py)
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
+# Seconds committed outbox tasks wait to be published together (orders/outbox.py)
+OUTBOX_RELAY_WINDOW = int(os.getenv("OUTBOX_RELAY_WINDOW", 1))
 
 # REST Framework + JWT + throttling
 REST_FRAMEWORK = {
@@ -84,12 +136,13 @@ REST_FRAMEWORK = {
         "rest_framework.throttling.AnonRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
-        "user": "1000/day",
-        "anon": "100/hour",
+        "user": os.getenv("THROTTLE_USER_RATE", "1000/day"),
+        "anon": os.getenv("THROTTLE_ANON_RATE", "100/hour"),
     },
 }
 
-LOGGING_CONFIG = "logging.config.dictConfig"
+# dictConfig, then the root handlers are moved behind a queue listener thread
+LOGGING_CONFIG = "config.logging_config.configure_logging"
 LOGGING = CUSTOM_LOGGING_CONFIG
 
 STATIC_URL = "/static/"
@@ -110,6 +163,8 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
 RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+# Seconds any Razorpay API call may take (the client sets no timeout of its own)
+RAZORPAY_TIMEOUT = float(os.getenv("RAZORPAY_TIMEOUT", 5))
 
 # Email settings
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
@@ -118,6 +173,8 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+# Seconds queued order emails wait to be sent together (orders/notifications.py)
+EMAIL_BATCH_WINDOW = int(os.getenv("EMAIL_BATCH_WINDOW", 5))
 
 # Nginx settings
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https') # required when switching to HTTPS
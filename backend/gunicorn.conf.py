@@ -0,0 +1,71 @@
+"""
+Gunicorn runtime profile, picked up from the working directory by
+`gunicorn` (compose and the Dockerfile run it from /app). Everything can be
+overridden from the environment.
+
+GUNICORN_WORKER_CLASS:
+    gthread  WSGI, GUNICORN_THREADS requests per worker (default); every thread
+             keeps its own persistent database connection
+    sync     WSGI, one request per worker at a time
+    gevent   WSGI on greenlets; needs gevent and psycogreen installed
+    uvicorn  ASGI through config.asgi, with the async catalog and cart views
+             (ASYNC_CATALOG_VIEWS); needs uvicorn installed
+
+Persistent connections (DB_CONN_MAX_AGE) are turned off for gevent and
+uvicorn: greenlets and ASGI request threads do not outlive the request, so
+their connections would be leaked rather than reused.
+
+Sizing: a web container holds up to workers x connections per worker
+(GUNICORN_THREADS for gthread, GUNICORN_WORKER_CONNECTIONS for gevent, one
+for sync and uvicorn) Postgres connections. GUNICORN_WORKERS wins when set;
+otherwise, with DB_MAX_CONNECTIONS (this container's share of Postgres
+max_connections, after Celery, replicas' users and admin sessions), workers
+are as many as fit in it; otherwise DEFAULT_WORKERS. The count is never
+derived from the CPUs alone: in a container those are usually the host's,
+and every extra worker holds connections.
+"""
+import os
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "gevent": "gevent",
+    "uvicorn": "uvicorn.workers.UvicornWorker",
+}
+
+mode = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+worker_class = WORKER_CLASSES[mode]
+wsgi_app = "config.asgi:application" if mode == "uvicorn" else "config.wsgi:application"
+if mode in ("gevent", "uvicorn"):
+    os.environ["DB_CONN_MAX_AGE"] = "0"
+
+DEFAULT_WORKERS = 2
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+db_connections_per_worker = {"gthread": threads, "gevent": worker_connections}.get(mode, 1)
+
+if os.getenv("GUNICORN_WORKERS"):
+    workers = int(os.environ["GUNICORN_WORKERS"])
+elif os.getenv("DB_MAX_CONNECTIONS"):
+    workers = max(1, int(os.environ["DB_MAX_CONNECTIONS"]) // db_connections_per_worker)
+else:
+    workers = DEFAULT_WORKERS
+
+# NGINX keeps upstream connections open; recycle workers now and then to cap slow leaks
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    if mode == "gevent":
+        # psycopg2 blocks the whole worker unless it yields to the gevent hub
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
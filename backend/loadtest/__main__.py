@@ -0,0 +1,119 @@
+"""
+Local load test: seeds a throwaway database, serves the app on a live test
+server and drives it with weighted scenarios, then prints p50/p95/p99 and
+throughput per endpoint.
+
+    cd backend
+    USE_SQLITE=True python -m loadtest --duration 30 --concurrency 8
+    USE_SQLITE=True python -m loadtest --save-baseline loadtest/baseline.json
+    USE_SQLITE=True python -m loadtest --baseline loadtest/baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run (ignored with --iterations)")
+    parser.add_argument("--iterations", type=int, help="scenarios per virtual user instead of a duration")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users")
+    parser.add_argument("--products", type=int, default=500, help="seeded catalog size")
+    parser.add_argument("--postman", nargs="?", const=str(REPO_ROOT / "postman_collection.json"),
+                        help="also replay the Postman collection's GET requests")
+    parser.add_argument("--replay", nargs="?", const=str(REPO_ROOT / "requests.jsonl"),
+                        help="also replay recorded requests from a JSONL file")
+    parser.add_argument("--weight", type=int, default=5, help="scenario weight of --postman / --replay")
+    parser.add_argument("--only", nargs="+", help="run only these built-in scenarios")
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--save-baseline", help="write the summary as the new baseline")
+    parser.add_argument("--baseline", help="fail when p95 or errors regress against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth over the baseline")
+    return parser.parse_args(argv)
+
+
+def build_scenarios(args, context):
+    from .scenarios import SCENARIOS, load_jsonl_scenario, load_postman_scenario
+
+    scenarios = {name: SCENARIOS[name] for name in (args.only or SCENARIOS)}
+    if args.postman:
+        variables = {"product_id": context["slugs"][0], "order_id": context["order_id"]}
+        replay = load_postman_scenario(args.postman, variables)
+        if replay:
+            scenarios["postman"] = (args.weight, replay)
+    if args.replay:
+        replay, skipped = load_jsonl_scenario(args.replay)
+        if skipped:
+            print(f"{args.replay}: skipped {skipped} lines without a method and path", file=sys.stderr)
+        if replay:
+            scenarios["replay"] = (args.weight, replay)
+    return scenarios
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    django.setup()
+
+    from django.db import connection
+    from django.test.runner import DiscoverRunner
+    from django.test.testcases import LiveServerThread
+
+    from .harness import LoadStats, VirtualUser, compare_to_baseline, format_report, local_services, run_load
+    from .scenarios import StubRazorpayClient, seed
+
+    if connection.vendor == "sqlite":
+        # A file rather than :memory: so the server threads share the database,
+        # and writers queue for the lock instead of failing with "database is locked"
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "loadtest.sqlite3")
+        connection.settings_dict["OPTIONS"].update(timeout=30, transaction_mode="IMMEDIATE")
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    server = None
+    try:
+        with local_services(StubRazorpayClient()):
+            context = seed(products=args.products, users=args.concurrency)
+            context["order_id"] = 1
+            scenarios = build_scenarios(args, context)
+
+            server = LiveServerThread("localhost", lambda handler: handler, port=0)
+            server.daemon = True
+            server.start()
+            server.is_ready.wait()
+            if server.error:
+                raise server.error
+            base_url = f"http://localhost:{server.port}"
+
+            stats = LoadStats()
+            users = [VirtualUser(base_url, stats, token, context) for token in context["tokens"]]
+            duration = None if args.iterations else args.duration
+            run_load(users, scenarios, duration=duration, iterations=args.iterations)
+    finally:
+        if server is not None:
+            server.terminate()
+        runner.teardown_databases(old_config)
+
+    summary = stats.summary()
+    print(format_report(summary, stats.elapsed))
+    for path in filter(None, (args.json, args.save_baseline)):
+        Path(path).write_text(json.dumps(summary, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare_to_baseline(summary, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
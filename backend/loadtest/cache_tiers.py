@@ -0,0 +1,163 @@
+"""
+Redis round trips per request with and without the in-process cache tier
+(config/local_cache.py): serves a skewed mix of product detail and list
+requests, where most traffic goes to a few hot products, through the Django
+test client against django-redis, once with LOCAL_CACHE_MAX_ENTRIES=0 and
+once with the tier on, counting every command (or pipeline) sent to Redis.
+
+    cd backend
+    USE_SQLITE=True python -m loadtest.cache_tiers --requests 2000
+    USE_SQLITE=True python -m loadtest.cache_tiers --redis-url redis://localhost:6379/15
+
+Without --redis-url the commands go to an in-memory fakeredis server, so the
+counts are exact but the latencies leave out the network.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest.cache_tiers", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per configuration")
+    parser.add_argument("--products", type=int, default=200, help="seeded catalog size")
+    parser.add_argument("--hot", type=int, default=20, help="products that get --hot-share of the detail requests")
+    parser.add_argument("--hot-share", type=float, default=0.9)
+    parser.add_argument("--redis-url", help="a Redis to use instead of fakeredis (its keys are flushed)")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+@contextmanager
+def count_round_trips():
+    """Yield a one-item list counting commands sent to Redis; a pipeline is one round trip."""
+    import redis
+
+    counter = [0]
+    execute_command = redis.Redis.execute_command
+    pipeline_execute = redis.client.Pipeline.execute
+
+    def counted_command(client, *args, **options):
+        if not isinstance(client, redis.client.Pipeline):
+            counter[0] += 1
+        return execute_command(client, *args, **options)
+
+    def counted_pipeline(pipeline, *args, **kwargs):
+        counter[0] += 1
+        return pipeline_execute(pipeline, *args, **kwargs)
+
+    with mock.patch.object(redis.Redis, "execute_command", counted_command), \
+            mock.patch.object(redis.client.Pipeline, "execute", counted_pipeline):
+        yield counter
+
+
+def redis_caches(redis_url):
+    if redis_url:
+        location, options = redis_url, {}
+    else:
+        import fakeredis
+
+        location = "redis://fake:6379/1"
+        options = {"CONNECTION_POOL_KWARGS": {"connection_class": fakeredis.FakeConnection, "server": fakeredis.FakeServer()}}
+    return {"default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": location,
+        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient", **options},
+        "KEY_PREFIX": "ecom-bench",
+    }}
+
+
+def workload(slugs, args):
+    rng = random.Random(0)
+    hot, pages = slugs[:args.hot], max(1, len(slugs) // 12)
+    paths = []
+    for i in range(args.requests):
+        if i % 4 == 3:
+            paths.append(("GET /api/products/", f"/api/products/?page={rng.randint(1, min(pages, 3))}"))
+        else:
+            slug = rng.choice(hot) if rng.random() < args.hot_share else rng.choice(slugs)
+            paths.append(("GET /api/products/{slug}/", f"/api/products/{slug}/"))
+    return paths
+
+
+def run(paths):
+    from django.core.cache import cache
+    from django.test import Client
+
+    from config import local_cache
+
+    cache.clear()
+    local_cache.local.clear()
+    client = Client()
+    rows = {}
+    with count_round_trips() as round_trips:
+        for name, path in paths:
+            before = round_trips[0]
+            started = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} answered {response.status_code}")
+            row = rows.setdefault(name, {"requests": 0, "round_trips": 0, "seconds": 0.0})
+            row["requests"] += 1
+            row["round_trips"] += round_trips[0] - before
+            row["seconds"] += elapsed
+    return {
+        name: {
+            "requests": row["requests"],
+            "redis_per_request": round(row["round_trips"] / row["requests"], 2),
+            "mean_ms": round(row["seconds"] / row["requests"] * 1000, 2),
+        }
+        for name, row in rows.items()
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    django.setup()
+
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import override_settings
+    from rest_framework.throttling import SimpleRateThrottle
+
+    from config import local_cache
+    from .scenarios import seed
+
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    results = {}
+    try:
+        with override_settings(CACHES=redis_caches(args.redis_url), ALLOWED_HOSTS=["*"]), \
+                mock.patch.object(SimpleRateThrottle, "THROTTLE_RATES", {"user": "1000000/s", "anon": "1000000/s"}):
+            slugs = seed(products=args.products, users=1, paid_orders=0)["slugs"]
+            paths = workload(slugs, args)
+            with mock.patch.object(local_cache.local, "max_entries", 0):
+                results["redis only"] = run(paths)
+            results["local + redis"] = run(paths)
+    finally:
+        runner.teardown_databases(old_config)
+
+    print(f"{args.requests} requests, {args.hot_share:.0%} of detail requests on {args.hot} hot products")
+    print("every request also pays 4 round trips for the user and anon throttles")
+    print(f"{'tiers':<14} {'endpoint':<26} {'reqs':>6} {'redis/req':>10} {'mean ms':>8}")
+    for tiers, rows in results.items():
+        for name, row in rows.items():
+            print(f"{tiers:<14} {name:<26} {row['requests']:>6} {row['redis_per_request']:>10} {row['mean_ms']:>8}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Many slow clients against one worker: the WSGI deployment (Gunicorn gthread)
+versus the ASGI one (Uvicorn, serving the async catalog views). Every client
+holds a keep-alive connection open and, for each request, sends the request
+line, waits --think seconds as a slow mobile client would, then sends the
+rest and reads the response. A gthread worker ties a thread to each request
+while it waits; the event loop does not.
+
+    cd backend
+    python -m loadtest.concurrency --connections 1000 --requests 5
+    USE_SQLITE=True python -m loadtest.concurrency --connections 200 --targets wsgi
+
+Requests alternate between product list pages and product detail; both are
+cached after their first hit, so the comparison is about connection handling
+rather than the database. Targets whose worker class is not installed are
+skipped.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# label: (runtime mode in loadtest.runtime.MODES, modules it needs)
+TARGETS = {
+    "wsgi": ("gthread", ()),
+    "asgi": ("uvicorn", ("uvicorn",)),
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest.concurrency", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--connections", type=int, default=1000, help="concurrent client connections")
+    parser.add_argument("--requests", type=int, default=5, help="requests per connection")
+    parser.add_argument("--think", type=float, default=0.5, help="seconds each client stalls mid-request")
+    parser.add_argument("--threads", type=int, default=8, help="threads in the gthread worker")
+    parser.add_argument("--products", type=int, default=100, help="seeded catalog size")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a request counts as failed")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+    args.workers = 1
+    return args
+
+
+def raise_open_file_limit(connections):
+    # Each connection is a descriptor on both ends, and both ends may be this machine
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections * 2 + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY else min(wanted, hard), hard))
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def slow_client(port, paths, args, latencies, statuses):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        statuses["connect error"] = statuses.get("connect error", 0) + 1
+        return
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            try:
+                writer.write(f"GET {path} HTTP/1.1\r\n".encode())
+                await writer.drain()
+                await asyncio.sleep(args.think)
+                writer.write(f"Host: localhost:{port}\r\nAccept: application/json\r\n\r\n".encode())
+                await writer.drain()
+                status = await asyncio.wait_for(read_response(reader), args.timeout)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                statuses[type(exc).__name__] = statuses.get(type(exc).__name__, 0) + 1
+                return
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def drive(port, slugs, args):
+    from .harness import percentile
+
+    rng = random.Random(0)
+    pages = max(1, len(slugs) // 12)
+    latencies, statuses = [], {}
+
+    def client_paths():
+        return [
+            f"/api/products/?page={rng.randint(1, pages)}" if i % 2 == 0 else f"/api/products/{rng.choice(slugs)}/"
+            for i in range(args.requests)
+        ]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        slow_client(port, client_paths(), args, latencies, statuses) for _ in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "failed": args.connections * args.requests - ok,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "elapsed_s": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    raise_open_file_limit(args.connections)
+    django.setup()
+
+    from django.db import connection
+    from django.test.runner import DiscoverRunner
+
+    from .runtime import start_gunicorn
+    from .scenarios import seed
+
+    if connection.vendor == "sqlite":
+        # Gunicorn runs in other processes, so the database has to be a file they can open
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "concurrency.sqlite3")
+        connection.settings_dict["OPTIONS"].update(timeout=30)
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    results = {}
+    try:
+        slugs = seed(products=args.products, users=1, paid_orders=0)["slugs"]
+        if connection.vendor == "sqlite":
+            database_env = {"SQLITE_PATH": connection.settings_dict["NAME"]}
+        else:
+            database_env = {"POSTGRES_DB": connection.settings_dict["NAME"]}
+        # gthread turns connections beyond worker_connections away
+        database_env["GUNICORN_WORKER_CONNECTIONS"] = str(args.connections)
+        connection.close()
+
+        for target in args.targets:
+            mode, modules = TARGETS[target]
+            missing = [module for module in modules if importlib.util.find_spec(module) is None]
+            if missing:
+                print(f"{target}: skipped, {', '.join(missing)} not installed", file=sys.stderr)
+                continue
+            process, base_url = start_gunicorn(mode, args, database_env)
+            try:
+                results[target] = {"worker_class": mode, **asyncio.run(drive(int(base_url.rsplit(":", 1)[1]), slugs, args))}
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+    finally:
+        runner.teardown_databases(old_config)
+
+    print(f"{args.connections} connections x {args.requests} requests, {args.think}s stall per request, 1 worker")
+    print(f"{'target':<8} {'worker':<9} {'ok':>7} {'failed':>7} {'secs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for target, row in results.items():
+        print(
+            f"{target:<8} {row['worker_class']:<9} {row['ok']:>7} {row['failed']:>7} {row['elapsed_s']:>7} "
+            f"{row['rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
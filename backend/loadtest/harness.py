@@ -0,0 +1,186 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import fakeredis
+from django.test import override_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from config.celery import app as celery_app
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+WEBHOOK_SECRET = "whsec_loadtest"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadStats:
+    """Latencies and outcomes per endpoint label, shared by every virtual user."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record(self, name, status, seconds):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self):
+        """{endpoint: {requests, errors, rps, p50_ms, p95_ms, p99_ms, statuses}}; errors are 5xx and failed connections."""
+        result = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            statuses = dict(self.statuses[name])
+            result[name] = {
+                "requests": len(values),
+                "errors": sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+                "rps": round(len(values) / self.elapsed, 1) if self.elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            }
+        return result
+
+
+class VirtualUser:
+    """One simulated client: its own JWT and a request() that records every call in the shared stats."""
+
+    def __init__(self, base_url, stats, token=None, context=None):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.token = token
+        self.context = context or {}
+        self.random = random.Random()
+
+    def request(self, name, method, path, body=None, headers=None, raw=False):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = body if raw else json.dumps(body).encode()
+            headers.setdefault("Content-Type", "application/json")
+        if self.token and "Authorization" not in headers:
+            headers["Authorization"] = f"Bearer {self.token}"
+
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        except OSError:
+            payload, status = b"", 0
+        self.stats.record(name, status, time.perf_counter() - started)
+
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+
+def run_load(users, scenarios, duration=None, iterations=None):
+    """
+    Drive every VirtualUser in its own thread, picking scenarios by weight
+    ({name: (weight, callable)}), for `duration` seconds or `iterations`
+    scenarios per user. Returns the LoadStats.
+    """
+    names = list(scenarios)
+    weights = [scenarios[name][0] for name in names]
+    stats = users[0].stats
+    deadline = time.monotonic() + duration if duration else None
+
+    def drive(user):
+        done = 0
+        while (iterations is None or done < iterations) and (deadline is None or time.monotonic() < deadline):
+            name = user.random.choices(names, weights)[0]
+            scenarios[name][1](user)
+            done += 1
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(drive, users))
+    stats.finish()
+    return stats
+
+
+def compare_to_baseline(summary, baseline, tolerance):
+    """Endpoints whose p95 grew more than `tolerance` (0.25 = 25%) over the baseline, or that now fail."""
+    regressions = []
+    for name, before in baseline.items():
+        now = summary.get(name)
+        if now is None:
+            continue
+        if now["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}: {now['errors']} errors (baseline {before.get('errors', 0)})")
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {now['p95_ms']}ms (baseline {before['p95_ms']}ms)")
+    return regressions
+
+
+def format_report(summary, elapsed):
+    lines = [f"{'endpoint':<44} {'reqs':>6} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+    for name, row in summary.items():
+        lines.append(
+            f"{name:<44} {row['requests']:>6} {row['errors']:>4} {row['rps']:>7} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+    total = sum(row["requests"] for row in summary.values())
+    lines.append(f"{total} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+    return "\n".join(lines)
+
+
+@contextmanager
+def local_services(razorpay_client):
+    """
+    Run the app without Redis, a broker or Razorpay: locmem cache, one shared
+    fakeredis server for the Redis-backed stores, an in-memory broker, the
+    given stub Razorpay client and throttles that never trip (they still do
+    their cache calls).
+    """
+    server = fakeredis.FakeServer()
+
+    def redis_connection(*args, **kwargs):
+        return fakeredis.FakeStrictRedis(server=server)
+
+    with ExitStack() as stack:
+        stack.enter_context(override_settings(CACHES=LOCMEM_CACHES, RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET))
+        for target in (
+            "orders.cart_store.get_redis_connection",
+            "orders.notifications.get_redis_connection",
+            "orders.outbox.get_redis_connection",
+        ):
+            stack.enter_context(mock.patch(target, redis_connection))
+        for target in ("payments.views.client", "payments.razorpay_service.client"):
+            stack.enter_context(mock.patch(target, razorpay_client))
+        # Celery reads the environment before its own config; the connection
+        # pools are swapped out so none opened for the real broker is reused
+        stack.enter_context(mock.patch.dict(os.environ, {"CELERY_BROKER_URL": "memory://"}))
+        stack.enter_context(mock.patch.object(celery_app, "_pool", None))
+        stack.enter_context(mock.patch.object(celery_app.amqp, "_producer_pool", None))
+        stack.enter_context(mock.patch.object(
+            SimpleRateThrottle, "THROTTLE_RATES", {"user": "1000000/s", "anon": "1000000/s"},
+        ))
+        yield
@@ -0,0 +1,124 @@
+"""
+Per-request cost of the instrumentation every request goes through:
+
+- the logging set up by config/logging_config.py: the line ProductViewSet
+  writes for every request, logged straight to a handler that takes
+  --sink-ms per record (a console or disk under load) and through the queue
+  the listener thread drains;
+- config.middleware.PerformanceMiddleware around a view that does nothing.
+
+    cd backend
+    python -m loadtest.overhead --requests 2000 --sink-ms 0.2
+
+Timings depend on the machine; the test suite only checks that formatting
+and I/O stay off the calling thread and that the middleware does no I/O.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueListener
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest.overhead", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="calls per measurement")
+    parser.add_argument("--sink-ms", type=float, default=0.2, help="milliseconds the log handler takes per record")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+class SlowSink(logging.Handler):
+    def __init__(self, cost):
+        super().__init__()
+        self.cost = cost
+
+    def emit(self, record):
+        self.format(record)
+        time.sleep(self.cost)
+
+
+def per_call(call, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        call(i)
+    return (time.perf_counter() - started) / requests
+
+
+def logging_cost(args):
+    from config.logging_config import JsonFormatter, NonBlockingQueueHandler
+
+    def measure(name, handler):
+        logger = logging.getLogger(f"loadtest.overhead.{name}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            return per_call(lambda user_id: logger.info(
+                "[ProductViewSet] Action=%s User=%s IP=%s slug=%s", "RETRIEVE PRODUCT", user_id, "127.0.0.1", "phone",
+            ), args.requests)
+        finally:
+            logger.removeHandler(handler)
+
+    sink = SlowSink(args.sink_ms / 1000)
+    sink.setFormatter(JsonFormatter())
+    direct = measure("direct", sink)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, sink)
+    listener.start()
+    try:
+        queued = measure("queued", NonBlockingQueueHandler(log_queue))
+    finally:
+        listener.stop()
+    return {"log line, direct handler": direct, "log line, queued": queued}
+
+
+def middleware_cost(args):
+    from unittest import mock
+
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from config.metrics import MetricsRegistry
+    from config.middleware import PerformanceMiddleware
+
+    request = RequestFactory().get("/api/products/")
+
+    def view(request):
+        return HttpResponse()
+
+    middleware = PerformanceMiddleware(view)
+    with mock.patch("config.middleware.REGISTRY", MetricsRegistry()):
+        bare = per_call(lambda _: view(request), args.requests)
+        instrumented = per_call(lambda _: middleware(request), args.requests)
+    return {"empty view": bare, "empty view + middleware": instrumented}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    django.setup()
+
+    measured = {**logging_cost(args), **middleware_cost(args)}
+    results = {name: round(seconds * 1e6, 1) for name, seconds in measured.items()}
+
+    print(f"{args.requests} calls each, log handler taking {args.sink_ms} ms per record")
+    print(f"{'measurement':<34} {'us/call':>9}")
+    for name, micros in results.items():
+        print(f"{name:<34} {micros:>9}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Product-list throughput under each Gunicorn runtime profile (gunicorn.conf.py):
+seeds a throwaway database, then for every mode starts Gunicorn on it and
+drives GET /api/products/ with uncached pages, so every request reaches the
+database and pays for its connection.
+
+    cd backend
+    python -m loadtest.runtime --duration 15 --concurrency 16
+    USE_SQLITE=True python -m loadtest.runtime --modes sync gthread
+
+Against PostgreSQL (e.g. inside the web container) the difference between
+reconnecting per request and persistent connections shows up; SQLite
+connections are nearly free. Modes whose worker class is not installed are
+skipped.
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# label: (GUNICORN_WORKER_CLASS, DB_CONN_MAX_AGE, modules the worker class needs)
+MODES = {
+    "sync": ("sync", 0, ()),
+    "sync-persistent": ("sync", 60, ()),
+    "gthread": ("gthread", 60, ()),
+    "gevent": ("gevent", 0, ("gevent", "psycogreen")),
+    "uvicorn": ("uvicorn", 0, ("uvicorn",)),
+}
+ENDPOINT = "GET /api/products/"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest.runtime", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--duration", type=float, default=10, help="seconds per mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers per mode")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--products", type=int, default=500, help="seeded catalog size")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/products/?page_size=1", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not answer on {base_url} within {timeout}s")
+
+
+def start_gunicorn(mode, args, database_env):
+    worker_class, conn_max_age, _ = MODES[mode]
+    port = free_port()
+    env = {
+        **os.environ,
+        **database_env,
+        "GUNICORN_WORKER_CLASS": worker_class,
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_ACCESS_LOG": "",
+        "DB_CONN_MAX_AGE": str(conn_max_age),
+        "THROTTLE_ANON_RATE": "1000000/s",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py"], cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://localhost:{port}"
+    try:
+        wait_until_serving(base_url, process)
+    except Exception:
+        process.kill()
+        raise
+    return process, base_url
+
+
+def uncached_product_list(pages):
+    # A query parameter the view ignores but the cache key includes, so no request is a cache hit
+    counter = itertools.count()
+
+    def scenario(user):
+        user.request(ENDPOINT, "GET", f"/api/products/?page={user.random.randint(1, pages)}&run={next(counter)}")
+
+    return scenario
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    django.setup()
+
+    from django.db import connection
+    from django.test.runner import DiscoverRunner
+
+    from .harness import LoadStats, VirtualUser, run_load
+    from .scenarios import seed
+
+    if connection.vendor == "sqlite":
+        # Gunicorn runs in other processes, so the database has to be a file they can open
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "runtime.sqlite3")
+        connection.settings_dict["OPTIONS"].update(timeout=30)
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    results = {}
+    try:
+        seed(products=args.products, users=1, paid_orders=0)
+        if connection.vendor == "sqlite":
+            database_env = {"SQLITE_PATH": connection.settings_dict["NAME"]}
+        else:
+            database_env = {"POSTGRES_DB": connection.settings_dict["NAME"]}
+        connection.close()
+        scenario = {"product_list": (1, uncached_product_list(max(1, args.products // 12)))}
+
+        for mode in args.modes:
+            missing = [module for module in MODES[mode][2] if importlib.util.find_spec(module) is None]
+            if missing:
+                print(f"{mode}: skipped, {', '.join(missing)} not installed", file=sys.stderr)
+                continue
+            process, base_url = start_gunicorn(mode, args, database_env)
+            try:
+                stats = LoadStats()
+                users = [VirtualUser(base_url, stats) for _ in range(args.concurrency)]
+                run_load(users, scenario, duration=args.duration)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            results[mode] = {"conn_max_age": MODES[mode][1], **stats.summary()[ENDPOINT]}
+    finally:
+        runner.teardown_databases(old_config)
+
+    print(f"{'mode':<16} {'conn_max_age':>12} {'reqs':>7} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode, row in results.items():
+        print(
+            f"{mode:<16} {row['conn_max_age']:>12} {row['requests']:>7} {row['errors']:>4} {row['rps']:>8} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
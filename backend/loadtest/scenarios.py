@@ -0,0 +1,176 @@
+import hashlib
+import hmac
+import json
+import re
+import uuid
+from decimal import Decimal
+
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from orders.models import Cart, Order
+from products.models import Category, Product
+from users.models import User
+from .harness import WEBHOOK_SECRET
+
+SEARCH_TERMS = ("phone", "laptop", "cable", "charger", "watch", "sku-1")
+PRODUCT_WORDS = ("Phone", "Laptop", "Cable", "Charger", "Watch", "Speaker", "Camera", "Tablet")
+
+
+class StubRazorpayOrders:
+    def create(self, data):
+        return {"id": f"order_{uuid.uuid4().hex[:14]}", **data}
+
+    def fetch(self, razorpay_order_id):
+        return {"id": razorpay_order_id, "notes": {}}
+
+
+class StubRazorpayClient:
+    """Answers the Razorpay calls the scenarios make without leaving the process."""
+
+    def __init__(self):
+        self.order = StubRazorpayOrders()
+
+
+def seed(products=500, users=16, paid_orders=200):
+    """
+    Catalog, customers with empty carts and pending orders that already have a
+    Razorpay order id (for the webhook scenario). Returns the context the
+    scenarios read: product ids and slugs, customer tokens, razorpay order ids.
+    """
+    categories = Category.objects.bulk_create([Category(name=word, slug=word.lower()) for word in PRODUCT_WORDS])
+    catalog = Product.objects.bulk_create([
+        Product(
+            sku=f"SKU-{i}", name=f"{PRODUCT_WORDS[i % len(PRODUCT_WORDS)]} {i}", slug=f"item-{i}",
+            description=f"A {PRODUCT_WORDS[(i * 3) % len(PRODUCT_WORDS)].lower()} accessory",
+            price=Decimal(10 + i % 90), inventory=1_000_000, category=categories[i % len(categories)],
+        )
+        for i in range(products)
+    ])
+    customers = User.objects.bulk_create([
+        User(username=f"loadtest{i}", email=f"loadtest{i}@example.com") for i in range(users)
+    ])
+    Cart.objects.bulk_create([Cart(user=user) for user in customers])
+    orders = Order.objects.bulk_create([
+        Order(user=customers[i % users], total_amount=Decimal("10.00"), razorpay_order_id=f"order_seed{i}")
+        for i in range(paid_orders)
+    ])
+    return {
+        "product_ids": [product.id for product in catalog],
+        "slugs": [product.slug for product in catalog],
+        "tokens": [str(RefreshToken.for_user(user).access_token) for user in customers],
+        "razorpay_order_ids": [order.razorpay_order_id for order in orders],
+    }
+
+
+def browse(user):
+    pages = max(1, len(user.context["slugs"]) // 12)
+    user.request("GET /api/products/", "GET", f"/api/products/?page={user.random.randint(1, min(pages, 5))}")
+    user.request("GET /api/products/{slug}/", "GET", f"/api/products/{user.random.choice(user.context['slugs'])}/")
+
+
+def search(user):
+    user.request("GET /api/products/?search=", "GET", f"/api/products/?search={user.random.choice(SEARCH_TERMS)}")
+
+
+def add_to_cart(user):
+    product_id = user.random.choice(user.context["product_ids"])
+    user.request("POST /api/orders/cart/add/", "POST", "/api/orders/cart/add/", {"product_id": product_id, "quantity": 1})
+    user.request("GET /api/orders/cart/", "GET", "/api/orders/cart/")
+
+
+def checkout(user):
+    product_id = user.random.choice(user.context["product_ids"])
+    user.request("POST /api/orders/cart/add/", "POST", "/api/orders/cart/add/", {"product_id": product_id, "quantity": 1})
+    status, order = user.request("POST /api/orders/orders/", "POST", "/api/orders/orders/")
+    if status == 201:
+        user.request(
+            "POST /api/payments/razorpay/create-order/", "POST", "/api/payments/razorpay/create-order/",
+            {"order_id": order["id"]},
+        )
+
+
+def webhook(user):
+    body = json.dumps({
+        "event": "payment.captured",
+        "payload": {"payment": {"entity": {
+            "id": f"pay_{uuid.uuid4().hex[:14]}",
+            "order_id": user.random.choice(user.context["razorpay_order_ids"]),
+            "status": "captured",
+        }}},
+    }).encode()
+    signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    user.request(
+        "POST /api/payments/razorpay/webhook/", "POST", "/api/payments/razorpay/webhook/", body, raw=True,
+        headers={"X-Razorpay-Signature": signature, "X-Razorpay-Event-Id": f"evt_{uuid.uuid4().hex}", "Authorization": ""},
+    )
+
+
+# name: (weight, scenario); roughly the mix of a storefront where most visits never reach checkout
+SCENARIOS = {
+    "browse": (50, browse),
+    "search": (20, search),
+    "add_to_cart": (15, add_to_cart),
+    "checkout": (10, checkout),
+    "webhook": (5, webhook),
+}
+
+
+def _postman_requests(items):
+    for item in items:
+        if "item" in item:
+            yield from _postman_requests(item["item"])
+        else:
+            yield item
+
+
+def _substitute(text, variables):
+    return re.sub(r"\{\{(\w+)\}\}", lambda match: str(variables.get(match.group(1), match.group(0))), text)
+
+
+def load_postman_scenario(path, variables):
+    """
+    A scenario replaying the collection's GET requests (the others change
+    state the collection cannot set up) with {{variables}} filled from
+    `variables` plus baseUrl, which the user's base url replaces.
+    """
+    with open(path) as f:
+        collection = json.load(f)
+    requests = []
+    for item in _postman_requests(collection["item"]):
+        request = item["request"]
+        if request["method"] != "GET":
+            continue
+        url = request["url"] if isinstance(request["url"], str) else request["url"]["raw"]
+        requests.append((f"postman: {item['name']}", url.replace("{{baseUrl}}", "")))
+
+    def replay(user):
+        for name, url in requests:
+            user.request(name, "GET", _substitute(url, variables))
+
+    return replay if requests else None
+
+
+def load_jsonl_scenario(path):
+    """
+    A scenario replaying recorded requests, one JSON object per line with
+    "method" and "path" (optional "body", "headers", "name"). Lines without a
+    method and path are skipped. Returns (scenario or None, skipped lines).
+    """
+    requests, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or not entry.get("method") or not str(entry.get("path", "")).startswith("/"):
+                skipped += 1
+                continue
+            method = entry["method"].upper()
+            requests.append((entry.get("name") or f"{method} {entry['path']}", method, entry["path"],
+                             entry.get("body"), entry.get("headers")))
+
+    def replay(user):
+        for name, method, path, body, headers in requests:
+            user.request(name, method, path, body, headers)
+
+    return (replay if requests else None), skipped
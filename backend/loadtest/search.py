@@ -0,0 +1,135 @@
+"""
+Product search at catalog scale: seeds a throwaway PostgreSQL database with
+--products rows (one million by default, filled by the search_vector trigger
+and indexed by migration 0003), then times uncached GET /api/products/?search=
+for every loadtest search term and shows which indexes the result query uses.
+
+    cd backend
+    python -m loadtest.search
+    python -m loadtest.search --products 100000 --repeat 5 --json search.json
+
+Full-text search and its GIN indexes only exist on PostgreSQL, so the
+benchmark refuses to run on SQLite.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+SEARCH_INDEXES = ("product_search_vector_gin", "product_sku_trgm")
+
+SEED_SQL = """
+INSERT INTO products_product
+    (sku, name, slug, description, price, inventory, active, created_at, updated_at)
+SELECT
+    'SKU-' || i,
+    (%(words)s)[1 + i %% %(count)s] || ' ' || i,
+    'item-' || i,
+    'A ' || lower((%(words)s)[1 + (i * 3) %% %(count)s]) || ' accessory',
+    10 + i %% 90,
+    1000000,
+    true,
+    now() - make_interval(secs => i),
+    now()
+FROM generate_series(%(start)s, %(stop)s - 1) AS i
+"""
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m loadtest.search", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1_000_000, help="seeded catalog size")
+    parser.add_argument("--batch", type=int, default=100_000, help="rows per seeding INSERT")
+    parser.add_argument("--repeat", type=int, default=20, help="uncached requests per search term")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+def seed_catalog(connection, products, batch):
+    """Insert the catalog with generate_series, the same names as loadtest.scenarios.seed."""
+    from .scenarios import PRODUCT_WORDS
+
+    with connection.cursor() as cursor:
+        for start in range(0, products, batch):
+            cursor.execute(SEED_SQL, {
+                "words": list(PRODUCT_WORDS), "count": len(PRODUCT_WORDS),
+                "start": start, "stop": min(start + batch, products),
+            })
+        cursor.execute("ANALYZE products_product")
+
+
+def indexes_used(connection, sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+    return [name for name in SEARCH_INDEXES if name in plan]
+
+
+def time_term(client, connection, term, repeat):
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for run in range(repeat):
+        # A parameter the view ignores but the cache key includes, so every request reaches the database
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get("/api/products/", {"search": term, "run": run})
+            timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"search={term} answered {response.status_code}")
+    page_query = next(query["sql"] for query in reversed(queries.captured_queries) if "LIMIT" in query["sql"])
+    return {
+        "matches": response.json()["count"],
+        "p50_ms": round(statistics.median(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "indexes": indexes_used(connection, page_query),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    django.setup()
+
+    from django.db import connection
+    from django.test import Client
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import override_settings
+
+    from .harness import local_services
+    from .scenarios import SEARCH_TERMS, StubRazorpayClient
+
+    if connection.vendor != "postgresql":
+        print("loadtest.search needs PostgreSQL: full-text search and its indexes only exist there", file=sys.stderr)
+        return 2
+
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        started = time.perf_counter()
+        seed_catalog(connection, args.products, args.batch)
+        seeded = time.perf_counter() - started
+
+        with local_services(StubRazorpayClient()), override_settings(ALLOWED_HOSTS=["*"]):
+            client = Client()
+            results = {term: time_term(client, connection, term, args.repeat) for term in SEARCH_TERMS}
+    finally:
+        runner.teardown_databases(old_config)
+
+    print(f"{args.products} products seeded in {seeded:.1f}s, {args.repeat} uncached requests per term")
+    print(f"{'search':<10} {'matches':>9} {'p50 ms':>8} {'max ms':>8}  indexes")
+    for term, row in results.items():
+        print(f"{term:<10} {row['matches']:>9} {row['p50_ms']:>8} {row['max_ms']:>8}  {', '.join(row['indexes']) or '-'}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
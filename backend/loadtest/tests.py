@@ -0,0 +1,116 @@
+import json
+import os
+import runpy
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import Client, LiveServerTestCase, SimpleTestCase, TestCase
+
+from .harness import LoadStats, VirtualUser, compare_to_baseline, local_services, run_load
+from .scenarios import SCENARIOS, StubRazorpayClient, load_jsonl_scenario, seed
+from .search import seed_catalog, time_term
+
+
+class LoadHarnessSmokeTests(LiveServerTestCase):
+    """Every built-in scenario runs clean against a live server, so the harness keeps up with the API."""
+
+    def test_scenarios_run_without_errors(self):
+        with local_services(StubRazorpayClient()):
+            context = seed(products=30, users=1, paid_orders=10)
+            stats = LoadStats()
+            user = VirtualUser(self.live_server_url, stats, context["tokens"][0], context)
+            for weight, scenario in SCENARIOS.values():
+                scenario(user)
+            run_load([user], SCENARIOS, iterations=10)
+
+        summary = stats.summary()
+        self.assertEqual(
+            set(summary),
+            {
+                "GET /api/products/", "GET /api/products/{slug}/", "GET /api/products/?search=",
+                "POST /api/orders/cart/add/", "GET /api/orders/cart/", "POST /api/orders/orders/",
+                "POST /api/payments/razorpay/create-order/", "POST /api/payments/razorpay/webhook/",
+            },
+        )
+        for name, row in summary.items():
+            self.assertEqual(set(row["statuses"]) - {"200", "201"}, set(), (name, row["statuses"]))
+
+
+class LoadHarnessReportTests(SimpleTestCase):
+    def test_summary_percentiles(self):
+        stats = LoadStats()
+        for ms in range(1, 101):
+            stats.record("GET /", 200, ms / 1000)
+        stats.record("GET /", 502, 0.001)
+        stats.elapsed = 2.0
+
+        row = stats.summary()["GET /"]
+        self.assertEqual((row["requests"], row["errors"], row["rps"]), (101, 1, 50.5))
+        self.assertEqual((row["p50_ms"], row["p95_ms"], row["p99_ms"]), (50.0, 95.0, 99.0))
+
+    def test_baseline_regressions(self):
+        baseline = {"GET /": {"p95_ms": 10.0, "errors": 0}, "GET /gone": {"p95_ms": 1.0, "errors": 0}}
+        ok = {"GET /": {"p95_ms": 12.0, "errors": 0}}
+        slow = {"GET /": {"p95_ms": 13.0, "errors": 2}}
+
+        self.assertEqual(compare_to_baseline(ok, baseline, tolerance=0.25), [])
+        self.assertEqual(len(compare_to_baseline(slow, baseline, tolerance=0.25)), 2)
+
+    def test_jsonl_replay_skips_lines_that_are_not_requests(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write(json.dumps({"request_id": "x", "title": "not a request"}) + "\n\n")
+            f.write(json.dumps({"method": "get", "path": "/api/products/"}) + "\n")
+        self.addCleanup(os.remove, f.name)
+
+        scenario, skipped = load_jsonl_scenario(f.name)
+        self.assertEqual(skipped, 1)
+        self.assertIsNotNone(scenario)
+
+
+@skipUnless(connection.vendor == "postgresql", "full-text search is PostgreSQL only")
+class SearchBenchmarkTests(TestCase):
+    """The catalog-scale run is python -m loadtest.search; here, that a small one seeds and searches."""
+
+    def test_seeded_catalog_is_searchable(self):
+        seed_catalog(connection, products=2000, batch=500)
+
+        with local_services(StubRazorpayClient()):
+            row = time_term(Client(), connection, "phone", repeat=1)
+
+        self.assertEqual(row["matches"], 250)
+
+
+class GunicornProfileTests(SimpleTestCase):
+    conf = Path(__file__).resolve().parents[1] / "gunicorn.conf.py"
+
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(str(self.conf)), os.environ.get("DB_CONN_MAX_AGE")
+
+    def test_default_profile_is_threaded_wsgi(self):
+        conf, conn_max_age = self.load(GUNICORN_WORKER_CLASS="gthread", DB_CONN_MAX_AGE="60")
+        self.assertEqual((conf["worker_class"], conf["wsgi_app"]), ("gthread", "config.wsgi:application"))
+        self.assertEqual(conn_max_age, "60")
+
+    def test_asgi_and_gevent_drop_persistent_connections(self):
+        conf, conn_max_age = self.load(GUNICORN_WORKER_CLASS="uvicorn", DB_CONN_MAX_AGE="60")
+        self.assertEqual(conf["worker_class"], "uvicorn.workers.UvicornWorker")
+        self.assertEqual(conf["wsgi_app"], "config.asgi:application")
+        self.assertEqual(conn_max_age, "0")
+
+        self.assertEqual(self.load(GUNICORN_WORKER_CLASS="gevent", DB_CONN_MAX_AGE="60")[1], "0")
+
+    def test_workers_fit_the_database_connection_budget(self):
+        env = {"GUNICORN_WORKER_CLASS": "gthread", "GUNICORN_THREADS": "4"}
+        with mock.patch.dict(os.environ):
+            for name in ("GUNICORN_WORKERS", "DB_MAX_CONNECTIONS"):
+                os.environ.pop(name, None)
+            # Not the CPU count, which in a container is usually the host's
+            with mock.patch("os.cpu_count", return_value=64):
+                self.assertEqual(self.load(**env)[0]["workers"], 2)
+            self.assertEqual(self.load(**env, DB_MAX_CONNECTIONS="30")[0]["workers"], 7)
+            self.assertEqual(self.load(**env, DB_MAX_CONNECTIONS="2")[0]["workers"], 1)
+            self.assertEqual(self.load(GUNICORN_WORKER_CLASS="sync", DB_MAX_CONNECTIONS="10")[0]["workers"], 10)
+            self.assertEqual(self.load(**env, DB_MAX_CONNECTIONS="30", GUNICORN_WORKERS="3")[0]["workers"], 3)
@@ -1,7 +1,7 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, Invoice, Order, OrderItem, OutboxMessage
 
-for model in (Cart, CartItem, Order, OrderItem):
+for model in (Cart, CartItem, Order, OrderItem, Invoice, OutboxMessage):
     attrs = {
         'list_display': [f.name for f in model._meta.fields],
     }
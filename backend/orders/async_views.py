@@ -0,0 +1,31 @@
+"""
+Async version of CartView, mounted instead of it when ASYNC_CATALOG_VIEWS is
+on (the ASGI deployment). Returns the same body as the sync view.
+"""
+import logging
+
+from django.views.decorators.csrf import csrf_exempt
+
+from config.async_api import delegate, initial, render
+from .cart_store import get_cart_store
+from .serializers import CartSerializer
+from .views import CartView
+
+# The sync views' logger, so the same level and sampling filters apply
+logger = logging.getLogger("orders.views")
+
+cart_fallback = delegate(CartView.as_view())
+
+
+@csrf_exempt
+async def cart_detail(request):
+    if request.method != "GET":
+        return await cart_fallback(request)
+    error = await initial(request, authenticated=True)
+    if error is not None:
+        return error
+
+    user = request.user
+    logger.info("[Cart] Fetch cart user=%s IP=%s", user.id, request.META.get("REMOTE_ADDR"))
+    cart = await get_cart_store().aget_cart(user)
+    return render(CartSerializer(cart, context={"request": request}).data)
@@ -0,0 +1,242 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+
+from config.async_cache import get_async_redis
+from products.models import Product
+from .inventory import InsufficientStock
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+CART_KEY = "cart:{user_id}"
+DIRTY_CARTS_KEY = "cart:dirty"
+CART_ID_FIELD = "cart_id"
+CART_TTL = 60 * 60 * 24 * 30  # 30 days
+
+# One statement per add: inserts the line or bumps its quantity, refusing to exceed stock
+ADD_TO_CART_SQL = """
+INSERT INTO {item} (cart_id, product_id, quantity)
+SELECT %s, id, %s FROM {product} WHERE id = %s AND inventory >= %s
+ON CONFLICT (cart_id, product_id) DO UPDATE
+    SET quantity = {item}.quantity + EXCLUDED.quantity
+    WHERE {item}.quantity + EXCLUDED.quantity <= (SELECT inventory FROM {product} WHERE id = EXCLUDED.product_id)
+RETURNING quantity
+"""
+
+
+def _stock_error(product_id):
+    """Explain a refused add: unknown product or not enough stock."""
+    if not Product.objects.filter(id=product_id).exists():
+        return Product.DoesNotExist(f"Product {product_id} not found")
+    return InsufficientStock([product_id])
+
+
+class CartSnapshot:
+    """What CartSerializer renders: the cart id plus CartItem instances with products loaded."""
+
+    def __init__(self, cart_id, items):
+        self.id = cart_id
+        self.items = items
+
+    def total_amount(self):
+        return sum(item.subtotal() for item in self.items)
+
+
+class DatabaseCartStore:
+    """Cart lines live in the Cart/CartItem tables only."""
+
+    def get_cart(self, user):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        return CartSnapshot(cart.id, list(cart.items.select_related("product__category")))
+
+    async def aget_cart(self, user):
+        cart, _ = await Cart.objects.aget_or_create(user=user)
+        return CartSnapshot(cart.id, [item async for item in cart.items.select_related("product__category")])
+
+    def add(self, user, product_id, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        sql = ADD_TO_CART_SQL.format(
+            item=connection.ops.quote_name(CartItem._meta.db_table),
+            product=connection.ops.quote_name(Product._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [cart.id, quantity, product_id, quantity])
+            row = cursor.fetchone()
+        if row is None:
+            raise _stock_error(product_id)
+        return row[0]
+
+    def remove(self, user, product_id):
+        deleted, _ = CartItem.objects.filter(cart__user=user, product_id=product_id).delete()
+        return deleted > 0
+
+    def flush(self, user):
+        """Nothing is buffered; the tables are already authoritative."""
+
+    def consume(self, user, quantities):
+        """Checkout deletes the ordered CartItem rows itself."""
+
+    def flush_dirty(self, batch_size):
+        return 0
+
+
+class RedisCartStore:
+    """
+    Cart lines live in one Redis hash per user ({product_id: quantity}, plus the
+    DB cart id) and are written behind to Cart/CartItem by flush(), which runs
+    at checkout and periodically for carts marked dirty.
+
+    A hash missing from Redis (first use, eviction) is hydrated from the tables.
+    """
+
+    def __init__(self, client=None, aclient=None):
+        self.client = client or get_redis_connection("default")
+        self._aclient = aclient
+
+    @property
+    def aclient(self):
+        """redis.asyncio client for the async reads (same server as `client`)."""
+        return self._aclient or get_async_redis()
+
+    @staticmethod
+    def _key(user_id):
+        return CART_KEY.format(user_id=user_id)
+
+    @staticmethod
+    def _lines(fields):
+        lines = {}
+        for field, value in fields.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field.isdigit() and int(value) > 0:
+                lines[int(field)] = int(value)
+        return lines
+
+    def _ensure_loaded(self, user):
+        key = self._key(user.id)
+        if self.client.hexists(key, CART_ID_FIELD):
+            return key
+
+        cart, _ = Cart.objects.get_or_create(user=user)
+        with self.client.pipeline() as pipe:
+            # HSETNX keeps increments that raced in ahead of the hydration
+            for product_id, quantity in cart.items.values_list("product_id", "quantity"):
+                pipe.hsetnx(key, product_id, quantity)
+            pipe.hset(key, CART_ID_FIELD, cart.id)
+            pipe.expire(key, CART_TTL)
+            pipe.execute()
+        return key
+
+    @staticmethod
+    def _snapshot(fields, lines, products):
+        items = [
+            CartItem(product=products[product_id], quantity=quantity)
+            for product_id, quantity in lines.items()
+            if product_id in products
+        ]
+        cart_id = fields.get(CART_ID_FIELD.encode(), fields.get(CART_ID_FIELD))
+        return CartSnapshot(int(cart_id), items)
+
+    def get_cart(self, user):
+        fields = self.client.hgetall(self._ensure_loaded(user))
+        lines = self._lines(fields)
+        return self._snapshot(fields, lines, Product.objects.select_related("category").in_bulk(list(lines)))
+
+    async def aget_cart(self, user):
+        key = self._key(user.id)
+        if not await self.aclient.hexists(key, CART_ID_FIELD):
+            await sync_to_async(self._ensure_loaded)(user)
+        fields = await self.aclient.hgetall(key)
+        lines = self._lines(fields)
+        return self._snapshot(fields, lines, await Product.objects.select_related("category").ain_bulk(list(lines)))
+
+    def add(self, user, product_id, quantity):
+        inventory = Product.objects.filter(id=product_id).values_list("inventory", flat=True).first()
+        if inventory is None:
+            raise Product.DoesNotExist(f"Product {product_id} not found")
+
+        key = self._ensure_loaded(user)
+
+        def apply(pipe):
+            # Compare and increment under WATCH, so concurrent adds are checked against each other's result
+            new_quantity = int(pipe.hget(key, product_id) or 0) + quantity
+            if new_quantity > inventory:
+                raise InsufficientStock([product_id])
+            pipe.multi()
+            pipe.hincrby(key, product_id, quantity)
+            pipe.expire(key, CART_TTL)
+            pipe.sadd(DIRTY_CARTS_KEY, user.id)
+            return new_quantity
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def remove(self, user, product_id):
+        key = self._ensure_loaded(user)
+        with self.client.pipeline() as pipe:
+            pipe.hdel(key, product_id)
+            pipe.sadd(DIRTY_CARTS_KEY, user.id)
+            removed, _ = pipe.execute()
+        return removed > 0
+
+    def consume(self, user, quantities):
+        """Take ordered quantities out of the hash, keeping anything added since the checkout flush."""
+        key = self._key(user.id)
+        product_ids = list(quantities)
+
+        def apply(pipe):
+            current = pipe.hmget(key, product_ids)
+            pipe.multi()
+            for product_id, have in zip(product_ids, current):
+                left = int(have or 0) - quantities[product_id]
+                if left > 0:
+                    pipe.hset(key, product_id, left)
+                else:
+                    pipe.hdel(key, product_id)
+            pipe.sadd(DIRTY_CARTS_KEY, user.id)
+
+        self.client.transaction(apply, key)
+
+    def flush(self, user):
+        self._flush_user(user.id)
+
+    def _flush_user(self, user_id):
+        fields = self.client.hgetall(self._key(user_id))
+        cart_id = fields.get(CART_ID_FIELD.encode(), fields.get(CART_ID_FIELD))
+        if cart_id is None:
+            return
+
+        lines = self._lines(fields)
+        existing = set(Product.objects.filter(id__in=list(lines)).values_list("id", flat=True))
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id=int(cart_id)).exclude(product_id__in=existing).delete()
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart_id=int(cart_id), product_id=product_id, quantity=quantity)
+                    for product_id, quantity in lines.items()
+                    if product_id in existing
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+
+    def flush_dirty(self, batch_size):
+        user_ids = self.client.spop(DIRTY_CARTS_KEY, batch_size) or []
+        flushed = 0
+        for user_id in user_ids:
+            try:
+                self._flush_user(int(user_id))
+                flushed += 1
+            except Exception:
+                logger.error("[Cart] Write-behind failed user=%s", user_id, exc_info=True)
+                self.client.sadd(DIRTY_CARTS_KEY, user_id)
+        return flushed
+
+
+def get_cart_store():
+    if settings.CART_STORE == "redis":
+        return RedisCartStore()
+    return DatabaseCartStore()
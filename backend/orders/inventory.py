@@ -0,0 +1,103 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, Value, When
+
+from products.models import Product
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Insufficient stock for products {sorted(product_ids)}")
+        self.product_ids = product_ids
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(id=product_id, then=Value(qty)) for product_id, qty in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Take {product_id: qty} off inventory with a single conditional UPDATE.
+    Either every product has enough stock or nothing changes.
+    """
+    if not quantities:
+        return
+
+    condition = Q()
+    for product_id, qty in quantities.items():
+        condition |= Q(id=product_id, inventory__gte=qty)
+
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(condition).update(inventory=F("inventory") - _quantity_case(quantities))
+            if updated != len(quantities):
+                # Rolls back the rows that did match
+                raise InsufficientStock([])
+    except InsufficientStock:
+        available = dict(Product.objects.filter(id__in=quantities).values_list("id", "inventory"))
+        short = [product_id for product_id, qty in quantities.items() if available.get(product_id, 0) < qty]
+        raise InsufficientStock(short) from None
+
+
+def release_stock(quantities):
+    """Give {product_id: qty} back to inventory with a single UPDATE."""
+    if not quantities:
+        return
+    Product.objects.filter(id__in=quantities).update(inventory=F("inventory") + _quantity_case(quantities))
+
+
+def order_quantities(order_ids):
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .values("product_id")
+        .annotate(qty=Sum("quantity"))
+        .order_by()
+    )
+    return {row["product_id"]: row["qty"] for row in rows}
+
+
+def commit_order_stock(order):
+    """
+    Convert the order's reservation into a sale on payment capture.
+
+    Orders whose hold was released (or never taken) reserve their stock again;
+    the order row is expected to be locked by the caller and saved afterwards.
+    """
+    if order.stock_status == "reserved":
+        order.stock_status = "committed"
+        return
+
+    if order.stock_status == "committed":
+        return
+
+    try:
+        reserve_stock(order_quantities([order.id]))
+    except InsufficientStock as e:
+        logger.error("[Inventory] Paid order exceeds stock order_id=%s products=%s", order.id, e.product_ids)
+        return
+    order.stock_status = "committed"
+
+
+def release_order_stock(order_ids):
+    """Return the held stock of every still-reserved order in `order_ids`. Returns the number of orders released."""
+    with transaction.atomic():
+        held = list(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids, stock_status="reserved")
+            .values_list("id", flat=True)
+        )
+        if not held:
+            return 0
+
+        release_stock(order_quantities(held))
+        Order.objects.filter(id__in=held).update(stock_status="released")
+
+    logger.info("[Inventory] Released stock for %s orders", len(held))
+    return len(held)
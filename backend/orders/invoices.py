@@ -0,0 +1,112 @@
+import hashlib
+import logging
+from functools import lru_cache
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceLayout:
+    """Page geometry and fonts, computed once per worker process (see get_layout)."""
+
+    def __init__(self, pagesize=A4):
+        self.pagesize = pagesize
+        self.width, self.height = pagesize
+        self.left = 50
+        self.top = self.height - 42
+        self.bottom = 50
+        self.line_height = 14
+        self.font = ("Helvetica", 10)
+        self.lines_per_page = int((self.top - self.bottom) / self.line_height)
+
+
+@lru_cache(maxsize=1)
+def get_layout():
+    return InvoiceLayout()
+
+
+def invoice_lines(order, items):
+    yield f"Invoice for Order #{order.id}"
+    yield ""
+    yield f"Customer: {order.user.username}"
+    yield f"Email: {order.user.email}"
+    yield f"Total Amount: {order.total_amount}"
+    yield f"Paid At: {order.paid_at}"
+    yield ""
+    yield "Items:"
+    for item in items:
+        name = item.product.name if item.product else "(removed product)"
+        yield f"- {name} x {item.quantity} @ {item.price_at_purchase}"
+
+
+def render_invoice_pdf(order, items):
+    """
+    Render the invoice as PDF bytes. Output depends only on the order and its
+    items (the canvas runs in invariant mode), so equal inputs hash equally.
+    """
+    layout = get_layout()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=layout.pagesize, invariant=1)
+    pdf.setTitle(f"Invoice for Order #{order.id}")
+
+    lines = list(invoice_lines(order, items))
+    for start in range(0, len(lines), layout.lines_per_page):
+        text = pdf.beginText(layout.left, layout.top)
+        text.setFont(*layout.font, leading=layout.line_height)
+        for line in lines[start:start + layout.lines_per_page]:
+            text.textLine(line)
+        pdf.drawText(text)
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+class InvoiceNotAvailable(Exception):
+    """The order has not been paid, so it has no invoice."""
+
+
+def invoice_available(order):
+    return order.paid_at is not None
+
+
+def get_invoice(order):
+    """
+    Return the order's stored Invoice, rendering and storing it on first use.
+    `order` should come with its user loaded; items are read in one query.
+    Raises InvoiceNotAvailable for an order that has not been paid.
+    """
+    if not invoice_available(order):
+        raise InvoiceNotAvailable(f"Order {order.id} has not been paid")
+    invoice = Invoice.objects.filter(order=order).first()
+    if invoice is not None:
+        return invoice
+
+    items = list(order.items.select_related("product").order_by("id"))
+    content = render_invoice_pdf(order, items)
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    invoice = Invoice(order=order, sha256=sha256, size=len(content))
+    invoice.file.save(f"invoice_order_{order.id}_{sha256[:12]}.pdf", ContentFile(content), save=False)
+    try:
+        with transaction.atomic():
+            invoice.save()
+    except IntegrityError:
+        # A concurrent render stored it first; keep that one
+        invoice.file.delete(save=False)
+        return Invoice.objects.get(order=order)
+
+    logger.info("[Invoice] Stored order_id=%s sha256=%s bytes=%s", order.id, sha256, len(content))
+    return invoice
+
+
+def read_invoice(invoice):
+    with invoice.file.open("rb") as f:
+        return f.read()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_paid_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_status',
+            field=models.CharField(choices=[('unreserved', 'Unreserved'), ('reserved', 'Reserved'), ('committed', 'Committed'), ('released', 'Released')], default='unreserved', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_stock_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='razorpay_payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:47
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_order_stats(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    DailyOrderStats = apps.get_model('orders', 'DailyOrderStats')
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status')
+        .annotate(order_count=Count('id'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+    DailyOrderStats.objects.bulk_create([
+        DailyOrderStats(date=row['day'], status=row['status'], order_count=row['order_count'], revenue=row['revenue'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_razorpay_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('date', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_order_stats, migrations.RunPython.noop),
+    ]
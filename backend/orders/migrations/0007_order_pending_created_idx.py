@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:50
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyWhereSupported(AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL; a plain CREATE INDEX on SQLite, which has no concurrent builds."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # Building the index must not lock the orders table against checkouts and payments
+    atomic = False
+
+    dependencies = [
+        ('orders', '0006_daily_order_stats'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyWhereSupported(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['status', 'created_at'], name='order_pending_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatsDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('order_count', models.IntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate
 from django.conf import settings
 from products.models import Product
 from django.utils import timezone
@@ -42,6 +46,13 @@ class Order(models.Model):
         ("refunded", "Refunded"),
     )
 
+    STOCK_STATUS_CHOICES = (
+        ("unreserved", "Unreserved"),
+        ("reserved", "Reserved"),
+        ("committed", "Committed"),
+        ("released", "Released"),
+    )
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
@@ -56,7 +67,38 @@ class Order(models.Model):
     tracking_number = models.CharField(max_length=100, null=True, blank=True)
     courier = models.CharField(max_length=50, null=True, blank=True)
 
+    # Razorpay references, stored when the payment order is created / captured
+    razorpay_order_id = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    razorpay_payment_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
 
+    # Inventory held for this order (see orders/inventory.py)
+    stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES, default="unreserved")
+
+    class Meta:
+        indexes = [
+            # Only pending orders are swept by auto_cancel_unpaid_orders, so only they are indexed
+            models.Index(
+                fields=["status", "created_at"],
+                name="order_pending_created_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as stored, so save() can move the order between DailyOrderStats buckets
+        if "status" in instance.__dict__:
+            instance._stored_status = instance.status
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = None if self._state.adding else getattr(self, "_stored_status", self.status)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != self.status:
+                DailyOrderStats.record([(self.created_at, self.total_amount, previous, self.status)])
+        self._stored_status = self.status
 
     def __str__(self):
         return f"Order({self.id}) - {self.user.username}"
@@ -70,3 +112,133 @@ class OrderItem(models.Model):
 
     def subtotal(self):
         return self.quantity * self.price_at_purchase
+
+
+class Invoice(models.Model):
+    """Rendered invoice PDF of an order, stored once and served by its content hash."""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="invoice")
+    file = models.FileField(upload_to="invoices/")
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Invoice(order={self.order_id})"
+
+
+class DailyOrderStats(models.Model):
+    """
+    Order count and revenue per (creation day, current status). Status
+    transitions are appended as OrderStatsDelta rows, folded in here by
+    orders.tasks.fold_order_stats, and the buckets are rebuilt by
+    orders.tasks.reconcile_order_stats.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "status")
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count}"
+
+    @classmethod
+    def record(cls, transitions):
+        """
+        Queue (created_at, total_amount, old_status, new_status) moves; old_status
+        is None for new orders. Only inserts, so checkouts never wait on the
+        lock of today's hot "pending" bucket.
+        """
+        deltas = []
+        for created_at, amount, old_status, new_status in transitions:
+            day = timezone.localdate(created_at)
+            if old_status is not None:
+                deltas.append(OrderStatsDelta(date=day, status=old_status, order_count=-1, revenue=-amount))
+            deltas.append(OrderStatsDelta(date=day, status=new_status, order_count=1, revenue=amount))
+        OrderStatsDelta.objects.bulk_create(deltas)
+
+    @classmethod
+    def fold(cls, batch_size=5000):
+        """Apply up to `batch_size` queued deltas to the buckets and delete them. Returns how many were folded."""
+        with transaction.atomic():
+            # SKIP LOCKED lets an overlapping fold take the next batch instead of waiting
+            deltas = list(
+                OrderStatsDelta.objects.select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list("id", "date", "status", "order_count", "revenue")[:batch_size]
+            )
+            totals = defaultdict(lambda: [0, Decimal("0")])
+            for _, day, status, count, revenue in deltas:
+                totals[(day, status)][0] += count
+                totals[(day, status)][1] += revenue
+
+            for (day, status), (count, revenue) in totals.items():
+                if count == 0 and revenue == 0:
+                    continue
+                bucket = cls.objects.filter(date=day, status=status)
+                if bucket.update(order_count=models.F("order_count") + count, revenue=models.F("revenue") + revenue):
+                    continue
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(date=day, status=status, order_count=count, revenue=revenue)
+                except IntegrityError:
+                    # Another fold created the bucket first
+                    bucket.update(order_count=models.F("order_count") + count, revenue=models.F("revenue") + revenue)
+            OrderStatsDelta.objects.filter(id__in=[delta[0] for delta in deltas]).delete()
+        return len(deltas)
+
+    @classmethod
+    def rebuild(cls, since=None):
+        """Recompute buckets from the Order table (from `since` onwards, or all of them)."""
+        orders = Order.objects.all()
+        buckets = cls.objects.all()
+        deltas = OrderStatsDelta.objects.all()
+        if since is not None:
+            orders = orders.filter(created_at__date__gte=since)
+            buckets = buckets.filter(date__gte=since)
+            deltas = deltas.filter(date__gte=since)
+
+        with transaction.atomic():
+            # Queued deltas are already reflected in the Order table. Deltas before
+            # buckets, the order fold() locks them in, so the two cannot deadlock
+            deltas.delete()
+            list(buckets.select_for_update().values_list("id", flat=True))
+            rows = list(
+                orders.annotate(day=TruncDate("created_at"))
+                .values("day", "status")
+                .annotate(order_count=models.Count("id"), revenue=models.Sum("total_amount"))
+                .order_by()
+            )
+            buckets.delete()
+            cls.objects.bulk_create([
+                cls(date=row["day"], status=row["status"], order_count=row["order_count"], revenue=row["revenue"])
+                for row in rows
+            ])
+        return len(rows)
+
+
+class OrderStatsDelta(models.Model):
+    """One pending change to a DailyOrderStats bucket, appended by DailyOrderStats.record()."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count:+d}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Celery task written in the same transaction as the change that triggers it,
+    published by orders.tasks.relay_outbox once that transaction has committed.
+    """
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"OutboxMessage({self.id}) - {self.task}"
@@ -0,0 +1,150 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django_redis import get_redis_connection
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = "email:outbox"
+FLUSH_SCHEDULED_KEY = "email:outbox:scheduled"
+
+
+def _confirmation_message(order, entry):
+    return EmailMessage(
+        subject=f"Order #{order.id} confirmed",
+        body=f"Hi {order.user.username},\n\nYour order #{order.id} has been paid successfully.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.user.email],
+    )
+
+
+def _status_message(order, entry):
+    status = entry["status"]
+    return EmailMessage(
+        subject=f"Order #{order.id} status updated: {status}",
+        body=f"Hi {order.user.username},\n\nYour order #{order.id} is now '{status}'.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.user.email],
+    )
+
+
+MESSAGE_BUILDERS = {
+    "confirmation": _confirmation_message,
+    "status": _status_message,
+}
+
+
+def build_entry_messages(entries):
+    """(entry, EmailMessage) pairs for {"kind", "order_id", ...} entries, loading every order and user in one query."""
+    orders = Order.objects.select_related("user").in_bulk({entry["order_id"] for entry in entries})
+    pairs = []
+    for entry in entries:
+        order = orders.get(entry["order_id"])
+        if order is None:
+            logger.warning("[Email] Skipping %s email for missing order_id=%s", entry["kind"], entry["order_id"])
+            continue
+        pairs.append((entry, MESSAGE_BUILDERS[entry["kind"]](order, entry)))
+    return pairs
+
+
+def build_messages(entries):
+    return [message for _, message in build_entry_messages(entries)]
+
+
+def send_order_emails(entries, connection=None):
+    """Send the entries over `connection`, or over one freshly opened connection. Returns the number sent."""
+    messages = build_messages(entries)
+    if not messages:
+        return 0
+    if connection is not None:
+        return connection.send_messages(messages)
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+class EmailOutbox:
+    """
+    Redis list of pending order emails. Queuing schedules one flush task
+    EMAIL_BATCH_WINDOW seconds out, so everything queued in that window is
+    sent together over a single SMTP connection.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or get_redis_connection("default")
+
+    def put(self, entries):
+        if not entries:
+            return
+        self.client.rpush(OUTBOX_KEY, *[json.dumps(entry) for entry in entries])
+
+        window = settings.EMAIL_BATCH_WINDOW
+        if self.client.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=window * 2 + 60):
+            from .tasks import send_queued_order_emails
+            send_queued_order_emails.apply_async(countdown=window)
+
+    def take(self, count):
+        with self.client.pipeline() as pipe:
+            pipe.lrange(OUTBOX_KEY, 0, count - 1)
+            pipe.ltrim(OUTBOX_KEY, count, -1)
+            raw, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
+
+    def requeue(self, entries):
+        """Put entries back at the head of the queue, in their order."""
+        if entries:
+            self.client.lpush(OUTBOX_KEY, *[json.dumps(entry) for entry in reversed(entries)])
+
+    def _next_batch(self, batch_size):
+        entries = self.take(batch_size)
+        if not entries:
+            # Cleared only once drained, so a flush that fails leaves it set for its retry
+            self.client.delete(FLUSH_SCHEDULED_KEY)
+            # Anything queued just before the delete did not schedule a flush of its own
+            entries = self.take(batch_size)
+        return entries
+
+    def _send(self, entries, connection):
+        try:
+            pairs = build_entry_messages(entries)
+        except Exception:
+            self.requeue(entries)
+            raise
+        sent = 0
+        for i, (entry, message) in enumerate(pairs):
+            try:
+                sent += connection.send_messages([message])
+            except Exception:
+                unsent = [entry for entry, _ in pairs[i:]]
+                logger.error("[Email] Send failed after %s emails, requeueing %s", sent, len(unsent), exc_info=True)
+                self.requeue(unsent)
+                raise
+        return sent
+
+    def flush(self, batch_size):
+        """
+        Send everything queued so far, batch_size entries per query, over one
+        connection. When a send fails, only the entries not sent yet go back to
+        the head of the queue, and the error is raised for the task to retry.
+        """
+        entries = self._next_batch(batch_size)
+        if not entries:
+            return 0
+
+        sent = 0
+        with get_connection() as connection:
+            while entries:
+                sent += self._send(entries, connection)
+                entries = self._next_batch(batch_size)
+        return sent
+
+
+def queue_order_email(kind, order_id, **extra):
+    queue_order_emails([{"kind": kind, "order_id": order_id, **extra}])
+
+
+def queue_order_emails(entries):
+    EmailOutbox().put(entries)
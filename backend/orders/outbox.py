@@ -0,0 +1,70 @@
+import logging
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+RELAY_SCHEDULED_KEY = "task:outbox:scheduled"
+
+
+def enqueue_task(task, *args, **kwargs):
+    """
+    Record `task(*args, **kwargs)` in the current transaction instead of
+    publishing it: the task only reaches the broker if the transaction commits,
+    and the request never waits on a broker round trip.
+    """
+    OutboxMessage.objects.create(task=task.name, args=list(args), kwargs=kwargs)
+    transaction.on_commit(schedule_relay)
+
+
+def schedule_relay(client=None):
+    """
+    Schedule one relay OUTBOX_RELAY_WINDOW seconds out, unless one already is,
+    so everything committed in that window is published together.
+    """
+    client = client or get_redis_connection("default")
+    window = settings.OUTBOX_RELAY_WINDOW
+    if client.set(RELAY_SCHEDULED_KEY, 1, nx=True, ex=window * 2 + 60):
+        from .tasks import relay_outbox
+        relay_outbox.apply_async(countdown=window)
+
+
+def _relay_batch(producer, batch_size):
+    with transaction.atomic():
+        # SKIP LOCKED lets an overlapping relay (beat + scheduled) take the next batch
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+        )
+        for message in messages:
+            current_app.send_task(message.task, args=message.args, kwargs=message.kwargs, producer=producer)
+        OutboxMessage.objects.filter(id__in=[message.id for message in messages]).delete()
+    return len(messages)
+
+
+def relay_outbox_messages(batch_size, producer=None, client=None):
+    """
+    Publish committed outbox rows in id order over one producer, batch_size rows
+    per transaction, deleting them as they go. Returns the number published.
+
+    A crash between publishing and committing republishes that batch, so
+    delivery is at least once: outbox tasks must be safe to run twice.
+    """
+    # Cleared first: anything committed from here on schedules its own relay
+    (client or get_redis_connection("default")).delete(RELAY_SCHEDULED_KEY)
+
+    relayed = 0
+    with current_app.producer_or_acquire(producer) as producer:
+        while True:
+            count = _relay_batch(producer, batch_size)
+            relayed += count
+            if count < batch_size:
+                break
+
+    if relayed:
+        logger.info("[Outbox] relayed=%s", relayed)
+    return relayed
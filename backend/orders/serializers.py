@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import Cart, CartItem, Order, OrderItem
 from products.serializers import ProductListSerializer
@@ -12,7 +14,9 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CartItem
-        fields = ("id", "product", "product_id", "quantity", "subtotal")
+        # No row id: the Redis cart store has no CartItem rows until it flushes, and lines are
+        # addressed by product id (cart/remove/<product_id>/) in both stores
+        fields = ("product", "product_id", "quantity", "subtotal")
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -29,7 +33,7 @@ class CartSerializer(serializers.ModelSerializer):
 
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -60,7 +64,7 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_items(self, obj):
         return [
             {
-                "product": item.product.name,
+                "product": item.product.name if item.product else None,
                 "price": item.price_at_purchase,
                 "quantity": item.quantity,
             }
@@ -74,3 +78,44 @@ class OrderSerializer(serializers.ModelSerializer):
             "shipped_at": obj.shipped_at,
             "delivered_at": obj.delivered_at,
         }
+
+
+# values()-based twin of OrderSerializer for large listings:
+# same output shape, built from plain rows instead of model instances.
+ORDER_ROW_FIELDS = (
+    "id", "status", "total_amount", "tracking_number", "courier",
+    "created_at", "paid_at", "shipped_at", "delivered_at",
+)
+ORDER_ITEM_ROW_FIELDS = ("order_id", "product__name", "price_at_purchase", "quantity")
+
+_total_amount_field = OrderSerializer().fields["total_amount"]
+_created_at_field = OrderSerializer().fields["created_at"]
+
+
+def serialize_order_rows(order_rows, item_rows):
+    items_by_order = defaultdict(list)
+    for item in item_rows:
+        items_by_order[item["order_id"]].append({
+            "product": item["product__name"],
+            "price": item["price_at_purchase"],
+            "quantity": item["quantity"],
+        })
+
+    return [
+        {
+            "id": row["id"],
+            "status": row["status"],
+            "total_amount": _total_amount_field.to_representation(row["total_amount"]),
+            "timeline": {
+                "created_at": row["created_at"],
+                "paid_at": row["paid_at"],
+                "shipped_at": row["shipped_at"],
+                "delivered_at": row["delivered_at"],
+            },
+            "tracking_number": row["tracking_number"],
+            "courier": row["courier"],
+            "items": items_by_order[row["id"]],
+            "created_at": _created_at_field.to_representation(row["created_at"]),
+        }
+        for row in order_rows
+    ]
@@ -1,80 +1,172 @@
+import logging
+import time
+
 from celery import shared_task
-from django.core.mail import EmailMessage, send_mail
+from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from io import BytesIO
 
-from .models import Order
+from .cart_store import get_cart_store
+from .inventory import release_order_stock
+from .invoices import get_invoice, invoice_available, read_invoice
+from .models import DailyOrderStats, Order
+from .notifications import EmailOutbox, queue_order_emails, send_order_emails
+from .outbox import enqueue_task, relay_outbox_messages
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def send_order_confirmation_email(order_id: int):
-    order = Order.objects.get(id=order_id)
-    subject = f"Order #{order.id} confirmed"
-    body = f"Hi {order.user.username},\n\nYour order #{order.id} has been paid successfully."
-    send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [order.user.email])
-    return f"Order confirmation sent to {order.user.email}"
+    """Send one confirmation right away; batched sends go through notifications.queue_order_email()."""
+    send_order_emails([{"kind": "confirmation", "order_id": order_id}])
+    return f"Order confirmation sent ({order_id})"
 
 
 @shared_task
 def send_order_status_update_email(order_id: int, status: str):
-    order = Order.objects.get(id=order_id)
-    subject = f"Order #{order.id} status updated: {status}"
-    body = f"Hi {order.user.username},\n\nYour order #{order.id} is now '{status}'."
-    send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [order.user.email])
-    return f"Status email sent ({order.id} -> {status})"
+    send_order_emails([{"kind": "status", "order_id": order_id, "status": status}])
+    return f"Status email sent ({order_id} -> {status})"
 
 
 @shared_task
-def generate_and_email_invoice(order_id: int):
+def batch_order_emails(entries):
     """
-    Simple PDF invoice generator (you can improve layout later).
-    Requires `reportlab` in requirements.txt
+    Add entries to the email outbox batch. Recorded with outbox.enqueue_task in
+    the transaction that changes the orders, so only committed changes email.
     """
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
+    queue_order_emails(entries)
+    return f"Queued {len(entries)} emails"
 
-    order = Order.objects.get(id=order_id)
 
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    text = p.beginText(50, 800)
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def send_queued_order_emails(self, batch_size: int = 1000):
+    """
+    Drain the email outbox over one SMTP connection. Scheduled by the outbox
+    when emails are queued; the beat entry catches anything left behind.
+    Retried when a send fails, from the first email not sent.
+    """
+    try:
+        sent = EmailOutbox().flush(batch_size)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+    return f"Sent {sent} queued emails"
 
-    text.textLine(f"Invoice for Order #{order.id}")
-    text.textLine("")
-    text.textLine(f"Customer: {order.user.username}")
-    text.textLine(f"Email: {order.user.email}")
-    text.textLine(f"Total Amount: {order.total_amount}")
-    text.textLine(f"Status: {order.status}")
-    text.textLine(f"Paid At: {order.paid_at}")
-    text.textLine("")
-    text.textLine("Items:")
 
-    for item in order.items.all():
-        text.textLine(f"- {item.product.name} x {item.quantity} @ {item.price_at_purchase}")
+@shared_task(acks_late=True)
+def relay_outbox(batch_size: int = 500):
+    """
+    Publish tasks recorded by outbox.enqueue_task() whose transactions have
+    committed. Scheduled when a task is recorded; the beat entry catches anything left behind.
+    """
+    count = relay_outbox_messages(batch_size)
+    return f"Relayed {count} outbox tasks"
 
-    p.drawText(text)
-    p.showPage()
-    p.save()
 
-    buffer.seek(0)
+@shared_task
+def generate_and_email_invoice(order_id: int):
+    """Email the order's invoice, rendering and storing it first if needed (see orders/invoices.py)."""
+    order = Order.objects.select_related("user").get(id=order_id)
+    if not invoice_available(order):
+        logger.warning("[Invoice] Not emailed, order_id=%s has not been paid", order_id)
+        return f"Order {order_id} has no invoice"
+    invoice = get_invoice(order)
+
     email = EmailMessage(
         subject=f"Invoice for Order #{order.id}",
         body="Please find attached your invoice.",
         from_email=settings.DEFAULT_FROM_EMAIL,
         to=[order.user.email],
     )
-    email.attach(f"invoice_order_{order.id}.pdf", buffer.read(), "application/pdf")
+    email.attach(f"invoice_order_{order.id}.pdf", read_invoice(invoice), "application/pdf")
     email.send()
     return f"Invoice emailed to {order.user.email}"
 
 
-@shared_task
-def auto_cancel_unpaid_orders():
+def _cancel_expired_batch(cutoff, batch_size):
+    """Cancel up to `batch_size` expired pending orders in one transaction. Returns (cancelled, released)."""
+    with transaction.atomic():
+        # SKIP LOCKED lets overlapping sweeps (and checkouts paying an order) work past each other
+        expired = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", created_at__lt=cutoff)
+            .order_by("created_at")
+            .values_list("id", "created_at", "total_amount")[:batch_size]
+        )
+        if not expired:
+            return 0, 0
+
+        order_ids = [order_id for order_id, _, _ in expired]
+        Order.objects.filter(id__in=order_ids).update(status="cancelled")
+        DailyOrderStats.record([(created_at, amount, "pending", "cancelled") for _, created_at, amount in expired])
+        released = release_order_stock(order_ids)
+        enqueue_task(
+            batch_order_emails,
+            [{"kind": "status", "order_id": order_id, "status": "cancelled"} for order_id in order_ids],
+        )
+    return len(expired), released
+
+
+@shared_task(acks_late=True)
+def auto_cancel_unpaid_orders(batch_size: int = 500, max_batches: int = 100):
     """
-    Cancel orders that remain 'pending' for more than 30 minutes.
+    Cancel orders that remain 'pending' for more than 30 minutes, give their
+    reserved stock back and notify their customers.
+
+    Works in batches of `batch_size` orders, each in its own short transaction,
+    and stops after `max_batches`; anything left is picked up by the next run.
     """
     cutoff = timezone.now() - timezone.timedelta(minutes=30)
-    qs = Order.objects.filter(status="pending", created_at__lt=cutoff)
-    count = qs.update(status="cancelled")
-    return f"Auto-cancelled {count} unpaid orders"
+    started = time.monotonic()
+    cancelled = released = batches = 0
+
+    while batches < max_batches:
+        batch_cancelled, batch_released = _cancel_expired_batch(cutoff, batch_size)
+        if not batch_cancelled:
+            break
+        batches += 1
+        cancelled += batch_cancelled
+        released += batch_released
+        if batch_cancelled < batch_size:
+            break
+
+    logger.info(
+        "[AutoCancel] cancelled=%s released=%s batches=%s duration_ms=%.1f",
+        cancelled, released, batches, (time.monotonic() - started) * 1000,
+    )
+    return f"Auto-cancelled {cancelled} unpaid orders"
+
+
+@shared_task(acks_late=True)
+def flush_dirty_carts(batch_size: int = 500):
+    """
+    Write Redis-held carts that changed since the last run back to the Cart/CartItem tables.
+    """
+    count = get_cart_store().flush_dirty(batch_size)
+    return f"Flushed {count} carts"
+
+
+@shared_task(acks_late=True)
+def fold_order_stats(batch_size: int = 5000, max_batches: int = 20):
+    """
+    Fold the status transitions queued as OrderStatsDelta rows into DailyOrderStats.
+    """
+    folded = 0
+    for _ in range(max_batches):
+        count = DailyOrderStats.fold(batch_size)
+        folded += count
+        if count < batch_size:
+            break
+    return f"Folded {folded} order stat deltas"
+
+
+@shared_task(acks_late=True)
+def reconcile_order_stats(days: int = 2):
+    """
+    Rebuild the DailyOrderStats buckets of the last `days` days from the Order table
+    (all of them when days is 0), correcting any drift from bulk updates or deletes.
+    """
+    since = timezone.localdate() - timezone.timedelta(days=days) if days else None
+    count = DailyOrderStats.rebuild(since)
+    return f"Reconciled {count} order stat buckets"
@@ -1,3 +1,1001 @@
-from django.test import TestCase
+import hashlib
+import json
+import queue
+import shutil
+import smtplib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import fakeredis
+from asgiref.sync import async_to_sync
+from celery.exceptions import Retry
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.mail.backends import locmem
+from django.db import connection, connections, transaction
+from django.db.models import Count, Sum
+from django.test import AsyncClient, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config.celery import app as celery_app
+from config.db_router import sticky_key
+from testing.budgets import QueryBudgetMixin
+from payments.tasks import process_webhook_event
+from products.models import Category, Product
+from users.models import User
+from .cart_store import DIRTY_CARTS_KEY, RedisCartStore
+from .inventory import InsufficientStock
+from .notifications import FLUSH_SCHEDULED_KEY, queue_order_email, queue_order_emails
+from .invoices import render_invoice_pdf
+from .models import Cart, CartItem, DailyOrderStats, Invoice, Order, OrderItem, OrderStatsDelta, OutboxMessage
+from .outbox import enqueue_task, relay_outbox_messages
+from .urls import async_urlpatterns
+from .tasks import (
+    auto_cancel_unpaid_orders,
+    batch_order_emails,
+    flush_dirty_carts,
+    fold_order_stats,
+    generate_and_email_invoice,
+    reconcile_order_stats,
+    relay_outbox,
+    send_order_confirmation_email,
+    send_queued_order_emails,
+)
+
+ORDERS_URL = "/api/orders/orders/"
+
+# The ASGI deployment's routes (settings.ASYNC_CATALOG_VIEWS), for AsyncCartViewTests
+urlpatterns = [path("api/orders/", include(async_urlpatterns))]
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5)
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_reserves_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+
+        response = self.client.post(ORDERS_URL)
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 2)
+        self.assertEqual(Order.objects.get().stock_status, "reserved")
+
+    def test_checkout_rejects_short_stock_without_side_effects(self):
+        other = Product.objects.create(sku="SKU-2", name="Case", price=Decimal("10.00"), inventory=10)
+        CartItem.objects.create(cart=self.cart, product=other, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=6)
+
+        response = self.client.post(ORDERS_URL)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["product_ids"], [self.product.id])
+        other.refresh_from_db()
+        self.assertEqual(other.inventory, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_auto_cancel_releases_reserved_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=4)
+        self.client.post(ORDERS_URL)
+        Order.objects.update(created_at=timezone.now() - timezone.timedelta(hours=1))
+
+        auto_cancel_unpaid_orders()
+
+        order = Order.objects.get()
+        self.assertEqual((order.status, order.stock_status), ("cancelled", "released"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 5)
+
+        # A second sweep must not release the same stock twice
+        auto_cancel_unpaid_orders()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 5)
+
+    def test_admin_marking_paid_commits_reserved_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        self.client.post(ORDERS_URL)
+        order = Order.objects.get()
+        admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.client.force_authenticate(admin)
+
+        with mock.patch("orders.outbox.schedule_relay"):
+            response = self.client.patch(f"{ORDERS_URL}{order.id}/status/", {"status": "paid"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stock_status), ("paid", "committed"))
+        self.assertIsNotNone(order.paid_at)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 2)
+
+        # Cancelling a paid order must not hand committed stock back
+        with mock.patch("orders.outbox.schedule_relay"):
+            self.client.patch(f"{ORDERS_URL}{order.id}/status/", {"status": "cancelled"}, format="json")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 2)
+
+
+class AutoCancelSweepTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("1.00"), inventory=0)
+
+    def _seed_backlog(self, count):
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, total_amount=Decimal("1.00"), stock_status="reserved") for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.product, quantity=1, price_at_purchase=Decimal("1.00")) for order in orders
+        ])
+        Order.objects.update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        DailyOrderStats.rebuild()
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_backlog_is_swept_in_batches(self, schedule_relay):
+        self._seed_backlog(1050)
+        fresh = Order.objects.create(user=self.user, total_amount=Decimal("1.00"))
+
+        with CaptureQueriesContext(connection) as ctx:
+            auto_cancel_unpaid_orders(batch_size=200)
+
+        self.assertEqual(Order.objects.filter(status="cancelled", stock_status="released").count(), 1050)
+        self.assertEqual(Order.objects.get(id=fresh.id).status, "pending")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 1050)
+
+        # One notification task per batch, recorded with it, covering every cancelled order once
+        notifications = OutboxMessage.objects.filter(task=batch_order_emails.name).values_list("args", flat=True)
+        self.assertEqual(len(notifications), 6)
+        notified = [entry["order_id"] for args in notifications for entry in args[0]]
+        self.assertCountEqual(notified, Order.objects.filter(status="cancelled").values_list("id", flat=True))
+
+        # Bounded work per batch, independent of how many orders a batch holds
+        self.assertLess(len(ctx.captured_queries), 6 * 20)
+        fold_order_stats()
+        stats = dict(DailyOrderStats.objects.values_list("status", "order_count"))
+        self.assertEqual((stats["cancelled"], stats["pending"]), (1050, 1))
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_max_batches_leaves_the_rest_for_the_next_run(self, schedule_relay):
+        self._seed_backlog(30)
+
+        auto_cancel_unpaid_orders(batch_size=10, max_batches=2)
+        self.assertEqual(Order.objects.filter(status="pending").count(), 10)
+
+        auto_cancel_unpaid_orders(batch_size=10, max_batches=2)
+        self.assertFalse(Order.objects.filter(status="pending").exists())
+        self.assertEqual(OutboxMessage.objects.filter(task=batch_order_emails.name).count(), 3)
+
+
+class OrderPlacementQueryTests(APITestCase):
+    def _place_order(self, lines):
+        user = User.objects.create_user(f"buyer{lines}", f"buyer{lines}@example.com", "pass")
+        cart = Cart.objects.create(user=user)
+        products = Product.objects.bulk_create([
+            Product(sku=f"SKU-{lines}-{i}", name=f"Item {i}", slug=f"item-{lines}-{i}", price=Decimal("2.50"), inventory=10)
+            for i in range(lines)
+        ])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products])
+
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(ORDERS_URL)
+        self.assertEqual(response.status_code, 201)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        _, single = self._place_order(1)
+        response, large = self._place_order(200)
+
+        self.assertEqual(single, large)
+        self.assertEqual(response.data["total_amount"], "1000.00")
+        self.assertEqual(len(response.data["items"]), 200)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data["id"]).count(), 200)
+        self.assertFalse(CartItem.objects.filter(cart__user__username="buyer200").exists())
+
+
+class OrderListingTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.customer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.products = Product.objects.bulk_create([
+            Product(sku=f"SKU-{i}", name=f"Item {i}", slug=f"item-{i}", price=Decimal("3.00"), inventory=10)
+            for i in range(3)
+        ])
+
+    def _seed_orders(self, count):
+        orders = Order.objects.bulk_create([Order(user=self.customer, total_amount=Decimal("9.00")) for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price_at_purchase=product.price)
+            for order in orders
+            for product in self.products
+        ])
+
+    def _list_query_count(self, user):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(ORDERS_URL)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_independent_of_page_size(self):
+        self._seed_orders(2)
+        small = (self._list_query_count(self.admin), self._list_query_count(self.customer))
+        self._seed_orders(18)
+        large = (self._list_query_count(self.admin), self._list_query_count(self.customer))
+        self.assertEqual(small, large)
+
+    def test_admin_rows_match_serializer_output(self):
+        self._seed_orders(3)
+        self.products[0].delete()
+
+        self.client.force_authenticate(self.customer)
+        expected = self.client.get(ORDERS_URL).json()
+        self.client.force_authenticate(self.admin)
+        actual = self.client.get(ORDERS_URL).json()
+
+        self.assertEqual(len(actual["results"]), 3)
+        for row in expected["results"] + actual["results"]:
+            row["items"].sort(key=lambda item: str(item["product"]))
+        self.assertEqual(actual["results"], expected["results"])
+
+    def test_listing_is_cursor_paginated(self):
+        self._seed_orders(25)
+        self.client.force_authenticate(self.admin)
+
+        first = self.client.get(ORDERS_URL).json()
+        second = self.client.get(first["next"]).json()
+
+        self.assertNotIn("count", first)
+        self.assertEqual(len(first["results"]), 20)
+        self.assertEqual(len(second["results"]), 5)
+        seen = {row["id"] for row in first["results"] + second["results"]}
+        self.assertEqual(len(seen), 25)
+
+    def test_orders_created_in_the_same_instant_are_paged_once_each(self):
+        self._seed_orders(25)
+        Order.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(self.admin)
+
+        ids, url = [], f"{ORDERS_URL}?page_size=7"
+        while url:
+            page = self.client.get(url).json()
+            ids += [row["id"] for row in page["results"]]
+            url = page["next"]
+
+        self.assertEqual(ids, sorted(Order.objects.values_list("id", flat=True), reverse=True))
+
+
+class AddToCartTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5)
+        Cart.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def _add(self, product_id, quantity):
+        return self.client.post("/api/orders/cart/add/", {"product_id": product_id, "quantity": quantity}, format="json")
+
+    def test_add_is_one_upsert(self):
+        with self.assertNumQueries(2):
+            self._add(self.product.id, 2)
+        with self.assertNumQueries(2):
+            response = self._add(self.product.id, 1)
+        self.assertEqual(response.data["quantity"], 3)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+
+    def test_add_refuses_to_exceed_stock(self):
+        self._add(self.product.id, 4)
+        response = self._add(self.product.id, 2)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+        self.assertEqual(self._add(self.product.id, 9).status_code, 409)
+
+    def test_unknown_product_and_bad_quantity(self):
+        self.assertEqual(self._add(999999, 1).status_code, 404)
+        self.assertEqual(self._add(self.product.id, 0).status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_remove_is_one_delete(self):
+        self._add(self.product.id, 1)
+        with self.assertNumQueries(1):
+            response = self.client.delete(f"/api/orders/cart/remove/{self.product.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete(f"/api/orders/cart/remove/{self.product.id}/").status_code, 404)
+
+
+class OrderStatsRollupTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.customer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.client.force_authenticate(self.admin)
+
+    def _expected(self):
+        qs = Order.objects.all()
+        return {
+            "total_orders": qs.count(),
+            "total_revenue": qs.filter(status__in=["paid", "shipped", "delivered", "refunded"])
+                               .aggregate(total=Sum("total_amount"))["total"] or 0,
+            "by_status": sorted((row["status"], row["count"]) for row in qs.values("status").annotate(count=Count("id")).order_by()),
+        }
+
+    def _served(self):
+        with self.assertNumQueries(2):
+            data = self.client.get("/api/orders/admin/stats/").data
+        return {
+            "total_orders": data["total_orders"],
+            "total_revenue": data["total_revenue"],
+            "by_status": sorted((row["status"], row["count"]) for row in data["by_status"]),
+        }
+
+    def test_rollup_follows_status_transitions(self):
+        orders = [Order.objects.create(user=self.customer, total_amount=Decimal(amount)) for amount in ("10.00", "20.00", "30.00", "40.00")]
+        orders[0].status = "paid"
+        orders[0].save()
+        orders[1].status = "paid"
+        orders[1].save()
+        orders[1].status = "shipped"
+        orders[1].save()
+        Order.objects.filter(id=orders[2].id).update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        auto_cancel_unpaid_orders()
+
+        self.assertEqual(self._served(), self._expected())
+        self.assertEqual(self._served()["total_revenue"], Decimal("30.00"))
+        last_7_days = self.client.get("/api/orders/admin/stats/").data["last_7_days"]
+        self.assertEqual(sum(day["count"] for day in last_7_days), 4)
+
+    def test_transitions_are_queued_and_folded_into_buckets(self):
+        order = Order.objects.create(user=self.customer, total_amount=Decimal("10.00"))
+        order.status = "paid"
+        order.save()
+
+        # Nothing touches the shared bucket rows on the write path
+        self.assertFalse(DailyOrderStats.objects.exists())
+        self.assertEqual(OrderStatsDelta.objects.count(), 3)
+        served = self._served()
+
+        fold_order_stats()
+
+        self.assertFalse(OrderStatsDelta.objects.exists())
+        self.assertEqual(dict(DailyOrderStats.objects.values_list("status", "order_count")), {"paid": 1})
+        self.assertEqual(self._served(), served)
+        self.assertEqual(served, self._expected())
+
+    def test_reconcile_repairs_drift(self):
+        for amount in ("5.00", "7.00"):
+            Order.objects.create(user=self.customer, total_amount=Decimal(amount))
+        Order.objects.update(status="delivered")  # bypasses save(), so the rollup drifts
+        self.assertNotEqual(self._served(), self._expected())
+
+        reconcile_order_stats(days=0)
+
+        self.assertEqual(self._served(), self._expected())
+        self.assertEqual(DailyOrderStats.objects.get().order_count, 2)
+
+
+@override_settings(EMAIL_BATCH_WINDOW=5)
+class OrderEmailBatchingTests(APITestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target, value in (
+            ("orders.notifications.get_redis_connection", mock.Mock(return_value=self.redis)),
+            ("orders.tasks.send_queued_order_emails.apply_async", mock.Mock()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_thousand_emails_share_one_connection(self):
+        users = User.objects.bulk_create([User(username=f"buyer{i}", email=f"buyer{i}@example.com") for i in range(50)])
+        orders = Order.objects.bulk_create([
+            Order(user=users[i % 50], total_amount=Decimal("1.00")) for i in range(1000)
+        ])
+        for chunk in range(0, 1000, 100):
+            queue_order_emails([
+                {"kind": "status", "order_id": order.id, "status": "shipped"} for order in orders[chunk:chunk + 100]
+            ])
+
+        # Ten enqueues inside one window schedule a single flush
+        send_queued_order_emails.apply_async.assert_called_once_with(countdown=5)
+
+        with mock.patch("orders.notifications.get_connection", wraps=get_connection) as opened:
+            # One query per 500-entry batch
+            with self.assertNumQueries(2):
+                result = send_queued_order_emails(batch_size=500)
+
+        self.assertEqual(result, "Sent 1000 queued emails")
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 1000)
+        self.assertEqual(mail.outbox[0].subject, f"Order #{orders[0].id} status updated: shipped")
+        self.assertEqual(mail.outbox[0].to, ["buyer0@example.com"])
+        self.assertEqual(send_queued_order_emails(), "Sent 0 queued emails")
+
+    def test_failed_send_requeues_only_the_unsent_emails(self):
+        user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        orders = Order.objects.bulk_create([Order(user=user, total_amount=Decimal("1.00")) for _ in range(5)])
+        queue_order_emails([{"kind": "status", "order_id": order.id, "status": "shipped"} for order in orders])
+        send_messages = locmem.EmailBackend.send_messages
+
+        def drops_on_the_third(backend, messages):
+            if messages[0].subject.startswith(f"Order #{orders[2].id} "):
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", drops_on_the_third), \
+                mock.patch.object(send_queued_order_emails, "retry", side_effect=Retry) as retry:
+            with self.assertRaises(Retry):
+                send_queued_order_emails()
+        retry.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+        # Still marked scheduled: the retry sends the rest, later emails do not schedule a second flush
+        self.assertTrue(self.redis.exists(FLUSH_SCHEDULED_KEY))
+
+        self.assertEqual(send_queued_order_emails(), "Sent 3 queued emails")
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            [f"Order #{order.id} status updated: shipped" for order in orders],
+        )
+        self.assertFalse(self.redis.exists(FLUSH_SCHEDULED_KEY))
+
+    def test_status_change_is_queued_not_sent(self):
+        admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        order = Order.objects.create(user=admin, total_amount=Decimal("5.00"), status="paid")
+        self.client.force_authenticate(admin)
+
+        with mock.patch("orders.outbox.schedule_relay"), self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/orders/orders/{order.id}/status/", {"status": "processing"}, format="json")
+        self.assertEqual(mail.outbox, [])
+
+        # The relay publishes the task recorded with the status change
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task, batch_order_emails.name)
+        batch_order_emails(*message.args)
+        queue_order_email("confirmation", order.id)
+        send_queued_order_emails()
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            [f"Order #{order.id} status updated: processing", f"Order #{order.id} confirmed"],
+        )
+
+
+class InvoiceTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.order = Order.objects.create(
+            user=self.user, total_amount=Decimal("25.00"), status="paid", paid_at=timezone.now(),
+        )
+        product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("12.50"), inventory=5)
+        OrderItem.objects.create(order=self.order, product=product, quantity=2, price_at_purchase=Decimal("12.50"))
+        self.client.force_authenticate(self.user)
+
+    def test_invoice_is_rendered_once_and_served_with_etag(self):
+        url = f"{ORDERS_URL}{self.order.id}/invoice/"
+        with mock.patch("orders.invoices.render_invoice_pdf", wraps=render_invoice_pdf) as render:
+            first = self.client.get(url)
+            again = self.client.get(url)
+
+        content = b"".join(first.streaming_content)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertTrue(content.startswith(b"%PDF"))
+        self.assertEqual(first["ETag"], f'"{hashlib.sha256(content).hexdigest()}"')
+        self.assertEqual(again["ETag"], first["ETag"])
+        self.assertEqual(render.call_count, 1)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_if_none_match_is_parsed_as_a_list_of_entity_tags(self):
+        url = f"{ORDERS_URL}{self.order.id}/invoice/"
+        etag = self.client.get(url)["ETag"]
+
+        for header, status in (
+            (f'"stale", W/{etag}', 304),
+            ("*", 304),
+            (f'"stale", "{etag}"', 200),  # the quoted tag embedded in a longer one
+            ('"stale"', 200),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=header).status_code, status)
+
+    def test_rendering_is_deterministic(self):
+        items = list(self.order.items.select_related("product"))
+        self.assertEqual(render_invoice_pdf(self.order, items), render_invoice_pdf(self.order, items))
+
+    def test_email_attaches_the_stored_invoice(self):
+        # Order with user, invoice lookup, items with products, then the insert (in a savepoint)
+        with self.assertNumQueries(6):
+            generate_and_email_invoice(self.order.id)
+
+        invoice = Invoice.objects.get(order=self.order)
+        _, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual(mimetype, "application/pdf")
+        self.assertEqual(hashlib.sha256(content).hexdigest(), invoice.sha256)
+
+    def test_unpaid_order_has_no_invoice(self):
+        # Any status but a recorded payment, e.g. moved along without being paid
+        for status in ("pending", "processing", "shipped", "refunded"):
+            Order.objects.filter(id=self.order.id).update(status=status, paid_at=None)
+
+            with self.subTest(status=status):
+                self.assertEqual(self.client.get(f"{ORDERS_URL}{self.order.id}/invoice/").status_code, 404)
+                generate_and_email_invoice(self.order.id)
+                self.assertFalse(Invoice.objects.exists())
+                self.assertEqual(mail.outbox, [])
+
+
+class CeleryQueueTopologyTests(SimpleTestCase):
+    def route(self, task):
+        return celery_app.amqp.router.route({}, task.name)["queue"].name
+
+    def test_tasks_are_routed_by_workload(self):
+        self.assertEqual(self.route(process_webhook_event), "critical")
+        self.assertEqual(self.route(send_order_confirmation_email), "critical")
+        self.assertEqual(self.route(send_queued_order_emails), "critical")
+        self.assertEqual(self.route(generate_and_email_invoice), "cpu")
+        self.assertEqual(self.route(auto_cancel_unpaid_orders), "periodic")
+        self.assertEqual(self.route(flush_dirty_carts), "periodic")
+        self.assertEqual(self.route(relay_outbox), "critical")
+
+    def test_idempotent_tasks_ack_late(self):
+        for task in (process_webhook_event, auto_cancel_unpaid_orders, reconcile_order_stats, flush_dirty_carts,
+                     relay_outbox):
+            self.assertTrue(task.acks_late, task.name)
+        self.assertFalse(generate_and_email_invoice.acks_late)
+
+    def test_invoice_burst_is_published_apart_from_critical_tasks(self):
+        # 100 invoices land just before 20 payment confirmations
+        with celery_app.connection_for_write("memory://") as conn:
+            queues = {name: conn.SimpleQueue(name) for name in ("critical", "cpu")}
+            for inbox in queues.values():
+                inbox.clear()
+            for task in [generate_and_email_invoice] * 100 + [send_order_confirmation_email] * 20:
+                task.apply_async((1,), connection=conn)
+
+            published = {}
+            for name, inbox in queues.items():
+                while inbox.qsize():
+                    message = inbox.get(timeout=1)
+                    published.setdefault(name, []).append(message.headers["task"])
+                    message.ack()
+
+        # The confirmations wait behind no invoice: the critical workers only ever see critical work
+        self.assertEqual(published["critical"], [send_order_confirmation_email.name] * 20)
+        self.assertEqual(published["cpu"], [generate_and_email_invoice.name] * 100)
+
+    def test_workers_reserve_one_message_at_a_time(self):
+        self.assertEqual(celery_app.conf.worker_prefetch_multiplier, 1)
+
+
+@override_settings(OUTBOX_RELAY_WINDOW=1)
+class TaskOutboxTests(APITestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target, value in (
+            ("orders.outbox.get_redis_connection", mock.Mock(return_value=self.redis)),
+            ("orders.tasks.relay_outbox.apply_async", mock.Mock()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.order = Order.objects.create(user=self.admin, total_amount=Decimal("5.00"), status="paid")
+
+    def drain(self, conn, queue_name):
+        inbox = conn.SimpleQueue(queue_name)
+        messages = []
+        while True:
+            try:
+                message = inbox.get(timeout=0.01)
+            except queue.Empty:
+                return messages
+            message.ack()
+            messages.append((message.headers["task"], message.payload[0]))
+
+    def test_tasks_are_published_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                enqueue_task(generate_and_email_invoice, self.order.id)
+                enqueue_task(process_webhook_event, 7)
+            try:
+                with transaction.atomic():
+                    enqueue_task(generate_and_email_invoice, 999)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(list(OutboxMessage.objects.values_list("args", flat=True)), [[self.order.id], [7]])
+        # Two commits inside one window schedule a single relay
+        relay_outbox.apply_async.assert_called_once_with(countdown=1)
+
+        with celery_app.connection_for_write("memory://") as conn:
+            for queue_name in ("critical", "cpu"):
+                conn.SimpleQueue(queue_name).clear()
+            # One batch: savepoint, lock, delete, release
+            with self.assertNumQueries(4):
+                self.assertEqual(relay_outbox_messages(500, producer=celery_app.amqp.Producer(conn)), 2)
+
+            self.assertEqual(self.drain(conn, "cpu"), [(generate_and_email_invoice.name, [self.order.id])])
+            self.assertEqual(self.drain(conn, "critical"), [(process_webhook_event.name, [7])])
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertFalse(self.redis.exists("task:outbox:scheduled"))
+
+
+@override_settings(CART_STORE="redis")
+class RedisCartStoreTests(APITestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch("orders.cart_store.get_redis_connection", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.phone = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=50)
+        self.case = Product.objects.create(sku="SKU-2", name="Case", price=Decimal("10.00"), inventory=50)
+        self.client.force_authenticate(self.user)
+
+    def test_endpoints_write_behind_to_tables(self):
+        self.client.post("/api/orders/cart/add/", {"product_id": self.phone.id, "quantity": 2}, format="json")
+        self.client.post("/api/orders/cart/add/", {"product_id": self.case.id, "quantity": 1}, format="json")
+        self.client.post("/api/orders/cart/add/", {"product_id": self.phone.id, "quantity": 1}, format="json")
+        self.client.delete(f"/api/orders/cart/remove/{self.case.id}/")
+
+        cart = self.client.get("/api/orders/cart/").data
+        self.assertEqual([(item["product"]["sku"], item["quantity"]) for item in cart["items"]], [("SKU-1", 3)])
+        self.assertEqual(cart["total"], Decimal("300.00"))
+        self.assertFalse(CartItem.objects.exists())
+
+        self.assertEqual(RedisCartStore(self.redis).flush_dirty(100), 1)
+        self.assertEqual(list(CartItem.objects.values_list("product__sku", "quantity")), [("SKU-1", 3)])
+
+    def test_checkout_flushes_and_consumes_redis_cart(self):
+        self.client.post("/api/orders/cart/add/", {"product_id": self.phone.id, "quantity": 2}, format="json")
+
+        response = self.client.post(ORDERS_URL)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["total_amount"], "200.00")
+        self.assertEqual(self.client.get("/api/orders/cart/").data["items"], [])
+
+    def test_items_render_the_same_as_the_database_store(self):
+        self.client.post("/api/orders/cart/add/", {"product_id": self.phone.id, "quantity": 2}, format="json")
+        redis_items = self.client.get("/api/orders/cart/").data["items"]
+        RedisCartStore(self.redis).flush(self.user)
+
+        with override_settings(CART_STORE="db"):
+            self.assertEqual(self.client.get("/api/orders/cart/").data["items"], redis_items)
+        self.assertNotIn("id", redis_items[0])
+
+    def test_cart_is_hydrated_from_tables(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.case, quantity=4)
+
+        data = self.client.get("/api/orders/cart/").data
+
+        self.assertEqual(data["id"], cart.id)
+        self.assertEqual([item["quantity"] for item in data["items"]], [4])
+
+
+class AsyncCartViewTests(APITestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        for target, client in (
+            ("orders.cart_store.get_redis_connection", lambda *args: fakeredis.FakeRedis(server=server)),
+            ("orders.cart_store.get_async_redis", lambda: fakeredis.FakeAsyncRedis(server=server)),
+        ):
+            patcher = mock.patch(target, side_effect=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.phone = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=50)
+        self.case = Product.objects.create(sku="SKU-2", name="Case", price=Decimal("10.00"), inventory=50)
+        self.client.force_authenticate(self.user)
+        self.auth = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    async def fetch_async(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            return await AsyncClient().get("/api/orders/cart/", headers=self.auth)
+
+    def test_matches_sync_view_for_both_stores(self):
+        for store in ("db", "redis"):
+            with self.subTest(store=store), override_settings(CART_STORE=store):
+                self.client.post("/api/orders/cart/add/", {"product_id": self.phone.id, "quantity": 2}, format="json")
+                expected = self.client.get("/api/orders/cart/")
+
+                response = async_to_sync(self.fetch_async)()
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+                self.assertTrue(json.loads(response.content)["items"])
+
+    @override_settings(CART_STORE="redis")
+    async def test_redis_cart_is_hydrated_from_tables(self):
+        cart = await Cart.objects.acreate(user=self.user)
+        await CartItem.objects.acreate(cart=cart, product=self.case, quantity=4)
+
+        data = json.loads((await self.fetch_async()).content)
+
+        self.assertEqual(data["id"], cart.id)
+        self.assertEqual([item["quantity"] for item in data["items"]], [4])
+
+    async def test_requires_authentication(self):
+        self.auth = {}
+        self.assertEqual((await self.fetch_async()).status_code, 401)
+
+
+class RedisCartConcurrencyTests(TransactionTestCase):
+    def test_concurrent_adds_are_not_lost(self):
+        user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=500)
+        store = RedisCartStore(fakeredis.FakeRedis())
+        store.get_cart(user)
+
+        def add(_):
+            try:
+                return store.add(user, product.id, 1)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(add, range(200)))
+
+        self.assertEqual(store.get_cart(user).items[0].quantity, 200)
+        store.flush(user)
+        self.assertEqual(CartItem.objects.get(cart__user=user).quantity, 200)
+
+    def test_concurrent_adds_never_exceed_stock_and_refusals_leave_no_trace(self):
+        user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=10)
+        redis = fakeredis.FakeRedis()
+        store = RedisCartStore(redis)
+        store.get_cart(user)
+
+        def add(_):
+            try:
+                store.add(user, product.id, 3)
+                return True
+            except InsufficientStock:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            accepted = sum(pool.map(add, range(8)))
+
+        self.assertEqual(accepted, 3)
+        self.assertEqual(store.get_cart(user).items[0].quantity, 9)
+
+        redis.delete(DIRTY_CARTS_KEY)
+        with self.assertRaises(InsufficientStock):
+            store.add(user, product.id, 2)
+        self.assertFalse(redis.exists(DIRTY_CARTS_KEY))
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row-level locking")
+class ConcurrentCartAndCheckoutTests(TransactionTestCase):
+    CHECKOUTS = 300
+    STOCK = 50
+
+    def test_parallel_checkouts_never_oversell(self):
+        product = Product.objects.create(sku="HOT-1", name="Hot item", price=Decimal("5.00"), inventory=self.STOCK)
+        users = User.objects.bulk_create([User(username=f"buyer{i}") for i in range(self.CHECKOUTS)])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for cart in carts])
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return client.post(ORDERS_URL).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            statuses = list(pool.map(checkout, users))
+
+        product.refresh_from_db()
+        self.assertEqual(statuses.count(201), self.STOCK)
+        self.assertEqual(statuses.count(409), self.CHECKOUTS - self.STOCK)
+        self.assertEqual(product.inventory, 0)
+        self.assertEqual(Order.objects.count(), self.STOCK)
+
+    def test_parallel_adds_lose_no_updates(self):
+        user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        Cart.objects.create(user=user)
+        roomy = Product.objects.create(sku="ROOMY", name="Roomy", price=Decimal("1.00"), inventory=1000)
+        scarce = Product.objects.create(sku="SCARCE", name="Scarce", price=Decimal("1.00"), inventory=50)
+
+        def add(product_id):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return client.post("/api/orders/cart/add/", {"product_id": product_id, "quantity": 1}, format="json").status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            roomy_statuses = list(pool.map(add, [roomy.id] * 200))
+            scarce_statuses = list(pool.map(add, [scarce.id] * 80))
+
+        self.assertEqual(roomy_statuses.count(200), 200)
+        self.assertEqual(CartItem.objects.get(product=roomy).quantity, 200)
+        self.assertEqual(scarce_statuses.count(200), 50)
+        self.assertEqual(CartItem.objects.get(product=scarce).quantity, 50)
+
+
+@skipUnless("replica" in connections, "needs the USE_SQLITE stand-in replica alias")
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """The stand-in replica mirrors default, so routing shows up as which connection ran the queries."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.customer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        Cart.objects.create(user=self.customer)
+        self.product = Product.objects.create(sku="SKU-1", name="Phone", slug="phone", price=Decimal("5.00"), inventory=10)
+        self.client = APIClient()
+
+    def _queries(self, method, path, data=None, user=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = getattr(self.client, method)(path, data, format="json")
+        self.assertLess(response.status_code, 400, getattr(response, "data", response))
+        return len(primary), len(replica)
+
+    def test_history_and_stats_read_from_the_replica(self):
+        for url, user in (
+            (ORDERS_URL, self.customer),
+            ("/api/orders/admin/stats/", self.admin),
+        ):
+            primary, replica = self._queries("get", url, user=user)
+            self.assertEqual(primary, 0, url)
+            self.assertGreater(replica, 0, url)
+
+    def test_catalog_cache_fills_read_from_the_primary(self):
+        for url in ("/api/products/", "/api/products/phone/"):
+            self.assertEqual(self._queries("get", url)[1], 0, url)
+
+        # A write invalidates; the entry refilled next must not come from a replica that lags behind it
+        self._queries("patch", "/api/products/phone/", {"price": "6.00"}, user=self.admin)
+        for url in ("/api/products/", "/api/products/phone/"):
+            primary, replica = self._queries("get", url)
+            self.assertGreater(primary, 0, url)
+            self.assertEqual(replica, 0, url)
+        self.assertEqual(self.client.get("/api/products/phone/").data["price"], "6.00")
+
+    def test_writes_and_other_views_use_the_primary(self):
+        primary, replica = self._queries("post", "/api/orders/cart/add/", {"product_id": self.product.id}, user=self.customer)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertEqual(self._queries("get", "/api/orders/cart/", user=self.customer)[1], 0)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self._queries("post", "/api/orders/cart/add/", {"product_id": self.product.id}, user=self.customer)
+        self._queries("post", ORDERS_URL, user=self.customer)
+
+        # The buyer sees their new order from the primary; another user still reads from the replica
+        self.assertEqual(self._queries("get", ORDERS_URL, user=self.customer)[1], 0)
+        self.assertGreater(self._queries("get", ORDERS_URL, user=self.admin)[1], 0)
+
+        cache.delete(sticky_key(self.customer.id))
+        self.assertGreater(self._queries("get", ORDERS_URL, user=self.customer)[1], 0)
+
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self._queries("get", ORDERS_URL, user=self.customer)[1], 0)
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Authenticated requests also pay 2 cache calls to the user throttle."""
+
+    sizes = (1, 15)
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.customer = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.cart = Cart.objects.create(user=self.customer)
+        self.product = Product.objects.create(sku="SKU-PHONE", name="Phone", price=Decimal("100.00"), inventory=50)
+        self.order = Order.objects.create(user=self.customer, total_amount=Decimal("100.00"), stock_status="reserved")
+        self.client.force_authenticate(self.customer)
+
+    def make_products(self, size):
+        # A category per product, so a missing select_related shows up as one query per row
+        categories = Category.objects.bulk_create([Category(name=f"Category {i}", slug=f"category-{i}") for i in range(size)])
+        return Product.objects.bulk_create([
+            Product(sku=f"SKU-{i}", name=f"Item {i}", slug=f"item-{i}", price=Decimal("3.00"), inventory=10, category=category)
+            for i, category in enumerate(categories)
+        ])
+
+    def seed_cart(self, size):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2) for product in self.make_products(size)
+        ])
+
+    def seed_order_items(self, size):
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, product=product, quantity=1, price_at_purchase=product.price)
+            for product in self.make_products(size)
+        ])
+
+    def seed_orders(self, size):
+        products = self.make_products(3)
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, total_amount=Decimal("9.00"), status="paid") for _ in range(size)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price_at_purchase=product.price)
+            for order in orders
+            for product in products
+        ])
+        DailyOrderStats.rebuild()
+
+    def test_cart(self):
+        self.assertRequestBudget(lambda: self.client.get("/api/orders/cart/"), self.seed_cart, queries=2, cache_calls=2)
+
+    def test_add_to_cart(self):
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/orders/cart/add/", {"product_id": self.product.id, "quantity": 1}),
+            self.seed_cart, queries=2, cache_calls=2,
+        )
+
+    def test_remove_from_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        self.assertRequestBudget(
+            lambda: self.client.delete(f"/api/orders/cart/remove/{self.product.id}/"),
+            self.seed_cart, queries=1, cache_calls=2,
+        )
+
+    def test_checkout(self):
+        self.assertRequestBudget(lambda: self.client.post(ORDERS_URL), self.seed_cart, queries=14, cache_calls=2)
+
+    def test_order_list(self):
+        self.assertRequestBudget(lambda: self.client.get(ORDERS_URL), self.seed_orders, queries=2, cache_calls=2)
+
+    def test_admin_order_list(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(lambda: self.client.get(ORDERS_URL), self.seed_orders, queries=2, cache_calls=2)
+
+    def test_order_detail(self):
+        self.assertRequestBudget(
+            lambda: self.client.get(f"{ORDERS_URL}{self.order.id}/"), self.seed_order_items, queries=2, cache_calls=2,
+        )
+
+    def test_status_update(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.patch(f"{ORDERS_URL}{self.order.id}/status/", {"status": "cancelled"}, format="json"),
+            self.seed_order_items, queries=17, cache_calls=2,
+        )
+
+    def test_admin_stats(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.get("/api/orders/admin/stats/"), self.seed_orders, queries=2, cache_calls=2,
+        )
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (
     AdminOrderStatsView,
     OrderViewSet,
@@ -26,3 +28,9 @@ urlpatterns = [
     path("orders/<int:order_id>/status/", UpdateOrderStatusView.as_view(), name="order-status-update"),
     path("admin/stats/", AdminOrderStatsView.as_view(), name="admin-order-stats"),
 ]
+
+# ASGI deployments read the cart through orders/async_views.py
+async_urlpatterns = [path("cart/", async_views.cart_detail, name="cart-detail")] + urlpatterns
+
+if settings.ASYNC_CATALOG_VIEWS:
+    urlpatterns = async_urlpatterns
@@ -1,21 +1,34 @@
 import logging
+from decimal import Decimal
 from rest_framework import generics, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
+from django.http import FileResponse
 from django.utils import timezone
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
+from django.utils.http import parse_etags
+from django.db import transaction
+from django.db.models import F, Prefetch, Sum, prefetch_related_objects
 
-from orders.tasks import send_order_status_update_email
+from config.db_router import ReplicaReadMixin
 from products.models import Product
-from .models import Cart, CartItem, Order, OrderItem
+from .cart_store import get_cart_store
+from .inventory import InsufficientStock, commit_order_stock, release_order_stock, reserve_stock
+from .invoices import get_invoice, invoice_available
+from .models import Cart, CartItem, DailyOrderStats, Order, OrderItem, OrderStatsDelta
+from .outbox import enqueue_task
 from .serializers import (
     CartSerializer,
     CartItemSerializer,
     AddToCartSerializer,
     OrderSerializer,
+    ORDER_ITEM_ROW_FIELDS,
+    ORDER_ROW_FIELDS,
+    serialize_order_rows,
 )
+from .tasks import batch_order_emails
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +43,7 @@ class CartView(generics.RetrieveAPIView):
         ip = self.request.META.get("REMOTE_ADDR")
         logger.info("[Cart] Fetch cart user=%s IP=%s", user.id, ip)
 
-        cart, _ = Cart.objects.get_or_create(user=user)
-        return cart
+        return get_cart_store().get_cart(user)
 
 
 class AddToCartView(generics.CreateAPIView):
@@ -43,23 +55,22 @@ class AddToCartView(generics.CreateAPIView):
         ip = request.META.get("REMOTE_ADDR")
         logger.info("[Cart] AddToCart user=%s IP=%s payload=%s", user.id, ip, request.data)
 
-        cart, _ = Cart.objects.get_or_create(user=user)
-        data = request.data
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data["product_id"]
+        quantity = serializer.validated_data["quantity"]
 
         try:
-            product = Product.objects.get(id=data["product_id"])
+            new_quantity = get_cart_store().add(user, product_id, quantity)
         except Product.DoesNotExist:
-            logger.warning("[Cart] Product not found user=%s product_id=%s", user.id, data.get("product_id"))
+            logger.warning("[Cart] Product not found user=%s product_id=%s", user.id, product_id)
             return Response({"error": "Product not found"}, status=404)
+        except InsufficientStock as e:
+            logger.warning("[Cart] Insufficient stock user=%s product_id=%s qty=%s", user.id, product_id, quantity)
+            return Response({"error": "Insufficient stock", "product_ids": e.product_ids}, status=409)
 
-        quantity = data.get("quantity", 1)
-
-        item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        item.quantity = item.quantity + quantity if not created else quantity
-        item.save()
-
-        logger.info("[Cart] Item added user=%s product_id=%s qty=%s", user.id, product.id, item.quantity)
-        return Response({"message": "Added to cart"}, status=200)
+        logger.info("[Cart] Item added user=%s product_id=%s qty=%s", user.id, product_id, new_quantity)
+        return Response({"message": "Added to cart", "quantity": new_quantity}, status=200)
 
 
 class RemoveCartItemView(generics.DestroyAPIView):
@@ -70,55 +81,112 @@ class RemoveCartItemView(generics.DestroyAPIView):
         ip = request.META.get("REMOTE_ADDR")
         logger.info("[Cart] RemoveItem user=%s IP=%s product_id=%s", user.id, ip, product_id)
 
-        cart, _ = Cart.objects.get_or_create(user=user)
-
-        try:
-            item = CartItem.objects.get(cart=cart, product_id=product_id)
-        except CartItem.DoesNotExist:
+        if not get_cart_store().remove(user, product_id):
             logger.warning("[Cart] Remove failed user=%s product_id=%s (not found)", user.id, product_id)
             return Response({"error": "Item not found in cart"}, status=404)
 
-        item.delete()
         logger.info("[Cart] Item removed user=%s product_id=%s", user.id, product_id)
         return Response({"message": "Item removed"}, status=200)
 
 
 # -------- ORDERS --------
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    # id breaks ties between orders created in the same instant (bulk_create, coarse clocks)
+    ordering = ("-created_at", "-id")
+
+
+class OrderViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         logger.info("[Order] Fetch orders user=%s role=%s", user.id, user.role)
-        return Order.objects.all() if user.role == "admin" else Order.objects.filter(user=user)
+        qs = Order.objects.all() if user.role == "admin" else Order.objects.filter(user=user)
+        if self.action == "invoice":
+            return qs.select_related("user")
+        return qs.prefetch_related(Prefetch("items", queryset=OrderItem.objects.select_related("product")))
+
+    def list(self, request, *args, **kwargs):
+        if request.user.role != "admin":
+            return super().list(request, *args, **kwargs)
+
+        # Admin listing spans every order: page over plain rows, then load the page's items in one query
+        page = self.paginate_queryset(Order.objects.values(*ORDER_ROW_FIELDS))
+        item_rows = (
+            OrderItem.objects.filter(order_id__in=[row["id"] for row in page])
+            .values(*ORDER_ITEM_ROW_FIELDS)
+            .order_by("id")
+        )
+        return self.get_paginated_response(serialize_order_rows(page, item_rows))
 
     def create(self, request, *args, **kwargs):
         user = request.user
         ip = request.META.get("REMOTE_ADDR")
         logger.info("[Order] CreateOrder user=%s IP=%s", user.id, ip)
 
+        cart_store = get_cart_store()
+        cart_store.flush(user)
+
         try:
             cart = Cart.objects.get(user=user)
         except Cart.DoesNotExist:
             logger.warning("[Order] Create failed (no cart) user=%s", user.id)
             return Response({"error": "Cart not found"}, status=404)
 
-        if not cart.items.exists():
-            logger.warning("[Order] Create failed (empty cart) user=%s", user.id)
-            return Response({"error": "Cart is empty"}, status=400)
-
-        total_amount = cart.total_amount()
-        order = Order.objects.create(user=user, total_amount=total_amount)
-
-        for item in cart.items.all():
-            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price_at_purchase=item.product.price)
-
-        cart.items.all().delete()
-
+        try:
+            with transaction.atomic():
+                # One read of the cart lines with their products; line totals are computed by the DB
+                items = list(
+                    cart.items.select_related("product")
+                    .select_for_update(of=("self",))
+                    .annotate(line_total=F("quantity") * F("product__price"))
+                )
+                if not items:
+                    logger.warning("[Order] Create failed (empty cart) user=%s", user.id)
+                    return Response({"error": "Cart is empty"}, status=400)
+
+                reserve_stock({item.product_id: item.quantity for item in items})
+
+                total_amount = sum(item.line_total for item in items)
+                order = Order.objects.create(user=user, total_amount=total_amount, stock_status="reserved")
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=item.product, quantity=item.quantity, price_at_purchase=item.product.price)
+                    for item in items
+                ])
+
+                CartItem.objects.filter(id__in=[item.id for item in items]).delete()
+        except InsufficientStock as e:
+            logger.warning("[Order] Create failed (insufficient stock) user=%s products=%s", user.id, e.product_ids)
+            return Response({"error": "Insufficient stock", "product_ids": e.product_ids}, status=409)
+
+        cart_store.consume(user, {item.product_id: item.quantity for item in items})
+        prefetch_related_objects([order], Prefetch("items", queryset=OrderItem.objects.select_related("product")))
         logger.info("[Order] Order created user=%s order_id=%s total=%s", user.id, order.id, total_amount)
         return Response(OrderSerializer(order).data, status=201)
 
+    @action(detail=True, methods=["get"])
+    def invoice(self, request, pk=None):
+        order = self.get_object()
+        if not invoice_available(order):
+            return Response({"error": "Invoice not available"}, status=404)
+
+        invoice = get_invoice(order)
+        etag = f'"{invoice.sha256}"'
+        if _etag_matches(etag, request.headers.get("If-None-Match", "")):
+            response = Response(status=304)
+        else:
+            response = FileResponse(
+                invoice.file.open("rb"), content_type="application/pdf", filename=f"invoice_order_{order.id}.pdf",
+            )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
 
 class UpdateOrderStatusView(APIView):
     permission_classes = [IsAdminUser]
@@ -140,66 +208,101 @@ class UpdateOrderStatusView(APIView):
         logger.info("[Order] StatusUpdate attempted admin=%s order_id=%s IP=%s payload=%s",
                     admin_user.id, order_id, ip, request.data)
 
-        try:
-            order = Order.objects.get(id=order_id)
-        except Order.DoesNotExist:
-            logger.error("[Order] StatusUpdate failed order not found id=%s", order_id)
-            return Response({"error": "Order not found"}, status=404)
-
         new_status = request.data.get("status")
 
         if new_status not in dict(Order.STATUS_CHOICES):
             logger.warning("[Order] Invalid status selected admin=%s attempted=%s", admin_user.id, new_status)
             return Response({"error": "Invalid status"}, status=400)
 
-        allowed_steps = self.VALID_FLOW.get(order.status, [])
-        if new_status not in allowed_steps:
-            logger.warning("[Order] Invalid transition admin=%s %s -> %s", admin_user.id, order.status, new_status)
-            return Response(
-                {"error": f"Invalid status transition: {order.status} → {new_status}"},
-                status=400
-            )
+        with transaction.atomic():
+            # Locked so a concurrent webhook or admin edit can't apply a second transition from the same status
+            try:
+                order = Order.objects.select_for_update().get(id=order_id)
+            except Order.DoesNotExist:
+                logger.error("[Order] StatusUpdate failed order not found id=%s", order_id)
+                return Response({"error": "Order not found"}, status=404)
+
+            allowed_steps = self.VALID_FLOW.get(order.status, [])
+            if new_status not in allowed_steps:
+                logger.warning("[Order] Invalid transition admin=%s %s -> %s", admin_user.id, order.status, new_status)
+                return Response(
+                    {"error": f"Invalid status transition: {order.status} → {new_status}"},
+                    status=400
+                )
+
+            update_fields = ["status"]
+
+            # Extra metadata for shipping/delivery
+            if new_status == "shipped":
+                order.tracking_number = request.data.get("tracking_number")
+                order.courier = request.data.get("courier")
+                order.shipped_at = timezone.now()
+                update_fields += ["tracking_number", "courier", "shipped_at"]
+
+            elif new_status == "delivered":
+                order.delivered_at = timezone.now()
+                update_fields.append("delivered_at")
+
+            elif new_status == "paid":
+                commit_order_stock(order)
+                order.paid_at = timezone.now()
+                update_fields += ["stock_status", "paid_at"]
+
+            order.status = new_status
+            order.save(update_fields=update_fields)
+            if new_status == "cancelled":
+                release_order_stock([order.id])
+            # Published only once the new status is visible to the email worker
+            enqueue_task(batch_order_emails, [{"kind": "status", "order_id": order.id, "status": new_status}])
+
+        logger.info("[Order] Status changed order_id=%s new_status=%s", order.id, new_status)
 
-        # Extra metadata for shipping/delivery
-        if new_status == "shipped":
-            order.tracking_number = request.data.get("tracking_number")
-            order.courier = request.data.get("courier")
-            order.shipped_at = timezone.now()
+        return Response({"message": f"Order updated to {order.status}"}, status=200)
 
-        elif new_status == "delivered":
-            order.delivered_at = timezone.now()
 
-        order.status = new_status
-        order.save()
+def _etag_matches(etag, if_none_match):
+    """Weak comparison of `etag` against the entity tags listed in an If-None-Match header."""
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in {tag.removeprefix("W/") for tag in etags}
 
-        send_order_status_update_email.delay(order.id, order.status)
 
-        logger.info("[Order] Status changed order_id=%s new_status=%s", order.id, new_status)
+def _sum_rollup(buckets, deltas, field):
+    """Order count and revenue per `field` over buckets and deltas, in one query."""
+    def grouped(queryset):
+        return queryset.values(field).annotate(count=Sum("order_count"), revenue=Sum("revenue")).order_by()
 
-        return Response({"message": f"Order updated to {order.status}"}, status=200)
+    totals = {}
+    for row in grouped(buckets).union(grouped(deltas), all=True):
+        total = totals.setdefault(row[field], {field: row[field], "count": 0, "revenue": Decimal("0")})
+        total["count"] += row["count"]
+        total["revenue"] += row["revenue"]
+    return [row for row in totals.values() if row["count"] > 0]
 
 
-class AdminOrderStatsView(APIView):
+class AdminOrderStatsView(ReplicaReadMixin, APIView):
     permission_classes = [IsAdminUser]
+    replica_actions = None
 
     def get(self, request):
         admin_user = request.user
         logger.info("[AdminStats] Stats requested by admin=%s", admin_user.id)
 
-        qs = Order.objects.all()
-
-        total_orders = qs.count()
-        total_revenue = qs.filter(status__in=["paid", "shipped", "delivered", "refunded"]) \
-                          .aggregate(total=Sum("total_amount"))["total"] or 0
+        # Served from the DailyOrderStats rollup, plus the deltas not folded into it yet,
+        # instead of scanning the Order table
+        buckets = DailyOrderStats.objects.filter(order_count__gt=0)
+        deltas = OrderStatsDelta.objects.all()
 
-        by_status = qs.values("status").annotate(count=Count("id")).order_by()
+        by_status = _sum_rollup(buckets, deltas, "status")
+        total_orders = sum(row["count"] for row in by_status)
+        total_revenue = sum(
+            (row["revenue"] for row in by_status if row["status"] in ["paid", "shipped", "delivered", "refunded"]),
+            Decimal("0"),
+        )
 
-        last_7_days = (
-            qs.filter(created_at__gte=timezone.now() - timezone.timedelta(days=7))
-              .annotate(date=TruncDate("created_at"))
-              .values("date")
-              .annotate(count=Count("id"), revenue=Sum("total_amount"))
-              .order_by("date")
+        since = timezone.localdate(timezone.now() - timezone.timedelta(days=7))
+        last_7_days = sorted(
+            _sum_rollup(buckets.filter(date__gte=since), deltas.filter(date__gte=since), "date"),
+            key=lambda row: row["date"],
         )
 
         logger.info("[AdminStats] Served for admin=%s", admin_user.id)
@@ -207,6 +310,6 @@ class AdminOrderStatsView(APIView):
         return Response({
             "total_orders": total_orders,
             "total_revenue": total_revenue,
-            "by_status": list(by_status),
-            "last_7_days": list(last_7_days),
+            "by_status": [{"status": row["status"], "count": row["count"]} for row in by_status],
+            "last_7_days": last_7_days,
         })
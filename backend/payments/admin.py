@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import WebhookEvent
 
-# Register your models here.
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "event", "order_key", "status", "attempts", "received_at", "processed_at")
+    list_filter = ("status", "event")
+    search_fields = ("event_id", "order_key")
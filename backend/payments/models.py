@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class WebhookEvent(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("failed", "Failed"),
+    )
+
+    # X-Razorpay-Event-Id (or a hash of the body when the header is absent)
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    # Razorpay order id the event belongs to; events sharing it are processed in arrival order
+    order_key = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"WebhookEvent({self.event_id}) - {self.event}"
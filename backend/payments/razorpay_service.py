@@ -1,4 +1,48 @@
 import razorpay
+import requests
 from django.conf import settings
 
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+from orders.models import Order
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session whose calls give up after `timeout` seconds unless they pass their own."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+client = razorpay.Client(
+    session=TimeoutSession(settings.RAZORPAY_TIMEOUT),
+    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+)
+
+
+def get_order_for_razorpay_order(razorpay_order_id, queryset=None):
+    """
+    Resolve the local Order behind a Razorpay order id with one indexed lookup.
+    Orders created before the id was stored locally fall back to the notes on the Razorpay order.
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    order = queryset.filter(razorpay_order_id=razorpay_order_id).first()
+    if order is None:
+        rzp_order = client.order.fetch(razorpay_order_id)
+        order = queryset.filter(id=rzp_order["notes"]["order_id"]).first()
+    if order is None:
+        raise Order.DoesNotExist(f"No order for razorpay_order_id={razorpay_order_id}")
+    return order
+
+
+def get_razorpay_order_id_for_payment(payment_id):
+    """The Razorpay order a payment belongs to: from the captured order when we have it, else from Razorpay."""
+    razorpay_order_id = (
+        Order.objects.filter(razorpay_payment_id=payment_id).values_list("razorpay_order_id", flat=True).first()
+    )
+    if razorpay_order_id is None:
+        razorpay_order_id = client.payment.fetch(payment_id).get("order_id")
+    return razorpay_order_id
@@ -0,0 +1,29 @@
+from celery import shared_task
+from django.db.models import F
+
+from .models import WebhookEvent
+from .webhooks import WebhookEventNotReady, process_pending_events
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30, acks_late=True)
+def process_webhook_event(self, event_id: int):
+    """
+    Apply a stored Razorpay webhook event (and any earlier pending ones for the same order).
+    """
+    try:
+        count = process_pending_events(event_id)
+    except WebhookEventNotReady as exc:
+        # Already counted and recorded on the event
+        _retry_or_fail(self, event_id, exc)
+    except Exception as exc:
+        WebhookEvent.objects.filter(id=event_id).update(attempts=F("attempts") + 1, error=str(exc))
+        _retry_or_fail(self, event_id, exc)
+    return f"Processed {count} webhook events"
+
+
+def _retry_or_fail(task, event_id, exc):
+    if task.request.retries >= task.max_retries:
+        # Out of retries: leave a failed event for an operator rather than one pending forever
+        WebhookEvent.objects.filter(id=event_id, status="pending").update(status="failed", error=str(exc))
+        raise exc
+    raise task.retry(exc=exc)
@@ -1,3 +1,365 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from testing.budgets import QueryBudgetMixin
+from orders.models import Order, OutboxMessage
+from users.models import User
+from .models import WebhookEvent
+from .tasks import process_webhook_event
+from .webhooks import WebhookEventNotReady, process_pending_events
+
+WEBHOOK_URL = "/api/payments/razorpay/webhook/"
+WEBHOOK_SECRET = "whsec_test"
+
+
+class FakeRazorpayOrders:
+    def __init__(self):
+        self.orders = {}
+        self.create_calls = 0
+        self.fetch_calls = 0
+
+    def create(self, data):
+        self.create_calls += 1
+        razorpay_order_id = f"order_fake{len(self.orders) + 1}"
+        self.orders[razorpay_order_id] = {"id": razorpay_order_id, **data}
+        return self.orders[razorpay_order_id]
+
+    def fetch(self, razorpay_order_id):
+        self.fetch_calls += 1
+        return self.orders[razorpay_order_id]
+
+
+class FakeRazorpayPayments:
+    def __init__(self):
+        self.refunds = []
+        self.payments = {}
+
+    def fetch(self, payment_id):
+        return self.payments[payment_id]
+
+    def refund(self, data):
+        self.refunds.append(data)
+        return {"id": f"rfnd_fake{len(self.refunds)}", "entity": "refund", **data}
+
+
+class FakeRazorpayUtility:
+    def verify_payment_signature(self, params):
+        return True
+
+
+class FakeRazorpayClient:
+    """Stands in for razorpay.Client: records orders locally, never calls the network."""
+
+    def __init__(self):
+        self.order = FakeRazorpayOrders()
+        self.payment = FakeRazorpayPayments()
+        self.utility = FakeRazorpayUtility()
+
+
+def captured_event(razorpay_order_id, payment_id="pay_fake1"):
+    return {
+        "event": "payment.captured",
+        "payload": {"payment": {"entity": {"id": payment_id, "order_id": razorpay_order_id, "status": "captured"}}},
+    }
+
+
+def refund_event(payment_id="pay_fake1"):
+    return {
+        "event": "refund.processed",
+        "payload": {"refund": {"entity": {"id": "rfnd_1", "payment_id": payment_id}}},
+    }
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class RazorpayWebhookTests(APITestCase):
+    def setUp(self):
+        self.fake = FakeRazorpayClient()
+        for target in ("payments.views.client", "payments.razorpay_service.client"):
+            patcher = mock.patch(target, self.fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal("100.00"))
+        self.rzp_order = self.fake.order.create({"notes": {"order_id": self.order.id, "user_id": self.user.id}})
+        Order.objects.filter(id=self.order.id).update(razorpay_order_id=self.rzp_order["id"])
+
+    def _deliver(self, payload, event_id="evt_1", signature=None):
+        body = json.dumps(payload).encode()
+        signature = signature or hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.generic(
+            "POST", WEBHOOK_URL, body, content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_event_is_stored_and_acknowledged_once(self, schedule_relay):
+        payload = captured_event(self.rzp_order["id"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self._deliver(payload)
+        with self.captureOnCommitCallbacks(execute=True):
+            replay = self._deliver(payload)
+
+        self.assertEqual(first.data, {"message": "Event accepted"})
+        self.assertEqual(replay.data, {"message": "Duplicate event"})
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.order_key, event.status), (self.rzp_order["id"], "pending"))
+        # Processing is recorded in the outbox with the event, not published from the request
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.task, message.args), ("payments.tasks.process_webhook_event", [event.id]))
+        schedule_relay.assert_called_once_with()
+        # Acknowledging does no Razorpay round trip
+        self.assertEqual(self.fake.order.fetch_calls, 0)
+
+    def test_bad_signature_is_rejected(self):
+        response = self._deliver(captured_event(self.rzp_order["id"]), signature="0" * 64)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_processing_marks_order_paid(self, schedule_relay):
+        self._deliver(captured_event(self.rzp_order["id"]))
+        event = WebhookEvent.objects.get()
+        OutboxMessage.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_events(event.id), 1)
+
+        self.order.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(event.status, "processed")
+        self.assertEqual(self.order.razorpay_payment_id, "pay_fake1")
+        # The confirmation and the invoice are recorded in the outbox with the order change
+        self.assertEqual(list(OutboxMessage.objects.order_by("id").values_list("task", "args")), [
+            ("orders.tasks.batch_order_emails", [[{"kind": "confirmation", "order_id": self.order.id}]]),
+            ("orders.tasks.generate_and_email_invoice", [self.order.id]),
+        ])
+        # The order is resolved from its stored razorpay_order_id, not from Razorpay
+        self.assertEqual(self.fake.order.fetch_calls, 0)
+
+        # Re-running the task for a processed event is a no-op
+        self.assertEqual(process_pending_events(event.id), 0)
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_events_for_one_order_apply_in_arrival_order(self, schedule_relay):
+        self._deliver(captured_event(self.rzp_order["id"], "pay_a"), event_id="evt_1")
+        self._deliver(captured_event(self.rzp_order["id"], "pay_b"), event_id="evt_2")
+        first, second = WebhookEvent.objects.order_by("id")
+        OutboxMessage.objects.all().delete()
+
+        # The later event's task runs first and drains the earlier one before it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_events(second.id), 2)
+        self.assertEqual(process_pending_events(first.id), 0)
+        self.assertEqual(OutboxMessage.objects.filter(task="orders.tasks.batch_order_emails").count(), 1)
+
+    def test_unknown_order_is_marked_failed(self):
+        self.fake.order.orders["order_orphan"] = {"id": "order_orphan", "notes": {"order_id": 999999}}
+        self._deliver(captured_event("order_orphan"))
+        event = WebhookEvent.objects.get()
+
+        process_pending_events(event.id)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, "failed")
+        self.assertIn("order_orphan", event.error)
+
+    def test_legacy_order_falls_back_to_razorpay_notes(self):
+        Order.objects.filter(id=self.order.id).update(razorpay_order_id=None)
+        self._deliver(captured_event(self.rzp_order["id"]))
+
+        process_pending_events(WebhookEvent.objects.get().id)
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.razorpay_order_id), ("paid", self.rzp_order["id"]))
+        self.assertEqual(self.fake.order.fetch_calls, 1)
+
+    def test_refund_resolves_order_by_payment_id(self):
+        Order.objects.filter(id=self.order.id).update(status="paid", razorpay_payment_id="pay_fake1")
+        self._deliver(refund_event(), event_id="evt_refund")
+        event = WebhookEvent.objects.get()
+        # The webhook keys events from the payload alone; the refund's order is resolved by the worker
+        self.assertEqual(event.order_key, "")
+
+        process_pending_events(event.id)
+
+        self.order.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(self.order.status, "refunded")
+        # Keyed by the Razorpay order, like the capture of the same payment
+        self.assertEqual(event.order_key, self.rzp_order["id"])
+
+    @mock.patch("orders.outbox.schedule_relay")
+    def test_refund_ahead_of_its_capture_waits_for_it(self, schedule_relay):
+        self.fake.payment.payments["pay_fake1"] = {"id": "pay_fake1", "order_id": self.rzp_order["id"]}
+        with mock.patch.object(self.fake.payment, "fetch", wraps=self.fake.payment.fetch) as fetch:
+            self._deliver(refund_event(), event_id="evt_refund")
+            self._deliver(refund_event(), event_id="evt_refund")
+            # Neither the delivery nor the redelivery waits on Razorpay
+            fetch.assert_not_called()
+            refund = WebhookEvent.objects.get()
+
+            with self.assertRaises(WebhookEventNotReady):
+                process_pending_events(refund.id)
+            fetch.assert_called_once_with("pay_fake1")
+        refund.refresh_from_db()
+        self.assertEqual((refund.order_key, refund.status, refund.attempts), (self.rzp_order["id"], "pending", 1))
+
+        # The capture is not held up by the refund queued before it, and lets it apply
+        self._deliver(captured_event(self.rzp_order["id"]), event_id="evt_capture")
+        capture = WebhookEvent.objects.latest("id")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_events(capture.id), 2)
+
+        self.order.refresh_from_db()
+        refund.refresh_from_db()
+        self.assertEqual(self.order.status, "refunded")
+        self.assertEqual(refund.status, "processed")
+
+    def test_event_still_failing_after_the_last_retry_is_marked_failed(self):
+        self._deliver(refund_event("pay_unknown"), event_id="evt_refund")
+        event = WebhookEvent.objects.get()
+
+        process_webhook_event.apply(args=(event.id,), retries=process_webhook_event.max_retries)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, "failed")
+        self.assertIn("pay_unknown", event.error)
+
+
+class RazorpayOrderReferenceTests(APITestCase):
+    def setUp(self):
+        self.fake = FakeRazorpayClient()
+        for target in ("payments.views.client", "payments.razorpay_service.client"):
+            patcher = mock.patch(target, self.fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal("100.00"))
+        self.client.force_authenticate(self.user)
+
+    def test_create_stores_razorpay_order_id_once(self):
+        first = self.client.post("/api/payments/razorpay/create-order/", {"order_id": self.order.id}, format="json")
+        second = self.client.post("/api/payments/razorpay/create-order/", {"order_id": self.order.id}, format="json")
+
+        self.order.refresh_from_db()
+        self.assertEqual(first.data["order_id"], self.order.razorpay_order_id)
+        self.assertEqual(second.data["order_id"], self.order.razorpay_order_id)
+        self.assertEqual(self.fake.order.create_calls, 1)
+
+    def test_verify_resolves_order_locally(self):
+        self.client.post("/api/payments/razorpay/create-order/", {"order_id": self.order.id}, format="json")
+        self.order.refresh_from_db()
+
+        response = self.client.post("/api/payments/razorpay/verify/", {
+            "razorpay_order_id": self.order.razorpay_order_id,
+            "razorpay_payment_id": "pay_fake1",
+            "razorpay_signature": "sig",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "processing")
+        self.assertEqual(self.fake.order.fetch_calls, 0)
+
+    def test_verify_leaves_paid_order_alone(self):
+        Order.objects.filter(id=self.order.id).update(razorpay_order_id="order_paid", status="paid")
+
+        response = self.client.post("/api/payments/razorpay/verify/", {
+            "razorpay_order_id": "order_paid",
+            "razorpay_payment_id": "pay_fake1",
+            "razorpay_signature": "sig",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+
+    def test_verify_rejects_another_users_order(self):
+        Order.objects.filter(id=self.order.id).update(razorpay_order_id="order_other")
+        self.client.force_authenticate(User.objects.create_user("intruder", "x@example.com", "pass"))
+
+        response = self.client.post("/api/payments/razorpay/verify/", {
+            "razorpay_order_id": "order_other",
+            "razorpay_payment_id": "pay_fake1",
+            "razorpay_signature": "sig",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """The 2 cache calls of the other endpoints are the user throttle; the webhook is not throttled."""
+
+    sizes = (1, 15)
+
+    def setUp(self):
+        self.fake = FakeRazorpayClient()
+        for target in ("payments.views.client", "payments.razorpay_service.client"):
+            patcher = mock.patch(target, self.fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal("100.00"))
+        self.client.force_authenticate(self.user)
+
+    def seed_orders(self, size):
+        Order.objects.bulk_create([
+            Order(user=self.user, total_amount=Decimal("10.00"), razorpay_order_id=f"order_seed{i}") for i in range(size)
+        ])
+
+    def seed_events(self, size):
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(event_id=f"evt_seed{i}", event="payment.captured", order_key="order_rzp1",
+                         payload={}, status="processed")
+            for i in range(size)
+        ])
+
+    def test_create_order(self):
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/payments/razorpay/create-order/", {"order_id": self.order.id}, format="json"),
+            self.seed_orders, queries=4, cache_calls=2,
+        )
+
+    def test_verify(self):
+        Order.objects.filter(id=self.order.id).update(razorpay_order_id="order_rzp1")
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/payments/razorpay/verify/", {
+                "razorpay_order_id": "order_rzp1", "razorpay_payment_id": "pay_1", "razorpay_signature": "sig",
+            }, format="json"),
+            self.seed_orders, queries=9, cache_calls=2,
+        )
+
+    def test_webhook(self):
+        self.client.force_authenticate(None)
+        body = json.dumps(captured_event("order_rzp1")).encode()
+        signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        self.assertRequestBudget(
+            lambda: self.client.generic(
+                "POST", WEBHOOK_URL, body, content_type="application/json",
+                HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID="evt_1",
+            ),
+            self.seed_events, queries=7, cache_calls=0,
+        )
+
+    def test_refund(self):
+        Order.objects.filter(id=self.order.id).update(status="paid", razorpay_payment_id="pay_1")
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.post(f"/api/payments/razorpay/refund/{self.order.id}/"),
+            self.seed_orders, queries=12, cache_calls=2,
+        )
@@ -6,13 +6,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.conf import settings
-from django.utils import timezone
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
 from orders.models import Order
-from orders.tasks import send_order_confirmation_email, generate_and_email_invoice
-from .razorpay_service import client
+from orders.outbox import enqueue_task
+from .models import WebhookEvent
+from .razorpay_service import client, get_order_for_razorpay_order
+from .tasks import process_webhook_event
+from .webhooks import event_order_key
 
 logger = logging.getLogger(__name__)
 
@@ -34,17 +37,21 @@ class CreateRazorpayOrder(APIView):
             return Response({"error": "Order not found"}, status=404)
 
         try:
-            razorpay_order = client.order.create({
-                "amount": int(order.total_amount * 100),
-                "currency": "INR",
-                "receipt": f"order_rcpt_{order.id}",
-                "notes": {"order_id": order.id, "user_id": user.id}
-            })
-
-            logger.info("[Razorpay] Order created successfully razorpay_order_id=%s", razorpay_order["id"])
+            if not order.razorpay_order_id:
+                razorpay_order = client.order.create({
+                    "amount": int(order.total_amount * 100),
+                    "currency": "INR",
+                    "receipt": f"order_rcpt_{order.id}",
+                    "notes": {"order_id": order.id, "user_id": user.id}
+                })
+                # Stored so verify/webhook calls resolve the order locally
+                order.razorpay_order_id = razorpay_order["id"]
+                order.save(update_fields=["razorpay_order_id"])
+
+                logger.info("[Razorpay] Order created successfully razorpay_order_id=%s", razorpay_order["id"])
 
             return Response({
-                "order_id": razorpay_order["id"],
+                "order_id": order.razorpay_order_id,
                 "key_id": settings.RAZORPAY_KEY_ID,
                 "amount": int(order.total_amount * 100),
                 "currency": "INR",
@@ -82,21 +89,25 @@ class VerifyRazorpayPayment(APIView):
             return Response({"error": "Signature verification failed"}, status=400)
 
         try:
-            rzp_order = client.order.fetch(data.get("razorpay_order_id"))
-            order_id = rzp_order["notes"]["order_id"]
-            user_id = rzp_order["notes"]["user_id"]
+            with transaction.atomic():
+                # Locked so this can't overwrite a "paid" the webhook commits in between
+                order = get_order_for_razorpay_order(
+                    data.get("razorpay_order_id"), Order.objects.select_for_update()
+                )
 
-            order = Order.objects.get(id=order_id)
+                if request.user.is_authenticated and order.user_id != request.user.id:
+                    logger.warning("[Razorpay] Unauthorized payment attempt order=%s expected_user=%s", order.id, order.user_id)
+                    return Response({"error": "Unauthorized order claim"}, status=403)
 
-            if order.user_id != int(user_id):
-                logger.warning("[Razorpay] Unauthorized payment attempt order=%s expected_user=%s", order_id, user_id)
-                return Response({"error": "Unauthorized order claim"}, status=403)
+                if order.status == "paid":
+                    logger.info("[Razorpay] Order already paid order=%s", order.id)
+                    return Response({"status": "success"}, status=200)
 
-            if order.status == "pending":
-                order.status = "processing"  # waiting for official webhook confirmation
-                order.save()
+                if order.status == "pending":
+                    order.status = "processing"  # waiting for official webhook confirmation
+                    order.save(update_fields=["status"])
 
-                logger.info("[Razorpay] Order marked processing order=%s user=%s", order.id, user_id)
+                    logger.info("[Razorpay] Order marked processing order=%s user=%s", order.id, order.user_id)
 
             return Response({"status": "success"}, status=200)
 
@@ -107,77 +118,49 @@ class VerifyRazorpayPayment(APIView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class RazorpayWebhookView(APIView):
+    """
+    Verify, store and acknowledge Razorpay events; the work happens in
+    payments.tasks.process_webhook_event. Redeliveries of a stored event id are
+    acknowledged without being processed again.
+    """
     permission_classes = [AllowAny]
+    throttle_classes = []
 
     def post(self, request):
-        body = request.body.decode("utf-8")
-        received_signature = request.headers.get("X-Razorpay-Signature")
+        body = request.body
+        received_signature = request.headers.get("X-Razorpay-Signature", "")
 
         logger.info("[Webhook] Received event signature=%s", received_signature)
 
         generated_signature = hmac.new(
             settings.RAZORPAY_WEBHOOK_SECRET.encode("utf-8"),
-            body.encode("utf-8"),
+            body,
             hashlib.sha256
         ).hexdigest()
 
-        if generated_signature != received_signature:
+        if not hmac.compare_digest(generated_signature, received_signature):
             logger.warning("[Webhook] Invalid signature")
             return Response({"error": "Invalid signature"}, status=400)
 
-        event = request.data.get("event")
-        logger.info("[Webhook] Event received: %s", event)
-
-        # -------- PAYMENT CAPTURE --------
-        if event == "payment.captured":
-            payment_data = request.data["payload"]["payment"]["entity"]
-            razorpay_order_id = payment_data.get("order_id")
-
-            rzp_order = client.order.fetch(razorpay_order_id)
-            order_id = rzp_order["notes"]["order_id"]
-
-            try:
-                order = Order.objects.get(id=order_id)
-
-                if order.status != "paid":
-                    for item in order.items.all():
-                        item.product.inventory -= item.quantity
-                        item.product.save()
-
-                    order.status = "paid"
-                    order.paid_at = timezone.now()
-                    order.razorpay_order_id = razorpay_order_id
-                    order.razorpay_payment_id = payment_data.get("id")
-                    order.save()
-
-                    send_order_confirmation_email.delay(order.id)
-                    generate_and_email_invoice.delay(order.id)
-
-                logger.info("[Webhook] Order paid order_id=%s", order_id)
-                return Response({"message": "Order updated"}, status=200)
-
-            except Order.DoesNotExist:
-                logger.error("[Webhook] Order not found id=%s", order_id)
-                return Response({"error": "Order not found"}, status=404)
-
-        # -------- REFUND HANDLING --------
-        elif event == "refund.processed":
-            refund_data = request.data["payload"]["refund"]["entity"]
-            payment_id = refund_data.get("payment_id")
-
-            try:
-                order = Order.objects.get(razorpay_payment_id=payment_id)
-                order.status = "refunded"
-                order.save()
-
-                logger.info("[Webhook] Order refunded order_id=%s", order.id)
-                return Response({"message": "Order marked refunded"}, status=200)
-
-            except Order.DoesNotExist:
-                logger.error("[Webhook] No order found for refund payment_id=%s", payment_id)
-                return Response({"error": "Order not found"}, status=404)
-
-        return Response({"message": "Ignored event"}, status=200)
+        event_id = request.headers.get("X-Razorpay-Event-Id") or hashlib.sha256(body).hexdigest()
+        with transaction.atomic():
+            event, created = WebhookEvent.objects.get_or_create(
+                event_id=event_id,
+                defaults={
+                    "event": request.data.get("event", ""),
+                    "order_key": event_order_key(request.data),
+                    "payload": request.data,
+                },
+            )
+            if created:
+                enqueue_task(process_webhook_event, event.id)
+
+        if not created:
+            logger.info("[Webhook] Duplicate event ignored event_id=%s", event_id)
+            return Response({"message": "Duplicate event"}, status=200)
+
+        logger.info("[Webhook] Event stored event_id=%s type=%s", event_id, event.event)
+        return Response({"message": "Event accepted"}, status=200)
 
 
 class RefundOrderView(APIView):
@@ -0,0 +1,152 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from orders.inventory import commit_order_stock
+from orders.models import Order
+from orders.outbox import enqueue_task
+from orders.tasks import batch_order_emails, generate_and_email_invoice
+from .models import WebhookEvent
+from .razorpay_service import get_order_for_razorpay_order, get_razorpay_order_id_for_payment
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookEventError(Exception):
+    """The event can never be applied (e.g. unknown order); it is marked failed instead of retried."""
+
+
+class WebhookEventNotReady(Exception):
+    """The event refers to something not applied yet (e.g. a refund ahead of its capture); it stays pending and is retried."""
+
+
+def event_order_key(payload):
+    """
+    The Razorpay order id the event belongs to, as far as the payload says; the
+    webhook stores it without any lookup. A refund without its payment entity
+    is keyed later, by resolve_order_key() in the worker.
+    """
+    payment = payload.get("payload", {}).get("payment", {}).get("entity", {})
+    return payment.get("order_id") or ""
+
+
+def resolve_order_key(event_id):
+    """
+    Key a refund stored without an order key by the Razorpay order of its
+    payment, so it is serialised with that order's capture: from the captured
+    order when we have it, else from Razorpay.
+    """
+    event = WebhookEvent.objects.filter(id=event_id, order_key="", status="pending").first()
+    if event is None:
+        return
+    payment_id = event.payload.get("payload", {}).get("refund", {}).get("entity", {}).get("payment_id")
+    if not payment_id:
+        return
+    order_key = get_razorpay_order_id_for_payment(payment_id) or payment_id
+    WebhookEvent.objects.filter(id=event_id, order_key="").update(order_key=order_key)
+
+
+def handle_payment_captured(payload):
+    payment_data = payload["payload"]["payment"]["entity"]
+    razorpay_order_id = payment_data.get("order_id")
+
+    try:
+        # Row lock serialises captures of the same order
+        order = get_order_for_razorpay_order(razorpay_order_id, Order.objects.select_for_update())
+    except Order.DoesNotExist as e:
+        raise WebhookEventError(str(e))
+
+    if order.status != "paid":
+        commit_order_stock(order)
+
+        order.status = "paid"
+        order.paid_at = timezone.now()
+        order.razorpay_order_id = razorpay_order_id
+        order.razorpay_payment_id = payment_data.get("id")
+        order.save()
+
+        enqueue_task(batch_order_emails, [{"kind": "confirmation", "order_id": order.id}])
+        enqueue_task(generate_and_email_invoice, order.id)
+
+    logger.info("[Webhook] Order paid order_id=%s", order.id)
+
+
+def handle_refund_processed(payload):
+    refund_data = payload["payload"]["refund"]["entity"]
+    payment_id = refund_data.get("payment_id")
+
+    try:
+        order = Order.objects.select_for_update().get(razorpay_payment_id=payment_id)
+    except Order.DoesNotExist:
+        # The capture may still be on its way
+        raise WebhookEventNotReady(f"No order found for refund payment_id={payment_id}")
+
+    order.status = "refunded"
+    order.save()
+    logger.info("[Webhook] Order refunded order_id=%s", order.id)
+
+
+EVENT_HANDLERS = {
+    "payment.captured": handle_payment_captured,
+    "refund.processed": handle_refund_processed,
+}
+
+
+def _apply(event):
+    """Apply one event in a savepoint; False if it has to wait for another event."""
+    handler = EVENT_HANDLERS.get(event.event)
+    event.attempts += 1
+    try:
+        with transaction.atomic():
+            if handler:
+                handler(event.payload)
+    except WebhookEventNotReady as e:
+        logger.info("[Webhook] Event %s deferred: %s", event.event_id, e)
+        event.error = str(e)
+        event.save(update_fields=["attempts", "error"])
+        return False
+    except WebhookEventError as e:
+        logger.error("[Webhook] Event %s failed: %s", event.event_id, e)
+        event.status = "failed"
+        event.error = str(e)
+    else:
+        event.status = "processed"
+        event.processed_at = timezone.now()
+    event.save(update_fields=["status", "attempts", "error", "processed_at"])
+    return True
+
+
+def process_pending_events(event_id):
+    """
+    Apply, in arrival order, every pending event that shares `event_id`'s order
+    key and arrived no later than it. Returns the number of events applied.
+
+    The pending rows stay locked for the whole batch, so concurrent workers
+    handling the same order wait for each other instead of reordering events.
+    An event that is not ready (a refund that arrived before its capture)
+    does not hold up the ones behind it: it is tried again once they have
+    been applied, and otherwise stays pending; if it is `event_id` itself,
+    WebhookEventNotReady is raised after the batch commits so the task
+    retries. Any unexpected error rolls the batch back for a retry. A refund
+    the webhook could not key is keyed first (resolve_order_key).
+    """
+    resolve_order_key(event_id)
+    try:
+        order_key = WebhookEvent.objects.values_list("order_key", flat=True).get(id=event_id)
+    except WebhookEvent.DoesNotExist:
+        return 0
+
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update()
+            .filter(order_key=order_key, status="pending", id__lte=event_id)
+            .order_by("id")
+        )
+        deferred = [event for event in events if not _apply(event)]
+        if deferred and len(deferred) < len(events):
+            deferred = [event for event in deferred if not _apply(event)]
+
+    if any(event.id == event_id for event in deferred):
+        raise WebhookEventNotReady(deferred[-1].error)
+    return len(events) - len(deferred)
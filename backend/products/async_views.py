@@ -0,0 +1,130 @@
+"""
+Async versions of ProductViewSet.list and .retrieve, mounted instead of the
+ViewSet's read routes when ASYNC_CATALOG_VIEWS is on (the ASGI deployment).
+They share the sync views' cache entries and return the same bodies; search,
+keyset pagination and every write are handed to the ViewSet. Like the
+ViewSet, they fill the caches from the primary, never from a replica.
+"""
+import logging
+import math
+
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from config import async_cache, cache_aside, local_cache
+from config.async_api import delegate, initial, render, render_error
+from config.metrics import record_cache
+
+from .cache_utils import PRODUCT_LIST_VERSION_KEY, get_product_list_version, product_detail_key, product_list_key
+from .serializers import ProductDetailSerializer, ProductListSerializer, adetail_from_cache, detail_cache_entry
+from .views import CACHE_TTL, ProductViewSet, SmallResultsSetPagination
+
+# The ViewSet's logger, so the same level and sampling filters apply
+logger = logging.getLogger("products.views")
+
+list_fallback = delegate(ProductViewSet.as_view({"get": "list", "post": "create"}))
+detail_fallback = delegate(ProductViewSet.as_view({
+    "get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy",
+}))
+
+
+def _page_size(request):
+    pagination = SmallResultsSetPagination
+    try:
+        size = int(request.GET[pagination.page_size_query_param])
+    except (KeyError, ValueError):
+        return pagination.page_size
+    return min(size, pagination.max_page_size) if size > 0 else pagination.page_size
+
+
+async def _paginate(request, queryset):
+    """PageNumberPagination over the async ORM: the same body, or NotFound for a page out of range."""
+    size = _page_size(request)
+    count = await queryset.acount()
+    pages = max(1, math.ceil(count / size))
+    number = request.GET.get("page", 1)
+    try:
+        number = pages if number == "last" else int(number)
+    except ValueError:
+        raise NotFound("Invalid page.")
+    if not 1 <= number <= pages:
+        raise NotFound("Invalid page.")
+
+    offset = (number - 1) * size
+    products = [product async for product in queryset[offset:offset + size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if number > 1:
+        previous = remove_query_param(url, "page") if number == 2 else replace_query_param(url, "page", number - 1)
+    return {
+        "count": count,
+        "next": replace_query_param(url, "page", number + 1) if number < pages else None,
+        "previous": previous,
+        "results": ProductListSerializer(products, many=True, context={"request": request}).data,
+    }
+
+
+@csrf_exempt
+async def product_list(request):
+    if request.method != "GET" or "search" in request.GET or request.GET.get("pagination") == "keyset":
+        return await list_fallback(request)
+    error = await initial(request)
+    if error is not None:
+        return error
+
+    logger.info(
+        "[ProductViewSet] Action=%s User=%s IP=%s slug=%s",
+        "LIST PRODUCTS", request.user.id or "Anonymous", request.META.get("REMOTE_ADDR"), None,
+    )
+    cache_key = product_list_key(request)
+    version = await async_cache.get(PRODUCT_LIST_VERSION_KEY)
+    if version is None:
+        version = await delegate(get_product_list_version)()
+
+    cached = await async_cache.get(cache_key, version=version)
+    record_cache("product_list", cached is not None)
+    if cached is not None:
+        return render(cached)
+
+    # The ViewSet's ?ordering= handling, applied to its queryset
+    queryset = OrderingFilter().filter_queryset(Request(request), ProductViewSet.queryset.all(), ProductViewSet)
+    try:
+        data = await _paginate(request, queryset)
+    except NotFound as exc:
+        return render_error(exc)
+    await async_cache.set(cache_key, data, CACHE_TTL, version=version)
+    return render(data)
+
+
+@csrf_exempt
+async def product_detail(request, slug):
+    if request.method != "GET":
+        return await detail_fallback(request, slug=slug)
+    error = await initial(request)
+    if error is not None:
+        return error
+
+    logger.info(
+        "[ProductViewSet] Action=%s User=%s IP=%s slug=%s",
+        "RETRIEVE PRODUCT", request.user.id or "Anonymous", request.META.get("REMOTE_ADDR"), slug,
+    )
+
+    async def load():
+        product = await ProductViewSet.queryset.filter(slug=slug).afirst()
+        if product is None:
+            raise NotFound("No Product matches the given query.")
+        return detail_cache_entry(ProductDetailSerializer(product, context={"request": request}).data)
+
+    try:
+        cache_key = product_detail_key(slug)
+        entry = await local_cache.aget_or_set(
+            cache_key,
+            lambda: cache_aside.afetch(cache_key, load, CACHE_TTL, metric="product_detail"),
+            metric="product_detail",
+        )
+    except NotFound as exc:
+        return render_error(exc)
+    return render(await adetail_from_cache(entry))
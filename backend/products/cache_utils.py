@@ -1,12 +1,66 @@
-from django_redis import get_redis_connection
-
-def clear_product_caches():
-    conn = get_redis_connection("default")
-    # delete keys matching product_detail:*
-    keys = conn.keys("product_detail:*")
-    if keys:
-        conn.delete(*keys)
-    # delete Django per-view cache keys (if you used cache_page)
-    cache_keys = conn.keys("views.decorators.cache*")
-    if cache_keys:
-        conn.delete(*cache_keys)
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from config import local_cache
+
+PRODUCT_LIST_VERSION_KEY = "product_list:version"
+
+
+def product_detail_key(slug):
+    return f"product_detail:{slug}"
+
+
+def category_key(category_id):
+    return f"category:{category_id}"
+
+
+def product_list_key(request):
+    # One entry per absolute URL, like cache_page, but namespaced by the list version
+    url = request.build_absolute_uri()
+    return "product_list:" + hashlib.md5(url.encode("utf-8")).hexdigest()
+
+
+def get_product_list_version():
+    version = cache.get(PRODUCT_LIST_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old generation
+        cache.add(PRODUCT_LIST_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(PRODUCT_LIST_VERSION_KEY)
+    return version
+
+
+def bump_product_list_version():
+    try:
+        return cache.incr(PRODUCT_LIST_VERSION_KEY)
+    except ValueError:
+        cache.add(PRODUCT_LIST_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        return cache.get(PRODUCT_LIST_VERSION_KEY)
+
+
+def invalidate_product_caches(slug=None):
+    """
+    Drop the detail entry of one product and retire every cached list page.
+
+    List pages are not deleted: bumping the version makes their keys unreachable
+    and they age out through their TTL. Cost is two cache commands, plus a
+    publish to drop the detail entry from every process' local tier,
+    regardless of how many products or pages are cached.
+    """
+    if slug:
+        cache.delete(product_detail_key(slug))
+        local_cache.invalidate(product_detail_key(slug))
+    bump_product_list_version()
+
+
+def invalidate_category_caches(category_id):
+    """
+    Drop a category's representation and retire every cached list page.
+
+    Cached product details hold the category by id and embed its
+    representation when served, so one key is published however many
+    products the category has.
+    """
+    local_cache.invalidate(category_key(category_id))
+    bump_product_list_version()
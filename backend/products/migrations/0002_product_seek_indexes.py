@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_seek_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_seek_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['inventory', 'id'], name='product_inventory_seek_idx'),
+        ),
+    ]
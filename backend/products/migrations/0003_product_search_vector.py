@@ -0,0 +1,140 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.sku, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, sku, description ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update();
+"""
+
+DROP_SQL = """
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector_update();
+"""
+
+# Rows per backfill UPDATE; each batch commits on its own, so row locks are held briefly
+BACKFILL_BATCH = 5000
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    Builds the index without blocking writes on PostgreSQL (when `extension` is
+    installed) and does nothing elsewhere. Run inside SeparateDatabaseAndState,
+    so the model state, and SQLite, never see these PostgreSQL-only indexes.
+    """
+
+    def __init__(self, model_name, index, extension=None):
+        super().__init__(model_name, index)
+        self.extension = extension
+
+    def applies_to(self, connection):
+        if connection.vendor != "postgresql":
+            return False
+        if self.extension is None:
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = %s", [self.extension])
+            return cursor.fetchone() is not None
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self.applies_to(schema_editor.connection):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self.applies_to(schema_editor.connection):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(SEARCH_TRIGGER_SQL)
+
+    # pg_trgm ships with contrib; skip the SKU trigram index where it is not installable
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone():
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(DROP_SQL)
+
+
+def backfill_search_vectors(apps, schema_editor):
+    """Fill search_vector for existing rows in id batches; the trigger covers rows written meanwhile."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        last_id = 0
+        while True:
+            cursor.execute(
+                """
+                UPDATE products_product SET name = name
+                WHERE id IN (
+                    SELECT id FROM products_product
+                    WHERE id > %s AND search_vector IS NULL
+                    ORDER BY id LIMIT %s
+                )
+                RETURNING id
+                """,
+                [last_id, BACKFILL_BATCH],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return
+            last_id = max(ids)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction, and the backfill commits per batch
+    atomic = False
+
+    dependencies = [
+        ('products', '0002_product_seek_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                AddIndexConcurrentlyOnPostgres(
+                    model_name='product',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=['search_vector'], name='product_search_vector_gin',
+                    ),
+                ),
+                AddIndexConcurrentlyOnPostgres(
+                    model_name='product',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        django.contrib.postgres.indexes.OpClass('sku', name='gin_trgm_ops'),
+                        name='product_sku_trgm',
+                    ),
+                    extension='pg_trgm',
+                ),
+            ],
+        ),
+    ]
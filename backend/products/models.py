@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.text import slugify
 
@@ -25,9 +26,17 @@ class Product(models.Model):
     image = models.ImageField(upload_to="products/images/", null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a PostgreSQL trigger (see migration 0003); unused on other databases
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Seek indexes for keyset pagination over ProductViewSet.ordering_fields
+            models.Index(fields=["created_at", "id"], name="product_created_seek_idx"),
+            models.Index(fields=["price", "id"], name="product_price_seek_idx"),
+            models.Index(fields=["inventory", "id"], name="product_inventory_seek_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -0,0 +1,105 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination for large catalogs.
+
+    Pages are seeked past the last row on the first `ordering` term
+    (restricted to the view's `ordering_fields`), with the primary key as
+    tiebreaker: `field <= v AND (field < v OR (field = v AND id < pk))`.
+    The redundant `field <= v` bound lets the database answer each page with
+    one range scan of the (field, id) index. No COUNT query is issued, so
+    page 1000 costs the same as page 1.
+
+    Search results are ordered by rank, which has no seek index, so
+    `?search=` is refused rather than silently re-ordered.
+    """
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    default_ordering = "-created_at"
+    invalid_cursor_message = "Invalid cursor"
+    search_message = "Keyset pages cannot be combined with search; use page numbers for search results."
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, view):
+        allowed = getattr(view, "ordering_fields", None) or []
+        for term in request.query_params.get(self.ordering_query_param, "").split(","):
+            term = term.strip()
+            if term and term.lstrip("-") in allowed:
+                return term
+        return self.default_ordering
+
+    def decode_cursor(self, request, model_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw_value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            return model_field.to_python(raw_value), int(pk)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.field_name)
+        raw_value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        payload = json.dumps([raw_value, instance.pk], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get(api_settings.SEARCH_PARAM):
+            raise ValidationError({api_settings.SEARCH_PARAM: [self.search_message]})
+        ordering = self.get_ordering(request, view)
+        self.field_name = ordering.lstrip("-")
+        descending = ordering.startswith("-")
+
+        queryset = queryset.order_by(ordering, "-pk" if descending else "pk")
+        cursor = self.decode_cursor(request, queryset.model._meta.get_field(self.field_name))
+        if cursor is not None:
+            value, pk = cursor
+            past, up_to = ("lt", "lte") if descending else ("gt", "gte")
+            queryset = queryset.filter(
+                Q(**{f"{self.field_name}__{up_to}": value}),
+                Q(**{f"{self.field_name}__{past}": value}) | Q(**{self.field_name: value, f"pk__{past}": pk}),
+            )
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "first": self.get_first_link(),
+            "results": data,
+        })
@@ -0,0 +1,46 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from rest_framework import filters
+
+_trigram_support = {}
+
+
+def has_trigram(connection):
+    if connection.alias not in _trigram_support:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_support[connection.alias] = cursor.fetchone() is not None
+    return _trigram_support[connection.alias]
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over Product.search_vector (GIN indexed) on PostgreSQL,
+    with SKU prefix and trigram matching for part-number style queries.
+
+    On any other database the plain SearchFilter behaviour over `search_fields`
+    is used, which keeps SQLite test runs working.
+    """
+    search_config = "english"
+
+    def filter_queryset(self, request, queryset, view):
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return super().filter_queryset(request, queryset, view)
+
+        terms = " ".join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, config=self.search_config, search_type="websearch")
+        queryset = queryset.annotate(rank=SearchRank(F("search_vector"), query))
+        match = Q(search_vector=query) | Q(sku__istartswith=terms)
+
+        if has_trigram(connection):
+            queryset = queryset.annotate(sku_similarity=TrigramSimilarity("sku", terms))
+            match |= Q(sku__trigram_similar=terms)
+            return queryset.filter(match).order_by(Greatest("rank", "sku_similarity").desc(), "-created_at")
+
+        return queryset.filter(match).order_by("-rank", "-created_at")
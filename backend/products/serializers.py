@@ -1,4 +1,7 @@
 from rest_framework import serializers
+
+from config import local_cache
+from .cache_utils import category_key
 from .models import Product, Category
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -6,6 +9,52 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ("id", "name", "slug")
 
+    def to_representation(self, instance):
+        # Nested in every product; the few categories are kept per process until products.signals drops them
+        return local_cache.get_or_set(
+            category_key(instance.pk), lambda: super(CategorySerializer, self).to_representation(instance),
+        )
+
+def category_representation(category_id):
+    """
+    A category as products embed it (None once deleted), kept per process
+    under category_key, the one key products.signals drops when it changes.
+    """
+    if category_id is None:
+        return None
+
+    def load():
+        category = Category.objects.filter(pk=category_id).first()
+        return None if category is None else CategorySerializer().to_representation(category)
+
+    return local_cache.get_or_set(category_key(category_id), load)
+
+
+async def acategory_representation(category_id):
+    """category_representation() for the async views."""
+    if category_id is None:
+        return None
+
+    async def load():
+        category = await Category.objects.filter(pk=category_id).afirst()
+        return None if category is None else CategorySerializer().to_representation(category)
+
+    return await local_cache.aget_or_set(category_key(category_id), load)
+
+
+def detail_cache_entry(data):
+    """A product detail as cached: its category by id, so no cached product goes stale when the category changes."""
+    return {**data, "category": data["category"] and data["category"]["id"]}
+
+
+def detail_from_cache(entry):
+    return {**entry, "category": category_representation(entry["category"])}
+
+
+async def adetail_from_cache(entry):
+    return {**entry, "category": await acategory_representation(entry["category"])}
+
+
 class ProductListSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
 
@@ -18,7 +67,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("search_vector",)
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
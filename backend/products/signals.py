@@ -0,0 +1,21 @@
+"""
+Cache invalidation on every Product and Category write, whether it comes from
+the API, the admin or a shell; connected in ProductsConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_utils import invalidate_category_caches, invalidate_product_caches
+from .models import Category, Product
+
+
+@receiver(post_save, sender=Product, dispatch_uid="products.invalidate_product")
+@receiver(post_delete, sender=Product, dispatch_uid="products.invalidate_deleted_product")
+def invalidate_product(sender, instance, **kwargs):
+    invalidate_product_caches(instance.slug)
+
+
+@receiver(post_save, sender=Category, dispatch_uid="products.invalidate_category")
+@receiver(post_delete, sender=Category, dispatch_uid="products.invalidate_deleted_category")
+def invalidate_category(sender, instance, **kwargs):
+    invalidate_category_caches(instance.pk)
@@ -1,3 +1,572 @@
-from django.test import TestCase
+import json
+import logging
+import queue
+import threading
+import time
+from decimal import Decimal
+from logging.handlers import QueueListener
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import fakeredis
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config import cache_aside, local_cache
+from config.logging_config import JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+from config.metrics import MetricsRegistry
+from config.middleware import PerformanceMiddleware
+from testing.budgets import QueryBudgetMixin, count_cache_calls
+from users.models import User
+from .cache_utils import category_key, get_product_list_version, product_detail_key
+from .models import Category, Product
+from .urls import async_urlpatterns
+
+# The ASGI deployment's routes (settings.ASYNC_CATALOG_VIEWS), for AsyncCatalogViewTests
+urlpatterns = [path("api/products/", include(async_urlpatterns))]
+
+
+class ProductCacheInvalidationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.phone = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5)
+        self.laptop = Product.objects.create(sku="SKU-2", name="Laptop", price=Decimal("900.00"), inventory=5)
+
+    def test_update_drops_only_its_own_detail_entry(self):
+        self.client.get(f"/api/products/{self.phone.slug}/")
+        self.client.get(f"/api/products/{self.laptop.slug}/")
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(f"/api/products/{self.phone.slug}/", {"price": "120.00"})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertIsNone(cache.get(product_detail_key(self.phone.slug)))
+        self.assertIsNotNone(cache.get(product_detail_key(self.laptop.slug)))
+
+    def test_update_retires_cached_list_pages(self):
+        version = get_product_list_version()
+        first = self.client.get("/api/products/")
+        self.assertEqual(first.data["count"], 2)
+
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f"/api/products/{self.phone.slug}/", {"price": "120.00"})
+        self.assertGreater(get_product_list_version(), version)
+
+        prices = {row["sku"]: row["price"] for row in self.client.get("/api/products/").data["results"]}
+        self.assertEqual(prices["SKU-1"], "120.00")
+
+    def test_list_is_served_from_cache_until_invalidated(self):
+        self.client.get("/api/products/")
+        Product.objects.filter(pk=self.phone.pk).update(name="Renamed outside the API")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/products/")
+        self.assertNotIn("Renamed outside the API", [row["name"] for row in cached.data["results"]])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Product.objects.bulk_create([
+            Product(sku=f"SKU-{i:02}", name=f"Item {i}", slug=f"item-{i}", price=Decimal(10 + i % 3), inventory=i % 4)
+            for i in range(30)
+        ])
+
+    def _walk(self, url):
+        skus = []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.client.get(url).json()
+            self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+            self.assertNotIn("count", page)
+            skus += [row["sku"] for row in page["results"]]
+            url = page["next"]
+        return skus
+
+    def test_walk_matches_full_ordering_despite_ties(self):
+        for ordering in ("price", "-price", "inventory", "-created_at"):
+            with self.subTest(ordering=ordering):
+                tiebreak = "-id" if ordering.startswith("-") else "id"
+                expected = list(Product.objects.order_by(ordering, tiebreak).values_list("sku", flat=True))
+                walked = self._walk(f"/api/products/?pagination=keyset&page_size=7&ordering={ordering}")
+                self.assertEqual(walked, expected)
+
+    def test_default_mode_is_unchanged(self):
+        page = self.client.get("/api/products/").json()
+        self.assertEqual(page["count"], 30)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get("/api/products/?pagination=keyset&cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_is_refused(self):
+        response = self.client.get("/api/products/?pagination=keyset&search=Item")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("search", response.json())
+
+    def test_pages_are_seeked_with_an_index_range_bound(self):
+        first = self.client.get("/api/products/?pagination=keyset&ordering=-price").json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first["next"])
+        self.assertIn('"products_product"."price" <=', ctx.captured_queries[-1]["sql"])
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(sku="KB-100", name="Mechanical keyboard", description="Tactile switches", price=Decimal("50.00"))
+        Product.objects.create(sku="MS-200", name="Wireless mouse", description="Pairs with any keyboard", price=Decimal("20.00"))
+        Product.objects.create(sku="MN-300", name="Monitor", description="27 inch panel", price=Decimal("200.00"))
+
+    def _search(self, term):
+        return [row["sku"] for row in self.client.get("/api/products/", {"search": term}).data["results"]]
+
+    def test_search_matches_name_and_description(self):
+        self.assertCountEqual(self._search("keyboard"), ["KB-100", "MS-200"])
+
+    def test_sku_prefix_match(self):
+        self.assertEqual(self._search("MN-3"), ["MN-300"])
+
+    @skipUnless(connection.vendor == "postgresql", "full-text search is PostgreSQL only")
+    def test_name_hits_outrank_description_hits(self):
+        self.assertEqual(self._search("keyboards"), ["KB-100", "MS-200"])
+
+    @skipUnless(connection.vendor == "postgresql", "full-text search is PostgreSQL only")
+    def test_search_vector_follows_updates(self):
+        product = Product.objects.get(sku="MN-300")
+        product.name = "Curved display"
+        product.save()
+        self.assertEqual(self._search("display"), ["MN-300"])
+        self.assertEqual(self._search("monitor"), [])
+
+
+class RecordingSink(logging.Handler):
+    """Handler that keeps the lines it writes and the threads that formatted and wrote them."""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+        self.setFormatter(JsonFormatter())
+
+    def format(self, record):
+        self.threads.add(threading.current_thread())
+        return super().format(record)
+
+    def emit(self, record):
+        self.threads.add(threading.current_thread())
+        self.lines.append(self.format(record))
+
+
+class RequestLoggingOverheadTests(SimpleTestCase):
+    """How much cheaper the queue makes a log call is measured by python -m loadtest.overhead."""
+
+    def make_logger(self, name, handler):
+        logger = logging.getLogger(f"tests.{name}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_queue_keeps_formatting_and_io_off_the_request_path(self):
+        sink = RecordingSink()
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, sink)
+        listener.start()
+        handler = NonBlockingQueueHandler(log_queue)
+        # Formatting would land here if the handler formatted before queuing
+        handler.setFormatter(sink.formatter)
+        handler.format = mock.Mock(side_effect=handler.format)
+
+        logger = self.make_logger("queued", handler)
+        for user_id in range(300):
+            # The line ProductViewSet._log_request writes for every request
+            logger.info("[ProductViewSet] Action=%s User=%s IP=%s slug=%s",
+                        "RETRIEVE PRODUCT", user_id, "127.0.0.1", "phone")
+        listener.stop()
+
+        # Every line was formatted and written by the one listener thread, none by the caller
+        handler.format.assert_not_called()
+        self.assertEqual(len(sink.threads), 1)
+        self.assertNotIn(threading.current_thread(), sink.threads)
+        # Nothing is lost: the listener wrote every line, as JSON
+        self.assertEqual(len(sink.lines), 300)
+        line = json.loads(sink.lines[-1])
+        self.assertEqual((line["level"], line["logger"]), ("INFO", "tests.queued"))
+        self.assertEqual(line["message"], "[ProductViewSet] Action=RETRIEVE PRODUCT User=299 IP=127.0.0.1 slug=phone")
+
+    def test_sampling_drops_info_but_never_warnings(self):
+        sink = RecordingSink()
+        logger = self.make_logger("sampled", sink)
+        sampler = SamplingFilter(every=10)
+        logger.addFilter(sampler)
+        self.addCleanup(logger.removeFilter, sampler)
+
+        for user_id in range(100):
+            logger.info("request user=%s", user_id)
+        logger.warning("slow request")
+
+        levels = [json.loads(line)["level"] for line in sink.lines]
+        self.assertEqual(levels, ["INFO"] * 10 + ["WARNING"])
+
+
+@override_settings(METRICS_TOKEN="scrape")
+class RequestInstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = MetricsRegistry()
+        for target in ("config.metrics.REGISTRY", "config.middleware.REGISTRY"):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.phone = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5)
+
+    def test_detail_requests_report_queries_and_cache_use(self):
+        miss = self.client.get(f"/api/products/{self.phone.slug}/")
+        hit = self.client.get(f"/api/products/{self.phone.slug}/")
+
+        self.assertRegex(miss["Server-Timing"], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries", cache;desc="0 hit 1 miss"$')
+        self.assertIn('db;dur=0.0;desc="0 queries", cache;desc="1 hit 0 miss"', hit["Server-Timing"])
+
+        metrics = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape").content.decode()
+        self.assertIn('http_requests_total{view="products-detail",method="GET",status="200"} 2', metrics)
+        self.assertIn('http_request_duration_seconds_count{view="products-detail"} 2', metrics)
+        self.assertIn('db_queries_total{view="products-detail"} 1', metrics)
+        self.assertIn('cache_requests_total{cache="product_detail",result="hit"} 1', metrics)
+        self.assertIn('cache_requests_total{cache="product_detail",result="miss"} 1', metrics)
+
+    def test_metrics_require_the_bearer_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        with self.settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 404)
+
+
+class InstrumentationOverheadTests(SimpleTestCase):
+    """Its cost in time is measured by python -m loadtest.overhead; here, that it adds no I/O."""
+
+    def test_middleware_does_no_io_of_its_own(self):
+        request = RequestFactory().get("/api/products/")
+        middleware = PerformanceMiddleware(lambda request: HttpResponse())
+        registry = MetricsRegistry()
+
+        # SimpleTestCase also fails on any database query
+        with mock.patch("config.middleware.REGISTRY", registry), count_cache_calls() as cache_calls:
+            for _ in range(100):
+                response = middleware(request)
+
+        self.assertEqual(cache_calls, [])
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertIn('http_request_duration_seconds_count{view="unmatched"} 100', registry.render())
+
+
+class CacheAsideTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.computed = []
+
+    def compute(self, value="fresh"):
+        self.computed.append(value)
+        return value
+
+    def test_miss_computes_and_hit_does_not(self):
+        self.assertEqual(cache_aside.fetch("key", self.compute, 60), "fresh")
+        self.assertEqual(cache_aside.fetch("key", lambda: self.compute("again"), 60), "fresh")
+        self.assertEqual(self.computed, ["fresh"])
+
+    def test_expired_entry_is_served_stale_while_another_caller_recomputes(self):
+        cache_aside.fetch("key", lambda: "old", 60)
+        with mock.patch("config.cache_aside.time.time", return_value=time.time() + 61):
+            cache.add(cache_aside.lock_key("key"), 1)
+            self.assertEqual(cache_aside.fetch("key", self.compute, 60), "old")
+            self.assertEqual(self.computed, [])
+
+            cache.delete(cache_aside.lock_key("key"))
+            self.assertEqual(cache_aside.fetch("key", self.compute, 60), "fresh")
+
+    def test_entry_may_be_recomputed_shortly_before_it_expires(self):
+        cache.set("key", {"value": "old", "fresh_until": time.time() + 1, "delta": 0.5})
+        # random() close to 1 draws a large early-expiration gap, close to 0 a tiny one
+        with mock.patch("config.cache_aside.random.random", return_value=0.01):
+            self.assertEqual(cache_aside.fetch("key", self.compute, 60), "old")
+        with mock.patch("config.cache_aside.random.random", return_value=0.99):
+            self.assertEqual(cache_aside.fetch("key", self.compute, 60), "fresh")
+
+    def test_miss_waits_for_the_recompute_in_flight(self):
+        cache.add(cache_aside.lock_key("key"), 1)
+        threading.Timer(0.05, lambda: cache.set("key", {"value": "theirs", "fresh_until": time.time() + 60, "delta": 0})).start()
+
+        self.assertEqual(cache_aside.fetch("key", self.compute, 60), "theirs")
+        self.assertEqual(self.computed, [])
+
+    def test_failed_recompute_releases_the_lock(self):
+        with self.assertRaises(ValueError):
+            cache_aside.fetch("key", mock.Mock(side_effect=ValueError), 60)
+        self.assertEqual(cache_aside.fetch("key", self.compute, 60), "fresh")
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = local_cache.LRUCache(max_entries=2, ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        lru = local_cache.LRUCache(max_entries=2, ttl=60)
+        lru.set("a", 1)
+        with mock.patch("config.local_cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django_redis.cache.RedisCache", "LOCATION": "redis://fake:6379/1"}})
+class LocalCacheInvalidationTests(SimpleTestCase):
+    def test_invalidation_reaches_other_processes(self):
+        server = fakeredis.FakeServer()
+        patcher = mock.patch("config.local_cache.get_redis_connection", lambda *args: fakeredis.FakeRedis(server=server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Another process' tier and listener
+        other = local_cache.LRUCache(max_entries=10, ttl=60)
+        stop = threading.Event()
+        channel = local_cache.invalidation_channel()
+        listener = threading.Thread(target=local_cache.listen, args=(fakeredis.FakeRedis(server=server), channel, other, stop))
+        listener.start()
+        self.addCleanup(listener.join)
+        self.addCleanup(stop.set)
+        deadline = time.monotonic() + 5
+        while fakeredis.FakeRedis(server=server).pubsub_numsub(channel)[0][1] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        other.set("product_detail:phone", {"name": "Phone"})
+        other.set("product_detail:case", {"name": "Case"})
+
+        local_cache.invalidate("product_detail:phone")
+
+        while other.get("product_detail:phone") is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(other.get("product_detail:phone"))
+        self.assertEqual(other.get("product_detail:case"), {"name": "Case"})
+
+
+class TwoTierCatalogCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.local.clear()
+        self.category = Category.objects.create(name="Phones")
+        self.phone = Product.objects.create(
+            sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5, category=self.category,
+        )
+
+    def test_hot_detail_is_served_without_the_shared_cache(self):
+        self.client.get(f"/api/products/{self.phone.slug}/")
+        with count_cache_calls() as calls:
+            response = self.client.get(f"/api/products/{self.phone.slug}/")
+        self.assertEqual(response.data["name"], "Phone")
+        # Only the user and anon throttles' histories are read and written
+        self.assertEqual(calls, ["get", "set", "get", "set"])
+
+    def test_product_save_drops_local_entry(self):
+        self.client.get(f"/api/products/{self.phone.slug}/")
+        self.phone.name = "Phone 2"
+        self.phone.save()
+
+        self.assertEqual(self.client.get(f"/api/products/{self.phone.slug}/").data["name"], "Phone 2")
+
+    def test_category_save_drops_category_and_products_that_embed_it(self):
+        self.client.get(f"/api/products/{self.phone.slug}/")
+        self.client.get("/api/products/")
+        self.assertIsNotNone(local_cache.local.get(category_key(self.category.pk)))
+
+        self.category.name = "Mobiles"
+        self.category.save()
+
+        self.assertEqual(self.client.get(f"/api/products/{self.phone.slug}/").data["category"]["name"], "Mobiles")
+        self.assertEqual(self.client.get("/api/products/").data["results"][0]["category"]["name"], "Mobiles")
+
+    def test_category_change_publishes_one_key_however_many_products_embed_it(self):
+        Product.objects.bulk_create([
+            Product(sku=f"SKU-{i}", name=f"Case {i}", slug=f"case-{i}", price=Decimal("5.00"), category=self.category)
+            for i in range(2, 50)
+        ])
+
+        with mock.patch("products.cache_utils.local_cache.invalidate") as invalidate:
+            self.category.name = "Mobiles"
+            self.category.save()
+
+        invalidate.assert_called_once_with(category_key(self.category.pk))
+
+    def test_category_delete_drops_products_that_embedded_it(self):
+        self.client.get(f"/api/products/{self.phone.slug}/")
+        self.category.delete()
+
+        self.assertIsNone(self.client.get(f"/api/products/{self.phone.slug}/").data["category"])
+
+
+class ProductDetailStampedeTests(TransactionTestCase):
+    def test_concurrent_misses_run_one_query(self):
+        product = Product.objects.create(sku="SKU-1", name="Phone", price=Decimal("100.00"), inventory=5)
+        cache.clear()
+        clients = 500
+        barrier = threading.Barrier(clients)
+        lock = threading.Lock()
+        queries, statuses = [], []
+
+        def count(execute, sql, params, many, context):
+            with lock:
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def get_detail():
+            client = APIClient()
+            try:
+                with connection.execute_wrapper(count):
+                    barrier.wait()
+                    response = client.get(f"/api/products/{product.slug}/")
+                with lock:
+                    statuses.append((response.status_code, response.data["sku"]))
+            finally:
+                connection.close()
+
+        with mock.patch.object(SimpleRateThrottle, "THROTTLE_RATES", {"user": "1000000/s", "anon": "1000000/s"}):
+            threads = [threading.Thread(target=get_detail) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses, [(200, "SKU-1")] * clients)
+        self.assertEqual(len(queries), 1, queries)
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Cache counts are for a cold cache: anonymous requests pay 4 calls to the
+    user and anon throttles (2 when authenticated), lists 3 more to read or
+    seed the list version.
+    """
+
+    sizes = (1, 20)
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        self.phone = Product.objects.create(sku="SKU-PHONE", name="Phone", price=Decimal("100.00"), inventory=5)
+
+    def seed_products(self, size):
+        # A category per product, so a missing select_related shows up as one query per row
+        categories = Category.objects.bulk_create([Category(name=f"Category {i}", slug=f"category-{i}") for i in range(size)])
+        Product.objects.bulk_create([
+            Product(sku=f"SKU-{i}", name=f"Item {i}", slug=f"item-{i}", price=Decimal("10.00"), category=category)
+            for i, category in enumerate(categories)
+        ])
+
+    def test_list(self):
+        self.assertRequestBudget(lambda: self.client.get("/api/products/"), self.seed_products, queries=2, cache_calls=9)
+
+    def test_keyset_list(self):
+        self.assertRequestBudget(
+            lambda: self.client.get("/api/products/?pagination=keyset"), self.seed_products, queries=1, cache_calls=9,
+        )
+
+    def test_search(self):
+        self.assertRequestBudget(
+            lambda: self.client.get("/api/products/?search=item"), self.seed_products, queries=2, cache_calls=9,
+        )
+
+    def test_detail(self):
+        self.assertRequestBudget(
+            # The miss takes the recompute lock and re-reads before computing: get, add, get, set, delete
+            lambda: self.client.get(f"/api/products/{self.phone.slug}/"), self.seed_products, queries=1, cache_calls=9,
+        )
+
+    def test_create(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/products/", {"sku": "SKU-NEW", "name": "New", "price": "5.00"}),
+            self.seed_products, queries=3, cache_calls=6,
+        )
+
+    def test_update(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.patch(f"/api/products/{self.phone.slug}/", {"price": "120.00"}),
+            self.seed_products, queries=2, cache_calls=6,
+        )
+
+    def test_delete(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRequestBudget(
+            lambda: self.client.delete(f"/api/products/{self.phone.slug}/"), self.seed_products, queries=4, cache_calls=6,
+        )
+
+
+class AsyncCatalogViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True, role="admin")
+        category = Category.objects.create(name="Phones")
+        self.products = [
+            Product.objects.create(
+                sku=f"SKU-{i}", name=f"Item {i}", price=Decimal(i + 1), inventory=5, category=category,
+            )
+            for i in range(15)
+        ]
+
+    def assertSameAsViewSet(self, url):
+        """The async view's response for `url` matches the ViewSet's, both uncached."""
+        cache.clear()
+        expected = self.client.get(url)
+        cache.clear()
+        with override_settings(ROOT_URLCONF=__name__):
+            response = async_to_sync(AsyncClient().get)(url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        return response
+
+    def test_list_pages_and_ordering_match_viewset(self):
+        for url in (
+            "/api/products/",
+            "/api/products/?page=2",
+            "/api/products/?page=2&page_size=5&ordering=-price",
+            "/api/products/?page=9",
+            "/api/products/?search=Item 1",
+        ):
+            with self.subTest(url=url):
+                self.assertSameAsViewSet(url)
+
+    def test_detail_matches_viewset(self):
+        self.assertSameAsViewSet(f"/api/products/{self.products[0].slug}/")
+        self.assertEqual(self.assertSameAsViewSet("/api/products/missing/").status_code, 404)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_shares_cache_entries_with_viewset(self):
+        slug = self.products[0].slug
+        first = await AsyncClient().get(f"/api/products/{slug}/")
+        await Product.objects.filter(slug=slug).aupdate(name="Renamed outside the API")
+
+        second = await AsyncClient().get(f"/api/products/{slug}/")
+
+        self.assertEqual(json.loads(second.content)["name"], json.loads(first.content)["name"])
+        self.assertEqual(cache.get(product_detail_key(slug))["value"]["name"], "Item 0")
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_writes_go_to_viewset(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.admin).access_token))()
+        response = await AsyncClient().patch(
+            f"/api/products/{self.products[0].slug}/", json.dumps({"price": "120.00"}),
+            content_type="application/json", headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Product.objects.aget(pk=self.products[0].pk)).price, Decimal("120.00"))
@@ -1,7 +1,20 @@
+from django.conf import settings
+from django.urls import path, re_path
 from rest_framework.routers import DefaultRouter
+
+from . import async_views
 from .views import ProductViewSet
 
 router = DefaultRouter()
 router.register("", ProductViewSet, basename="products")
 
 urlpatterns = router.urls
+
+# ASGI deployments serve list/retrieve from products/async_views.py; the ViewSet keeps the rest
+async_urlpatterns = [
+    path("", async_views.product_list, name="products-list"),
+    re_path(r"^(?P<slug>[^/.]+)/$", async_views.product_detail, name="products-detail"),
+] + urlpatterns
+
+if settings.ASYNC_CATALOG_VIEWS:
+    urlpatterns = async_urlpatterns
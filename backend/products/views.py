@@ -1,20 +1,29 @@
 import logging
 from django.core.cache import cache
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 
-from .cache_utils import clear_product_caches
+from config import cache_aside, local_cache
+from config.metrics import record_cache
+
+from .cache_utils import (
+    get_product_list_version,
+    product_detail_key,
+    product_list_key,
+)
 from rest_framework import viewsets, status, filters
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 
 from .models import Product, Category
+from .pagination import KeysetPagination
+from .search import ProductSearchFilter
 from .serializers import (
     ProductListSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
     CategorySerializer,
+    detail_cache_entry,
+    detail_from_cache,
 )
 
 CACHE_TTL = 60 * 5  # 5 minutes
@@ -28,13 +37,26 @@ class SmallResultsSetPagination(PageNumberPagination):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
+    # Reads stay on the primary even with replicas configured: list and retrieve only
+    # read the database to fill the shared caches, and an entry filled from a lagging
+    # replica just after a write's invalidation would serve the old row until it expires
     queryset = Product.objects.select_related("category").all()
     lookup_field = "slug"
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
     search_fields = ["name", "sku", "description"]
     ordering_fields = ["price", "created_at", "inventory"]
     pagination_class = SmallResultsSetPagination
 
+    @property
+    def paginator(self):
+        # ?pagination=keyset opts into seek pagination (no page numbers or count)
+        if not hasattr(self, "_paginator"):
+            if self.request.query_params.get("pagination") == "keyset":
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [IsAdminUser()]
@@ -47,50 +69,57 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductDetailSerializer
         return ProductCreateUpdateSerializer
 
-    def _log_request(self, action, extra=None):
-        ip = self.request.META.get("REMOTE_ADDR")
-        user = self.request.user if self.request.user.is_authenticated else "Anonymous"
+    def _log_request(self, action, slug=None):
+        # Arguments are interpolated only if the record survives level and sampling filters
         logger.info(
-            f"[ProductViewSet] Action={action} User={user} IP={ip} {extra or ''}"
+            "[ProductViewSet] Action=%s User=%s IP=%s slug=%s",
+            action, self.request.user.id or "Anonymous", self.request.META.get("REMOTE_ADDR"), slug,
         )
 
-    # Cached list
-    @method_decorator(cache_page(CACHE_TTL))
+    # Cached list, keyed under the current list version
     def list(self, request, *args, **kwargs):
         self._log_request("LIST PRODUCTS")
-        return super().list(request, *args, **kwargs)
+        cache_key = product_list_key(request)
+        version = get_product_list_version()
+
+        cached = cache.get(cache_key, version=version)
+        record_cache("product_list", cached is not None)
+        if cached is not None:
+            return Response(cached)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(cache_key, response.data, CACHE_TTL, version=version)
+        return response
 
     def retrieve(self, request, *args, **kwargs):
         slug = kwargs.get("slug")
-        cache_key = f"product_detail:{slug}"
-        self._log_request("RETRIEVE PRODUCT", f"(slug={slug})")
+        cache_key = product_detail_key(slug)
+        self._log_request("RETRIEVE PRODUCT", slug)
 
-        cached = cache.get(cache_key)
-        if cached:
-            logger.debug(f"[ProductViewSet] CACHE HIT for slug={slug}")
-            return Response(cached)
+        def load():
+            logger.debug("[ProductViewSet] CACHE MISS for slug=%s", slug)
+            return detail_cache_entry(super(ProductViewSet, self).retrieve(request, *args, **kwargs).data)
 
-        logger.debug(f"[ProductViewSet] CACHE MISS for slug={slug}")
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(cache_key, response.data, CACHE_TTL)
-        return response
+        # Hot products are answered from this process; otherwise one request per key recomputes
+        # and the rest get the stale entry or wait for it
+        return Response(detail_from_cache(local_cache.get_or_set(
+            cache_key,
+            lambda: cache_aside.fetch(cache_key, load, CACHE_TTL, metric="product_detail"),
+            metric="product_detail",
+        )))
 
     def perform_create(self, serializer):
+        # products.signals invalidates the caches
         instance = serializer.save()
-        self._log_request("CREATE PRODUCT", f"(slug={instance.slug})")
-        clear_product_caches()
-        logger.debug("[ProductViewSet] Cache cleared after create")
+        self._log_request("CREATE PRODUCT", instance.slug)
         return instance
 
     def perform_update(self, serializer):
         instance = serializer.save()
-        self._log_request("UPDATE PRODUCT", f"(slug={instance.slug})")
-        clear_product_caches()
-        logger.debug("[ProductViewSet] Cache cleared after update")
+        self._log_request("UPDATE PRODUCT", instance.slug)
         return instance
 
     def perform_destroy(self, instance):
-        self._log_request("DELETE PRODUCT", f"(slug={instance.slug})")
+        self._log_request("DELETE PRODUCT", instance.slug)
         instance.delete()
-        clear_product_caches()
-        logger.debug("[ProductViewSet] Cache cleared after delete")
@@ -0,0 +1,68 @@
+"""
+Query and cache budgets for endpoint tests (the QueryBudgetTests classes in
+each app's tests.py). Runs offline: USE_SQLITE=True python manage.py test
+"""
+from contextlib import contextmanager
+
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from config import local_cache
+
+# Primitive operations only: the composite ones (get_many, set_many, ...) call
+# these on LocMemCache, so they would be counted twice
+CACHE_METHODS = ("get", "set", "add", "delete", "touch", "incr", "decr", "has_key")
+
+
+@contextmanager
+def count_cache_calls(alias="default"):
+    """Yield a list that collects the name of every cache operation run on `alias` inside the block."""
+    backend = caches[alias]
+    calls = []
+    for name in CACHE_METHODS:
+        def counted(*args, _name=name, _method=getattr(backend, name), **kwargs):
+            calls.append(_name)
+            return _method(*args, **kwargs)
+        setattr(backend, name, counted)
+    try:
+        yield calls
+    finally:
+        for name in CACHE_METHODS:
+            delattr(backend, name)
+
+
+class QueryBudgetMixin:
+    """
+    assertRequestBudget() serves one request against seeded data of several
+    sizes and fails when its SQL queries (or cache calls) exceed the budget or
+    change with the size of the data, which is how an N+1 shows up.
+    """
+
+    sizes = (1, 10)
+
+    def assertRequestBudget(self, send, seed=None, queries=0, cache_calls=None):
+        """
+        For every size in self.sizes: clear both cache tiers, call seed(size), then
+        count what send() costs. Each size runs in a savepoint that is rolled
+        back, so seeds and requests start from the same state.
+        """
+        observed = {}
+        for size in self.sizes:
+            cache.clear()
+            local_cache.local.clear()
+            with transaction.atomic():
+                if seed is not None:
+                    seed(size)
+                with CaptureQueriesContext(connection) as captured, count_cache_calls() as calls:
+                    response = send()
+                transaction.set_rollback(True)
+
+            self.assertLess(response.status_code, 400, getattr(response, "data", response))
+            sql = "\n".join(query["sql"] for query in captured.captured_queries)
+            self.assertLessEqual(len(captured), queries, f"{len(captured)} queries at size {size}:\n{sql}")
+            if cache_calls is not None:
+                self.assertLessEqual(len(calls), cache_calls, f"cache calls at size {size}: {calls}")
+            observed[size] = (len(captured), len(calls))
+
+        self.assertEqual(len(set(observed.values())), 1, f"(queries, cache calls) grow with data size: {observed}")
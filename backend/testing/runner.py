@@ -0,0 +1,20 @@
+"""
+The runner behind `python manage.py test` (settings.TEST_RUNNER): the suite
+runs against the local-memory cache, so it needs no Redis. Tests that
+exercise django-redis itself override CACHES on their own.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=LOCMEM_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,35 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from testing.budgets import QueryBudgetMixin
+from .models import User
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Every request also pays 4 cache calls to the user and anon throttles."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pass")
+
+    def seed_users(self, size):
+        User.objects.bulk_create([User(username=f"user{i}", email=f"user{i}@example.com") for i in range(size)])
+
+    def test_register(self):
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/users/register/", {
+                "username": "newcomer", "email": "newcomer@example.com", "password": "secret",
+            }),
+            seed=self.seed_users, queries=2, cache_calls=4,
+        )
+
+    def test_login(self):
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/users/login/", {"username": "buyer", "password": "pass"}),
+            seed=self.seed_users, queries=1, cache_calls=4,
+        )
+
+    def test_refresh(self):
+        refresh = self.client.post("/api/users/login/", {"username": "buyer", "password": "pass"}).data["refresh"]
+        self.assertRequestBudget(
+            lambda: self.client.post("/api/users/refresh/", {"refresh": refresh}),
+            seed=self.seed_users, queries=1, cache_calls=4,
+        )